@@ -0,0 +1,277 @@
+"""
+Per-stage and end-to-end SarPipeline timings on synthetic frames (no camera).
+
+    python -m bench.bench_pipeline --res 640x360,1280x720,1920x1080 --out bench/results.json
+    python -m bench.bench_pipeline --save-baseline            # store bench/baseline.json
+    python -m bench.bench_pipeline                            # compare against it
+
+Each stage runs on its own over a pool of pre-generated frames (textured
+background, moving "people", a few face-sized blobs) at every resolution:
+capture (decode of an MJPG file through open_capture), detector backends
+(ONNX with --onnx / FORESIGHT_ONNX, its tiled variant, ultralytics if
+installed, the mock), tracker, face blur, annotate, JPEG encode (FrameHub
+ladder). "e2e" runs the pipeline's own stage functions back to back per
+frame, and "staged" runs the threaded pipeline for --seconds on a synthetic
+capture and reports its fps and capture-to-publish latency.
+
+Results are JSON. With a baseline (same machine), any stage whose p50 is
+more than --tolerance slower is listed under "regressions" and the exit
+code is 1.
+"""
+import argparse, json, os, platform, sys, tempfile, time
+from typing import Callable, Dict, List, Optional
+
+import cv2
+import numpy as np
+
+os.environ.setdefault("FORESIGHT_EVIDENCE_DIR", os.path.join(tempfile.gettempdir(), "foresight-bench"))
+
+from src.backend.services.broadcast import FrameHub
+from src.backend.services.pipeline import DetectorBackend, SarPipeline
+from src.detect.tiling import TiledDetector
+from src.detect.yolo_infer import YoloDetector
+from src.ingest.video_source import open_capture
+from src.privacy.face_blur import PrivacyEngine
+from src.track.iou_tracker import IoUTracker
+
+BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+
+
+# ---------- synthetic input ----------
+def make_frames(w: int, h: int, n: int = 30, people: int = 6, seed: int = 0) -> List[np.ndarray]:
+    """_synthesize_frame-style frames with enough texture for the detectors and JPEG to do real work."""
+    rng = np.random.default_rng(seed)
+    base = cv2.GaussianBlur(rng.integers(20, 90, (h, w, 3), dtype=np.uint8), (0, 0), 3)
+    s = w / 640.0
+    pos = rng.uniform((0, 0), (w - 60 * s, h - 120 * s), (people, 2))
+    vel = rng.uniform(-4, 4, (people, 2)) * s
+    frames = []
+    for _ in range(n):
+        img = base.copy()
+        pos = np.clip(pos + vel, 0, (w - 60 * s, h - 120 * s))
+        for x, y in pos.astype(int).tolist():
+            cv2.rectangle(img, (x, y), (x + int(40 * s), y + int(100 * s)), (0, 160, 255), -1)
+            cv2.circle(img, (x + int(20 * s), y - int(12 * s)), int(12 * s), (150, 180, 220), -1)
+        cv2.putText(img, "Synthetic feed", (20, 30), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (200, 200, 200), 2, cv2.LINE_AA)
+        frames.append(img)
+    return frames
+
+
+def make_dets(frame: np.ndarray, k: int, n: int = 20) -> List[Dict]:
+    h, w = frame.shape[:2]
+    rng = np.random.default_rng(k // 50)
+    xy = rng.uniform((0, 0), (w - 80, h - 160), (n, 2)) + (k % 50) * 2
+    return [{"name": "person", "conf": 0.8, "xyxy": [x, y, x + 40, y + 100]}
+            for x, y in np.clip(xy, 0, (w - 40, h - 100)).tolist()]
+
+
+# ---------- timing ----------
+def timed(fn: Callable[[int], object], iters: int, warmup: int = 5) -> Dict[str, float]:
+    for k in range(warmup):
+        fn(k)
+    ms = np.empty(iters)
+    for k in range(iters):
+        t0 = time.perf_counter()
+        fn(warmup + k)
+        ms[k] = (time.perf_counter() - t0) * 1000.0
+    return summarize(ms)
+
+
+def summarize(ms) -> Dict[str, float]:
+    ms = np.asarray(ms, np.float64)
+    p50 = float(np.percentile(ms, 50))
+    return {"n": int(ms.size), "mean_ms": round(float(ms.mean()), 3), "p50_ms": round(p50, 3),
+            "p90_ms": round(float(np.percentile(ms, 90)), 3), "p99_ms": round(float(np.percentile(ms, 99)), 3),
+            "fps": round(1000.0 / p50, 1) if p50 > 0 else None}
+
+
+# ---------- stages ----------
+def bench_capture(frames: List[np.ndarray], iters: int) -> Dict:
+    h, w = frames[0].shape[:2]
+    path = os.path.join(tempfile.gettempdir(), f"foresight-bench-{w}x{h}.avi")
+    wr = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"MJPG"), 30.0, (w, h))
+    for k in range(iters + 10):
+        wr.write(frames[k % len(frames)])
+    wr.release()
+    cap = open_capture(path)
+    try:
+        return timed(lambda k: cap.read(), iters)
+    finally:
+        cap.release()
+        os.remove(path)
+
+
+def detectors(onnx: Optional[str]) -> Dict[str, Optional[Callable]]:
+    """name -> infer(frame) callable, or None when that backend is unavailable here."""
+    out: Dict[str, Optional[Callable]] = {"onnx": None, "onnx_tiled": None, "ultralytics": None}
+    if onnx and os.path.exists(onnx):
+        det = YoloDetector(onnx)
+        if det.session is not None:
+            tiler = TiledDetector(det)
+            out["onnx"] = det.infer
+            out["onnx_tiled"] = tiler.infer
+    try:
+        from ultralytics import YOLO
+        from src.detect.yolo_infer import UltralyticsDetector
+        u = UltralyticsDetector(YOLO(os.environ.get("FORESIGHT_YOLO", "yolov8n.pt")))
+        out["ultralytics"] = lambda f: u.infer_batch([f])[0]
+    except Exception:
+        pass
+    mock = DetectorBackend.__new__(DetectorBackend)
+    mock.raw, mock._kind = None, "mock"
+    out["mock"] = mock.detect
+    return out
+
+
+def bench_stages(frames: List[np.ndarray], iters: int, dets_fns: Dict[str, Optional[Callable]]) -> Dict:
+    n = len(frames)
+    res: Dict[str, Dict] = {"capture": bench_capture(frames, iters)}
+    for name, fn in dets_fns.items():
+        res[f"detect_{name}"] = timed(lambda k: fn(frames[k % n]), iters) if fn else {"skipped": True}
+
+    trk = IoUTracker(iou_thr=0.3, ttl=15)
+    dets = [make_dets(frames[0], k) for k in range(iters + 5)]
+    res["tracker"] = timed(lambda k: trk.update(dets[k]), iters)
+
+    priv = PrivacyEngine()
+    priv.enabled = True
+    work = [f.copy() for f in frames]
+    res["face_blur"] = timed(lambda k: priv.apply(work[k % n]), iters)
+
+    res["annotate"] = timed(lambda k: SarPipeline._annotate(None, work[k % n], dets[k]), iters)
+
+    enc = [int(cv2.IMWRITE_JPEG_QUALITY), 85]
+    res["jpeg"] = timed(lambda k: cv2.imencode(".jpg", frames[k % n], enc), iters)
+    hub = FrameHub(quality=85)
+
+    def ladder(k):
+        hub.publish(frames[k % n])
+        for rung in hub.rungs:
+            hub.snapshot(rung)
+    res["jpeg_ladder"] = timed(ladder, iters)
+    return res
+
+
+class _SyntheticCapture:
+    """Stands in for VideoSource: serves the frame pool as fast as it is read."""
+    ever_connected = True
+
+    def __init__(self, frames: List[np.ndarray]):
+        self.frames = frames
+        self.k = 0
+        self.last_ts = 0.0
+
+    def read(self, timeout: float = 0.1):
+        self.k += 1
+        self.last_ts = time.time()
+        return True, self.frames[self.k % len(self.frames)].copy()
+
+    def release(self):
+        pass
+
+    def stats(self):
+        return {"kind": "synthetic", "frames": self.k}
+
+
+def bench_e2e(frames: List[np.ndarray], iters: int) -> Dict:
+    """One frame at a time through the pipeline's own stage functions (no threads, no queues)."""
+    pipe = SarPipeline(source="bench", staged=False)
+    n = len(frames)
+
+    def step(k):
+        t = time.time()
+        frame = frames[k % n].copy()
+        dets, keyframe = pipe._maybe_yolo(frame)
+        frame = pipe._annotate(pipe._apply_face_blur(frame), dets)
+        pipe.hub.publish(frame, t)
+        pipe.hub.snapshot("full")
+        pipe.events.publish(k, t, dets)
+    return timed(step, iters)
+
+
+def bench_staged(frames: List[np.ndarray], seconds: float) -> Dict:
+    """The threaded pipeline on a synthetic capture: throughput and capture-to-publish latency."""
+    pipe = SarPipeline(source="bench", staged=True)
+    pipe._open_capture = lambda: setattr(pipe, "_cap", _SyntheticCapture(frames))
+    lat: List[float] = []
+    seq = 0
+    pipe.start()
+    t_end = time.time() + seconds
+    t0, frames0 = time.time(), 0
+    try:
+        while time.time() < t_end:
+            seq, jpeg, ts = pipe.hub.wait(seq, timeout=0.5)
+            if jpeg is not None and ts:
+                lat.append((time.time() - ts) * 1000.0)
+                if frames0 == 0:
+                    t0, frames0 = time.time(), seq
+    finally:
+        pipe.stop()
+    out = summarize(lat[1:] or [0.0])
+    out["fps"] = round((seq - frames0) / max(time.time() - t0, 1e-6), 1)
+    out["stages_ms"] = {k: v["ms"] for k, v in pipe._stage_stats().items()}
+    return out
+
+
+# ---------- baseline ----------
+def compare(results: Dict, baseline: Dict, tolerance: float) -> List[Dict]:
+    out = []
+    for res, stages in results.get("results", {}).items():
+        for stage, cur in stages.items():
+            ref = baseline.get("results", {}).get(res, {}).get(stage)
+            if not ref or "p50_ms" not in ref or "p50_ms" not in cur:
+                continue
+            if cur["p50_ms"] > ref["p50_ms"] * (1.0 + tolerance) and cur["p50_ms"] - ref["p50_ms"] > 0.05:
+                out.append({"res": res, "stage": stage, "p50_ms": cur["p50_ms"], "baseline_ms": ref["p50_ms"],
+                            "ratio": round(cur["p50_ms"] / max(ref["p50_ms"], 1e-9), 2)})
+    return out
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    ap.add_argument("--res", default="640x360,1280x720,1920x1080")
+    ap.add_argument("--iters", type=int, default=100)
+    ap.add_argument("--seconds", type=float, default=3.0, help="staged (threaded) run length per resolution")
+    ap.add_argument("--onnx", default=os.environ.get("FORESIGHT_ONNX"))
+    ap.add_argument("--out", default=None, help="also write the JSON here")
+    ap.add_argument("--baseline", default=BASELINE)
+    ap.add_argument("--save-baseline", action="store_true")
+    ap.add_argument("--tolerance", type=float, default=0.25, help="allowed p50 slowdown vs baseline")
+    args = ap.parse_args(argv)
+
+    cv2.setRNGSeed(0)
+    dets_fns = detectors(args.onnx)
+    results: Dict = {
+        "meta": {"python": platform.python_version(), "opencv": cv2.__version__, "numpy": np.__version__,
+                 "machine": platform.machine(), "cpus": os.cpu_count(), "time": time.time(),
+                 "detectors": [k for k, v in dets_fns.items() if v]},
+        "results": {},
+    }
+    for spec in args.res.split(","):
+        w, h = (int(v) for v in spec.lower().split("x"))
+        frames = make_frames(w, h)
+        r = bench_stages(frames, args.iters, dets_fns)
+        r["e2e"] = bench_e2e(frames, args.iters)
+        if args.seconds > 0:
+            r["staged"] = bench_staged(frames, args.seconds)
+        results["results"][spec] = r
+        print(f"{spec}: " + ", ".join(f"{k}={v['p50_ms']}ms" for k, v in r.items() if "p50_ms" in v),
+              file=sys.stderr)
+
+    code = 0
+    if args.save_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=1)
+    elif os.path.exists(args.baseline):
+        with open(args.baseline, encoding="utf-8") as f:
+            results["regressions"] = compare(results, json.load(f), args.tolerance)
+        code = 1 if results["regressions"] else 0
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=1)
+    print(json.dumps(results))
+    return code
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,76 @@
+"""
+IoUTracker per-frame cost with several hundred live tracks.
+
+    python -m bench.bench_tracker --objects 300 --frames 500
+
+Synthetic targets move at constant velocity with jitter and random missed
+detections; reports per-update latency percentiles and ID switches, and exits
+non-zero if the mean update exceeds --budget-ms.
+"""
+import argparse, json, sys, time
+import numpy as np
+from src.track.iou_tracker import IoUTracker
+
+
+def simulate(objects: int, frames: int, miss: float, seed: int, assign: str):
+    rng = np.random.default_rng(seed)
+    W, H = 3840, 2160
+    size = rng.uniform(20, 60, (objects, 2))
+    pos = rng.uniform((0, 0), (W - 60, H - 60), (objects, 2))
+    vel = rng.uniform(-2, 2, (objects, 2))
+    trk = IoUTracker(iou_thr=0.3, ttl=15, assign=assign)
+
+    times = []
+    owner = {}          # object index -> last track id
+    switches = 0
+    for f in range(frames):
+        pos += vel
+        np.clip(pos, 0, (W - 60, H - 60), out=pos)
+        seen = np.flatnonzero(rng.random(objects) >= miss)
+        jitter = rng.normal(0, 0.5, (seen.size, 2))
+        xy = pos[seen] + jitter
+        dets = [{"name": "person", "conf": 0.8, "xyxy": [x, y, x + w, y + h]}
+                for (x, y), (w, h) in zip(xy.tolist(), size[seen].tolist())]
+
+        t0 = time.perf_counter()
+        out = trk.update(dets)
+        times.append((time.perf_counter() - t0) * 1000.0)
+
+        for obj, d in zip(seen.tolist(), out):
+            prev = owner.get(obj)
+            if prev is not None and prev != d["id"]:
+                switches += 1
+            owner[obj] = d["id"]
+
+    warm = np.asarray(times[10:] or times)
+    return {
+        "objects": objects,
+        "frames": frames,
+        "assign": assign,
+        "live_tracks": trk.n,
+        "mean_ms": round(float(warm.mean()), 4),
+        "p50_ms": round(float(np.percentile(warm, 50)), 4),
+        "p99_ms": round(float(np.percentile(warm, 99)), 4),
+        "id_switches": switches,
+    }
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    ap.add_argument("--objects", type=int, default=300)
+    ap.add_argument("--frames", type=int, default=500)
+    ap.add_argument("--miss", type=float, default=0.05, help="per-frame missed detection rate")
+    ap.add_argument("--assign", default="greedy", choices=("greedy", "hungarian"))
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--budget-ms", type=float, default=1.0)
+    args = ap.parse_args(argv)
+
+    res = simulate(args.objects, args.frames, args.miss, args.seed, args.assign)
+    res["budget_ms"] = args.budget_ms
+    res["ok"] = res["mean_ms"] <= args.budget_ms
+    print(json.dumps(res))
+    return 0 if res["ok"] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -3,14 +3,20 @@ from fastapi.responses import JSONResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 import cv2
 import numpy as np
-import pytesseract
 import loguru
-from PIL import ImageGrab
-import time
 import mss
 import threading
-from typing import Optional
+import os
+from typing import List, Dict, Optional
 from pydantic import BaseModel
+from src.detect.scheduler import KeyframeScheduler
+from src.detect.tiling import TiledDetector
+from src.detect.yolo_infer import UltralyticsDetector
+from src.ingest.video_source import SharedSources, VideoSource
+from src.backend.services.ocr_jobs import OcrBusy, OcrJobs, job_view
+from src.backend.services.broadcast import FrameHub, LazyProducer
+from src.track.iou_tracker import IoUTracker
+from src.reid.lock import SuspectLock
 
 # Ultralytics YOLO (pip install ultralytics)
 try:
@@ -20,6 +26,7 @@ except Exception as e:
     print("Ultralytics not available:", e)
 
 RTSP_URL = "rtsp://127.0.0.1:8554/scrcpy"
+CAMERA_URL = os.environ.get("FORESIGHT_CAMERA", "0")
 
 # -----------------------------
 # App + CORS setup
@@ -44,73 +51,97 @@ state = {
     "home": {"lat": 6.1164, "lon": 125.1716}
 }
 
+# long-lived device handles for /camera and /capture, and OCR off the request threads
+sources = SharedSources.from_env()
+ocr_jobs = OcrJobs.from_env()
+
 # -----------------------------
 # YOLO Detector Class
 # -----------------------------
 class ToggleReq(BaseModel):
     enabled: bool
 
+class LockReq(BaseModel):
+    enabled: bool
+    track: Optional[int] = None  # default: most confident person in view
+
 class Detector:
     def __init__(self, rtsp: str):
         self.rtsp = rtsp
-        self.cap: Optional[cv2.VideoCapture] = None
+        self.cap: Optional[VideoSource] = None
         self.running = False
         self.sar_enabled = True
         self.lock_enabled = False
-        self.last_jpeg = None
+        # suspect lock: in-memory appearance gallery, wiped when the lock is released
+        self.suspect = SuspectLock.from_env()
+        self.hub = FrameHub(quality=80)  # encoded once, fanned out to every /video.mjpg viewer
         self.lock = threading.Lock()
         self.model = YOLO("yolov8n.pt") if YOLO else None
-
-    def annotate(self, frame, results):
-        # draw simple boxes & labels
+        # run the model on keyframes only; the tracker carries boxes in between
+        self.tracker = IoUTracker(iou_thr=0.3, ttl=15)
+        self.scheduler = KeyframeScheduler(max_interval=6)
+        # FORESIGHT_TILES=1: sliced inference instead of squeezing the frame into 640
+        self.tiler = None
+        if self.model is not None and os.environ.get("FORESIGHT_TILES", "0") != "0":
+            self.tiler = TiledDetector(UltralyticsDetector(self.model, conf=0.25, imgsz=640))
+
+    def detect(self, frame) -> List[Dict]:
+        if not self.scheduler.should_detect(frame, self.tracker.confidence()):
+            return self.tracker.coast()
+        dets = []
+        if self.tiler is not None:
+            for d in self.tiler.infer(frame):
+                x, y, w, h = d["bbox"]
+                dets.append({"name": d["cls"], "conf": d["conf"], "xyxy": [x, y, x+w, y+h]})
+            results = []
+        else:
+            results = self.model.predict(source=frame, imgsz=640, conf=0.25, verbose=False)
         for r in results:
             boxes = r.boxes
             if boxes is None:
                 continue
             for b in boxes:
                 c = int(b.cls)
-                conf = float(b.conf)
-                x1, y1, x2, y2 = map(int, b.xyxy[0])
-                label = f"{self.model.names.get(c,'?')} {conf:.2f}"
-                # If suspect lock is on, you might filter class/person etc. For now, draw all.
-                cv2.rectangle(frame, (x1,y1), (x2,y2), (0,255,0), 2)
-                cv2.putText(frame, label, (x1, max(y1-6, 0)), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0,255,0), 2)
+                dets.append({"name": self.model.names.get(c, '?'), "conf": float(b.conf),
+                             "xyxy": list(map(int, b.xyxy[0]))})
+        dets = self.tracker.update(dets)
+        self.scheduler.note_confidence(self.tracker.confidence())
+        return dets
+
+    def annotate(self, frame, dets):
+        # draw simple boxes & labels
+        for d in dets:
+            x1, y1, x2, y2 = map(int, d["xyxy"])
+            label = f"{d['name']} {d['conf']:.2f}"
+            color = (0,0,255) if d.get("locked") else (0,255,0)
+            if d.get("locked"):
+                label = f"LOCK #{d['id']} {label}"
+            cv2.rectangle(frame, (x1,y1), (x2,y2), color, 2)
+            cv2.putText(frame, label, (x1, max(y1-6, 0)), cv2.FONT_HERSHEY_SIMPLEX, 0.5, color, 2)
         return frame
 
     def loop(self):
-        self.cap = cv2.VideoCapture(self.rtsp, cv2.CAP_FFMPEG)
-        # small open retry loop
-        open_deadline = time.time() + 10
-        while self.cap is None or not self.cap.isOpened():
-            if time.time() > open_deadline:
-                print("Failed to open RTSP within 10s")
-                break
-            print("Waiting for RTSP...")
-            time.sleep(1)
-            self.cap = cv2.VideoCapture(self.rtsp, cv2.CAP_FFMPEG)
-
-        while self.running and self.cap and self.cap.isOpened():
-            ok, frame = self.cap.read()
+        # reader thread always drains to the newest frame and reconnects with backoff
+        self.cap = VideoSource(self.rtsp).start()
+        sources.adopt(self.cap)  # /camera on the same URL reads this handle
+
+        while self.running:
+            ok, frame = self.cap.read(timeout=0.5)
             if not ok:
-                time.sleep(0.02)
                 continue
 
             # If SAR disabled → passthrough only
             if self.sar_enabled and self.model is not None:
-                results = self.model.predict(source=frame, imgsz=640, conf=0.25, verbose=False)
-                frame = self.annotate(frame, results)
-                # (Optional) apply "suspect lock" heuristic here
+                dets = self.detect(frame)
+                if self.lock_enabled:
+                    dets = self.suspect.update(frame, dets, self.cap.last_ts)
+                frame = self.annotate(frame, dets)
 
-            # encode to jpeg for MJPEG output
-            ok, jpeg = cv2.imencode(".jpg", frame, [int(cv2.IMWRITE_JPEG_QUALITY), 80])
-            if ok:
-                with self.lock:
-                    self.last_jpeg = jpeg.tobytes()
-            else:
-                time.sleep(0.01)
+            # hand to the MJPEG hub; it encodes only the sizes viewers asked for
+            self.hub.publish(frame, self.cap.last_ts)
 
-        if self.cap:
-            self.cap.release()
+        sources.forget(self.cap)
+        self.cap.release()
 
     def start(self):
         if self.running:
@@ -131,6 +162,8 @@ def on_start():
 @app.on_event("shutdown")
 def on_stop():
     det.stop()
+    sources.close()
+    ocr_jobs.close()
 
 # -----------------------------
 # Health check
@@ -144,7 +177,7 @@ def root():
 # -----------------------------
 @app.get("/state")
 def get_state():
-    return {"sar": det.sar_enabled, "lock": det.lock_enabled}
+    return {"sar": det.sar_enabled, "lock": det.lock_enabled, "suspect": det.suspect.stats()}
 
 @app.post("/toggle/sar")
 def toggle_sar(req: ToggleReq):
@@ -152,58 +185,60 @@ def toggle_sar(req: ToggleReq):
     return {"sar": det.sar_enabled}
 
 @app.post("/toggle/lock")
-def toggle_lock(req: ToggleReq):
+def toggle_lock(req: LockReq):
     det.lock_enabled = bool(req.enabled)
-    return {"lock": det.lock_enabled}
+    if det.lock_enabled:
+        det.suspect.lock(req.track)
+    else:
+        det.suspect.clear()
+    return {"lock": det.lock_enabled, "suspect": det.suspect.stats()}
 
 @app.get("/video.mjpg")
-def video_mjpeg():
-    boundary = "frame"
-    def gen():
-        while True:
-            with det.lock:
-                jpeg = det.last_jpeg
-            if jpeg is not None:
-                yield (b"--" + boundary.encode() + b"\r\n"
-                       b"Content-Type: image/jpeg\r\n"
-                       b"Content-Length: " + str(len(jpeg)).encode() + b"\r\n\r\n"
-                       + jpeg + b"\r\n")
-            else:
-                time.sleep(0.02)
-    return StreamingResponse(gen(), media_type=f"multipart/x-mixed-replace; boundary={boundary}")
+def video_mjpeg(fps: Optional[float] = None, size: str = "full"):
+    # each viewer gets the newest frame (optionally capped at ?fps=) and skips the rest;
+    # ?size=full|half|quarter picks a rung of the JPEG ladder
+    if size not in det.hub.rungs:
+        return JSONResponse(status_code=400, content={"error": f"size must be one of {det.hub.rungs}"})
+    return StreamingResponse(det.hub.stream(max_fps=fps, rung=size), media_type="multipart/x-mixed-replace; boundary=frame")
 
 # -----------------------------
 # Your existing OCR routes
 # -----------------------------
-@app.get("/capture")
-def capture_screen():
+def _ocr_frame(url: str, kind: str, text_key: str, wait: float):
+    ok, frame, ts = sources.latest(url, timeout=2.0)
+    if not ok:
+        return JSONResponse(status_code=503, content={"error": f"{kind} not available"})
     try:
-        img = ImageGrab.grab()  # grab full screen
-        frame = np.array(img)
-        gray = cv2.cvtColor(frame, cv2.COLOR_RGB2GRAY)
-        text = pytesseract.image_to_string(gray)
-        return {"captured_text": text.strip()}
-    except Exception as e:
-        logger.error(f"Error during capture: {e}")
-        return JSONResponse(status_code=500, content={"error": str(e)})
+        job = ocr_jobs.submit(frame, kind=kind, frame_ts=ts)
+    except OcrBusy as e:
+        return JSONResponse(status_code=503, content={"error": str(e)})
+    job = ocr_jobs.wait(job["id"], wait) or job
+    body = job_view(job, text_key)
+    if job["status"] == "error":
+        logger.error(f"{kind} OCR error: {job['error']}")
+        return JSONResponse(status_code=500, content=body)
+    # still running: 202 + job id, poll /ocr/jobs/<id>
+    return body if job["status"] == "done" else JSONResponse(status_code=202, content=body)
 
-@app.get("/camera")
-def capture_camera():
-    try:
-        cap = cv2.VideoCapture(0)
-        ret, frame = cap.read()
-        cap.release()
+@app.get("/capture")
+def capture_screen(wait: float = 5.0):
+    return _ocr_frame("desktop", "screen", "captured_text", wait)
 
-        if not ret:
-            return JSONResponse(status_code=500, content={"error": "Camera not available"})
+@app.get("/camera")
+def capture_camera(wait: float = 5.0):
+    return _ocr_frame(CAMERA_URL, "camera", "camera_text", wait)
 
-        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-        text = pytesseract.image_to_string(gray)
-        return {"camera_text": text.strip()}
+@app.get("/ocr/jobs/{job_id}")
+def ocr_job(job_id: str, wait: float = 0.0):
+    job = ocr_jobs.wait(job_id, wait) if wait > 0 else ocr_jobs.get(job_id)
+    if job is None:
+        return JSONResponse(status_code=404, content={"error": "unknown job"})
+    key = "captured_text" if job["kind"] == "screen" else "camera_text"
+    return job_view(job, key)
 
-    except Exception as e:
-        logger.error(f"Camera error: {e}")
-        return JSONResponse(status_code=500, content={"error": str(e)})
+@app.get("/ocr/stats")
+def ocr_stats():
+    return {"jobs": ocr_jobs.stats(), "sources": sources.stats()}
 
 @app.get("/geolocate")
 def geolocate_example():
@@ -225,22 +260,21 @@ async def set_home(req: Request):
     state["home"] = {"lat": data.get("lat", 0), "lon": data.get("lon", 0)}
     return {"ok": True, "home": state["home"]}
 
-@app.get("/mjpg")
-def mjpg_stream():
-    def generate():
-        with mss.mss() as sct:
-            monitor = sct.monitors[1]  # capture primary monitor
-            while True:
-                img = np.array(sct.grab(monitor))
-                frame = cv2.cvtColor(img, cv2.COLOR_BGRA2BGR)
-
-                ret, jpeg = cv2.imencode(".jpg", frame)
-                if not ret:
-                    continue
-
-                yield (b"--frame\r\n"
-                       b"Content-Type: image/jpeg\r\n\r\n" + jpeg.tobytes() + b"\r\n")
-                time.sleep(0.1)
+def screen_frames():
+    with mss.mss() as sct:
+        monitor = sct.monitors[1]  # capture primary monitor
+        while True:
+            img = np.array(sct.grab(monitor))
+            yield cv2.cvtColor(img, cv2.COLOR_BGRA2BGR)
 
+# one grab+encode loop for all /mjpg viewers, running only while someone watches
+screen_hub = FrameHub(quality=95)
+screen_producer = LazyProducer(screen_hub, screen_frames, fps=10)
+
+@app.get("/mjpg")
+def mjpg_stream(fps: Optional[float] = None, size: str = "full"):
+    if size not in screen_hub.rungs:
+        return JSONResponse(status_code=400, content={"error": f"size must be one of {screen_hub.rungs}"})
+    screen_producer.ensure_running()
     print("🚀 DESKTOP CAPTURE VERSION LOADED")
-    return StreamingResponse(generate(), media_type="multipart/x-mixed-replace; boundary=frame")
\ No newline at end of file
+    return StreamingResponse(screen_hub.stream(max_fps=fps, rung=size), media_type="multipart/x-mixed-replace; boundary=frame")
\ No newline at end of file
@@ -1,11 +1,17 @@
+import os, sys
 import cv2
 
-cap = cv2.VideoCapture("rtsp://127.0.0.1:8554/scrcpy", cv2.CAP_FFMPEG)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from src.ingest.video_source import VideoSource
+
+cap = VideoSource("rtsp://127.0.0.1:8554/scrcpy").start()
 
 while True:
     ok, frame = cap.read()
     if not ok:
-        break
+        if cap.ended:
+            break
+        continue  # reconnecting
     
     cv2.imshow("rtsp", frame)
     if cv2.waitKey(1) == 27:  # ESC to quit
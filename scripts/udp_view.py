@@ -1,15 +1,20 @@
-﻿import sys, cv2
+﻿import os, sys, cv2
 
-URL = sys.argv[1] if len(sys.argv) > 1 else "udp://127.0.0.1:5000"
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from src.ingest.video_source import VideoSource
 
-cap = cv2.VideoCapture(URL, cv2.CAP_FFMPEG)
-if not cap.isOpened():
-    raise SystemExit(f"Cannot open UDP stream: {URL}")
+URL = sys.argv[1] if len(sys.argv) > 1 else "udp://127.0.0.1:5000"
 
-print(f"[ok] Reading from {URL}. Press ESC to close.")
+cap = VideoSource(URL).start()
+if cap.wait_ready(10.0):
+    print(f"[ok] Reading from {URL}. Press ESC to close.")
+else:
+    print(f"[..] No frames from {URL} yet; still retrying. Press ESC to close.")
 while True:
-    ok, frame = cap.read()
+    ok, frame = cap.read(timeout=0.05)
     if not ok:
+        if cv2.waitKey(1) == 27:
+            break
         continue
     cv2.imshow("udp_view", frame)
     if cv2.waitKey(1) == 27:  # ESC
@@ -1,14 +1,29 @@
 from __future__ import annotations
-import asyncio
-from fastapi import APIRouter, WebSocket, WebSocketDisconnect, Response
-from fastapi.responses import StreamingResponse, JSONResponse
+import time
+from typing import List, Optional
+import cv2
+import numpy as np
+from fastapi import APIRouter, Request, WebSocket, WebSocketDisconnect, Response
+from fastapi.responses import StreamingResponse, JSONResponse, PlainTextResponse
+from ..services.metrics import render_pipelines
 from ..services.pipeline import SarPipeline
+from ..services.multisource import MultiSourcePipeline
 from ..app import app  # reuse your existing FastAPI app, do not replace it
 
 router = APIRouter(prefix="")
 
-# single global pipeline instance
-PIPE = SarPipeline()
+# FORESIGHT_SOURCES="name=url,..." -> several feeds on one batched detector;
+# otherwise a single global pipeline instance (FORESIGHT_SOURCE)
+MULTI = MultiSourcePipeline.from_env()
+PIPE = MULTI.default() if MULTI else SarPipeline()
+
+def _pipes() -> List[SarPipeline]:
+    return list(MULTI.pipes.values()) if MULTI else [PIPE]
+
+def _pipe(source: Optional[str]) -> Optional[SarPipeline]:
+    if not source:
+        return PIPE
+    return MULTI.get(source) if MULTI else None
 
 @router.on_event("startup")
 async def _startup():
@@ -17,45 +32,125 @@ async def _startup():
 
 @router.post("/api/pipeline/start")
 async def start_pipeline():
-    PIPE.start()
+    (MULTI or PIPE).start()
     return {"ok": True, "running": True}
 
 @router.post("/api/pipeline/stop")
 async def stop_pipeline():
-    PIPE.stop()
+    (MULTI or PIPE).stop()
     return {"ok": True, "running": False}
 
 @router.get("/api/state")
-async def get_state():
-    return JSONResponse(PIPE.stats())
+async def get_state(source: Optional[str] = None):
+    pipe = _pipe(source)
+    if pipe is None:
+        return JSONResponse(status_code=404, content={"error": f"unknown source: {source}"})
+    out = pipe.stats()
+    if MULTI:
+        out["source_name"] = source or next(iter(MULTI.pipes))  # "source" holds the VideoSource stats
+        out["multi"] = MULTI.stats()
+    return JSONResponse(out)
 
 @router.post("/api/mode")
 async def set_mode(payload: dict):
-    PIPE.set_mode(payload.get("mode", "sar"))
+    for p in _pipes():
+        p.set_mode(payload.get("mode", "sar"))
     return PIPE.stats()
 
 @router.post("/api/blur")
 async def set_blur(payload: dict):
-    PIPE.set_blur(bool(payload.get("enabled", True)))
+    for p in _pipes():
+        p.set_blur(bool(payload.get("enabled", True)))
     return PIPE.stats()
 
+@router.post("/api/lock")
+async def set_lock(payload: dict):
+    # {"enabled": true, "track": 7, "source": "cam1"}; without "track" the most confident person is locked
+    pipe = _pipe(payload.get("source"))
+    if pipe is None:
+        return JSONResponse(status_code=404, content={"error": f"unknown source: {payload.get('source')}"})
+    track = payload.get("track")
+    return pipe.set_lock(bool(payload.get("enabled", True)), int(track) if track is not None else None)
+
+@router.post("/api/suspect/reference")
+async def suspect_reference(request: Request, source: Optional[str] = None):
+    # body: a JPEG/PNG photo cropped to the person
+    pipe = _pipe(source)
+    if pipe is None:
+        return JSONResponse(status_code=404, content={"error": f"unknown source: {source}"})
+    img = cv2.imdecode(np.frombuffer(await request.body(), np.uint8), cv2.IMREAD_COLOR)
+    if img is None:
+        return JSONResponse(status_code=400, content={"error": "body is not an image"})
+    return pipe.add_suspect_reference(img)
+
+@router.get("/api/suspect/candidates")
+async def suspect_candidates(source: Optional[str] = None, k: int = 5):
+    pipe = _pipe(source)
+    if pipe is None:
+        return JSONResponse(status_code=404, content={"error": f"unknown source: {source}"})
+    return {"candidates": pipe.suspect_candidates(k)}
+
+def _bad_size(pipe: SarPipeline, size: str) -> Optional[JSONResponse]:
+    if size in pipe.hub.rungs:
+        return None
+    return JSONResponse(status_code=400, content={"error": f"size must be one of {pipe.hub.rungs}"})
+
 @router.get("/frame.jpg")
-async def frame_jpg():
-    jpeg = PIPE.snapshot_jpeg()
+async def frame_jpg(source: Optional[str] = None, size: str = "full"):
+    pipe = _pipe(source)
+    if pipe is None:
+        return JSONResponse(status_code=404, content={"error": f"unknown source: {source}"})
+    bad = _bad_size(pipe, size)
+    if bad:
+        return bad
+    jpeg = pipe.snapshot_jpeg(size)
     if not jpeg:
         # tiny transparent 1x1 if nothing yet
         return Response(b"\x47\x49\x46\x38\x39\x61\x01\x00\x01\x00\x80\x00\x00\x00\x00\x00\xff\xff\xff!\xf9\x04\x01\x00\x00\x00\x00,\x00\x00\x00\x00\x01\x00\x01\x00\x00\x02\x02L\x01\x00;", media_type="image/gif")
     return StreamingResponse(iter([jpeg]), media_type="image/jpeg")
 
+@router.get("/video.mjpg")
+async def video_mjpeg(source: Optional[str] = None, fps: Optional[float] = None, size: str = "full"):
+    pipe = _pipe(source)
+    if pipe is None:
+        return JSONResponse(status_code=404, content={"error": f"unknown source: {source}"})
+    bad = _bad_size(pipe, size)
+    if bad:
+        return bad
+    return StreamingResponse(pipe.hub.stream(max_fps=fps, rung=size), media_type="multipart/x-mixed-replace; boundary=frame")
+
 @router.websocket("/ws/sar")
-async def ws_sar(ws: WebSocket):
+async def ws_sar(ws: WebSocket, source: Optional[str] = None,
+                 max_hz: Optional[float] = None, stats_hz: float = 1.0):
+    """Detection deltas pushed as each frame finishes, plus periodic "stats"."""
+    pipe = _pipe(source)
     await ws.accept()
+    if pipe is None:
+        await ws.close(code=1008)
+        return
+    sub = pipe.events.subscribe(max_hz=max_hz)
+    period = 1.0 / stats_hz if stats_hz > 0 else None
+    next_stats = time.monotonic()
     try:
         while True:
-            await ws.send_json({"type": "stats", **PIPE.stats()})
-            await asyncio.sleep(0.2)  # ~5 Hz
+            now = time.monotonic()
+            if period and now >= next_stats:
+                await ws.send_json({"type": "stats", **pipe.stats()})
+                next_stats = now + period
+            text = await sub.next(timeout=max(0.0, next_stats - now) if period else None)
+            if text is not None:
+                await ws.send_text(text)
+                pipe.metrics.observe("ws_age", (time.time() - sub.ts) * 1000.0)
     except WebSocketDisconnect:
         pass
+    finally:
+        sub.close()
+
+@router.get("/metrics")
+async def metrics():
+    """Prometheus text: per-stage latency histograms, frame age at send, drop/skip counters."""
+    pipes = MULTI.pipes if MULTI else {PIPE.source: PIPE}
+    return PlainTextResponse(render_pipelines(pipes), media_type="text/plain; version=0.0.4")
 
 # Register on the existing app
 app.include_router(router)
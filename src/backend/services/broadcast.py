@@ -0,0 +1,300 @@
+from __future__ import annotations
+import asyncio, threading, time
+from typing import AsyncIterator, Callable, Dict, Iterator, List, Optional, Tuple
+import cv2
+import numpy as np
+from .metrics import LatencyHistogram
+
+
+def mjpeg_part(jpeg: bytes, boundary: str = "frame") -> bytes:
+    return (b"--" + boundary.encode() + b"\r\n"
+            b"Content-Type: image/jpeg\r\n"
+            b"Content-Length: " + str(len(jpeg)).encode() + b"\r\n\r\n"
+            + jpeg + b"\r\n")
+
+
+class _Subscriber:
+    __slots__ = ("loop", "event", "rung", "sent", "drops")
+
+    def __init__(self, loop: asyncio.AbstractEventLoop, rung: str):
+        self.loop = loop
+        self.event = asyncio.Event()
+        self.rung = rung
+        self.sent = 0
+        self.drops = 0
+
+
+class _Rung:
+    __slots__ = ("name", "scale", "quality", "lock", "seq", "jpeg", "encodes")
+
+    def __init__(self, name: str, scale: float, quality: int):
+        self.name = name
+        self.scale = scale
+        self.quality = quality
+        self.lock = threading.Lock()
+        self.seq = 0
+        self.jpeg: Optional[bytes] = None
+        self.encodes = 0
+
+
+def default_ladder(quality: int) -> List[Tuple[str, float, int]]:
+    return [("full", 1.0, quality), ("half", 0.5, max(30, quality - 10)), ("quarter", 0.25, max(30, quality - 20))]
+
+
+class FrameHub:
+    """
+    Latest frame, stamped with a sequence number, served as a JPEG ladder
+    (full/half/quarter by default) so a command-post monitor and a phone on
+    a satellite link can each pick a size.
+
+    Producers (any thread) publish the raw frame once. Only rungs that have
+    at least one streaming subscriber are encoded at publish time; each rung
+    is resized from the rung above it, so the downscale work is shared.
+    Snapshot readers encode a rung lazily, at most once per frame.
+
+    MJPEG clients are woken through a per-client asyncio.Event and always
+    take the newest frame, so a client that is slower than the producer (or
+    capped with max_fps) skips frames instead of queueing them. Thread
+    consumers can block on wait(). `send_age` records each streamed frame's
+    age (now - its capture ts) at the moment it is handed to the client.
+    """
+    def __init__(self, quality: int = 80, ladder: Optional[List[Tuple[str, float, int]]] = None):
+        self._rungs: Dict[str, _Rung] = {
+            name: _Rung(name, scale, q) for name, scale, q in (ladder or default_ladder(quality))
+        }
+        self._order = list(self._rungs)
+        self._cond = threading.Condition()
+        self._seq = 0
+        self._raw: Optional[np.ndarray] = None
+        self._src_jpeg: Optional[bytes] = None  # publish_jpeg() frame, decoded on the first smaller-rung request
+        self._dec_lock = threading.Lock()
+        self._imgs: Dict[str, np.ndarray] = {}  # scaled images of frame _imgs_seq, keyed by rung
+        self._imgs_seq = 0
+        self._img_lock = threading.Lock()
+        self._ts = 0.0
+        self._subs: Dict[int, _Subscriber] = {}
+        self._sent = 0
+        self._drops = 0
+        self.send_age = LatencyHistogram()
+
+    @property
+    def rungs(self) -> List[str]:
+        return list(self._order)
+
+    # ---------- producers ----------
+    def publish(self, frame: np.ndarray, ts: Optional[float] = None):
+        with self._cond:
+            self._seq += 1
+            self._raw = frame
+            self._src_jpeg = None
+            self._ts = ts if ts is not None else time.time()
+            seq = self._seq
+            wanted = {s.rung for s in self._subs.values()}
+        with self._img_lock:
+            self._imgs = {self._order[0]: frame}
+            self._imgs_seq = seq
+        for name in self._order:
+            if name in wanted:
+                self._get(name)
+        self._wake()
+
+    def publish_jpeg(self, jpeg: bytes, ts: Optional[float] = None):
+        """Pre-encoded full-size frame; smaller rungs decode it once, lazily, and downscale as usual."""
+        with self._cond:
+            self._seq += 1
+            self._raw = None
+            self._src_jpeg = jpeg
+            self._ts = ts if ts is not None else time.time()
+            r = self._rungs[self._order[0]]
+            r.jpeg, r.seq = jpeg, self._seq
+        self._wake()
+
+    def _decoded(self, seq: int, jpeg: bytes) -> Optional[np.ndarray]:
+        """Raw pixels of publish_jpeg() frame `seq`, decoded at most once."""
+        with self._dec_lock:
+            with self._cond:
+                if self._seq == seq and self._raw is not None:
+                    return self._raw
+            raw = cv2.imdecode(np.frombuffer(jpeg, np.uint8), cv2.IMREAD_COLOR)
+            if raw is None:
+                return None
+            with self._cond:
+                if self._seq == seq:
+                    self._raw = raw
+            with self._img_lock:
+                if self._imgs_seq < seq:
+                    self._imgs = {self._order[0]: raw}
+                    self._imgs_seq = seq
+            return raw
+
+    def _wake(self):
+        with self._cond:
+            subs = list(self._subs.values())
+            self._cond.notify_all()
+        for sub in subs:
+            try:
+                sub.loop.call_soon_threadsafe(sub.event.set)
+            except RuntimeError:
+                pass  # loop already closed; the stream's finally will unsubscribe
+
+    def _scaled(self, name: str, raw: np.ndarray, seq: int) -> np.ndarray:
+        with self._img_lock:
+            # a reader still holding an older frame resizes without touching the shared cache
+            cache = self._imgs if self._imgs_seq == seq else {self._order[0]: raw}
+            return self._chain(name, raw, cache)
+
+    def _chain(self, name: str, raw: np.ndarray, cache: Dict[str, np.ndarray]) -> np.ndarray:
+        img = cache.get(name)
+        if img is not None:
+            return img
+        src = self._chain(self._order[self._order.index(name) - 1], raw, cache)
+        r = self._rungs[name]
+        h, w = raw.shape[:2]
+        img = cv2.resize(src, (max(1, int(w * r.scale)), max(1, int(h * r.scale))), interpolation=cv2.INTER_AREA)
+        cache[name] = img
+        return img
+
+    def _get(self, name: str) -> Tuple[int, Optional[bytes], float]:
+        """(seq, jpeg, ts) of the newest frame at rung `name`, encoding it if this rung is stale."""
+        r = self._rungs[name]
+        with r.lock:
+            with self._cond:
+                seq, raw, ts, src = self._seq, self._raw, self._ts, self._src_jpeg
+            if r.seq == seq:
+                return r.seq, r.jpeg, ts
+            if raw is None and src is not None:
+                raw = self._decoded(seq, src)
+            if raw is None:
+                return r.seq, r.jpeg, ts
+            img = self._scaled(name, raw, seq)
+            ok, buf = cv2.imencode(".jpg", img, [int(cv2.IMWRITE_JPEG_QUALITY), r.quality])
+            if ok:
+                r.jpeg, r.seq = buf.tobytes(), seq   # jpeg first: encoded() trusts seq
+                r.encodes += 1
+            return r.seq, r.jpeg, ts
+
+    # ---------- consumers ----------
+    @property
+    def subscribers(self) -> int:
+        return len(self._subs)
+
+    def snapshot(self, rung: str = "full") -> Optional[bytes]:
+        return self._get(rung)[1]
+
+    def encoded(self, prefer: Optional[str] = None) -> Optional[bytes]:
+        """JPEG of the newest frame from any rung already encoded for it (`prefer` first, then smallest); never encodes."""
+        seq = self._seq
+        for name in ([prefer] if prefer in self._rungs else []) + self._order[::-1]:
+            r = self._rungs[name]
+            if r.seq == seq:
+                return r.jpeg
+        return None
+
+    def latest(self, rung: str = "full") -> Tuple[int, Optional[bytes], float]:
+        return self._get(rung)
+
+    def wait(self, after_seq: int, timeout: float = 1.0, rung: str = "full") -> Tuple[int, Optional[bytes], float]:
+        """Block (thread consumers) until a frame newer than after_seq exists or timeout."""
+        with self._cond:
+            if self._seq == after_seq:
+                self._cond.wait(timeout)
+        return self._get(rung)
+
+    async def stream(self, max_fps: Optional[float] = None, rung: str = "full",
+                     boundary: str = "frame") -> AsyncIterator[bytes]:
+        """multipart/x-mixed-replace body for one client."""
+        loop = asyncio.get_running_loop()
+        sub = _Subscriber(loop, rung)
+        key = id(sub)
+        with self._cond:
+            self._subs[key] = sub
+        period = 1.0 / max_fps if max_fps else 0.0
+        last_seq = 0
+        try:
+            while True:
+                if self._seq == last_seq:
+                    sub.event.clear()
+                    if self._seq == last_seq:
+                        try:
+                            await asyncio.wait_for(sub.event.wait(), timeout=5.0)
+                        except asyncio.TimeoutError:
+                            continue
+                seq, jpeg, ts = self._get(rung)
+                if jpeg is None or seq == last_seq:
+                    continue
+                if last_seq:
+                    sub.drops += seq - last_seq - 1
+                last_seq = seq
+                t0 = loop.time()
+                sub.sent += 1
+                self.send_age.record((time.time() - ts) * 1000.0)
+                yield mjpeg_part(jpeg, boundary)
+                if period:
+                    await asyncio.sleep(max(0.0, period - (loop.time() - t0)))
+        finally:
+            with self._cond:
+                self._subs.pop(key, None)
+                self._sent += sub.sent
+                self._drops += sub.drops
+
+    def stats(self) -> Dict:
+        with self._cond:
+            live = list(self._subs.values())
+            return {
+                "seq": self._seq,
+                "subscribers": len(live),
+                "sent": self._sent + sum(s.sent for s in live),
+                "drops": self._drops + sum(s.drops for s in live),
+                "age_ms": self.send_age.summary(),
+                "rungs": {name: {"subscribers": sum(1 for s in live if s.rung == name),
+                                 "encodes": r.encodes}
+                          for name, r in self._rungs.items()},
+            }
+
+
+class LazyProducer:
+    """
+    Feeds a FrameHub from `frames()` (a generator factory) on one thread,
+    only while the hub has subscribers; the generator is closed when the last
+    viewer leaves, so e.g. a screen grabber releases its handle.
+    """
+    def __init__(self, hub: FrameHub, frames: Callable[[], Iterator[np.ndarray]],
+                 fps: float = 10.0, idle_s: float = 2.0):
+        self.hub = hub
+        self.frames = frames
+        self.period = 1.0 / fps
+        self.idle_s = idle_s
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+    def ensure_running(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        gen = self.frames()
+        idle_since = None
+        try:
+            for item in gen:
+                t0 = time.time()
+                # items are frames, (frame, capture_ts), encoded JPEG bytes, or None (nothing new)
+                frame, ts = item if isinstance(item, tuple) else (item, t0)
+                if isinstance(frame, (bytes, bytearray)):
+                    self.hub.publish_jpeg(bytes(frame), ts)
+                elif frame is not None:
+                    self.hub.publish(frame, ts)
+                if self.hub.subscribers == 0:
+                    idle_since = idle_since or t0
+                    if t0 - idle_since > self.idle_s:
+                        break
+                else:
+                    idle_since = None
+                time.sleep(max(0.0, self.period - (time.time() - t0)))
+        finally:
+            gen.close()
+            with self._lock:
+                self._thread = None
+            if self.hub.subscribers:
+                self.ensure_running()  # a viewer arrived while we were shutting down
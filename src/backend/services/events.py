@@ -0,0 +1,134 @@
+"""Per-frame detection events, bridged from pipeline threads to asyncio.
+
+The pipeline calls :meth:`DetectionEvents.publish` once per finished frame.
+That computes the delta against the previous frame (added / updated / removed,
+keyed by track id), serializes it once, and wakes every subscriber through
+``loop.call_soon_threadsafe``. A subscriber that keeps up just forwards the
+shared text; a rate-limited or lagging one gets a delta computed from the
+last state it actually sent, so coalesced updates never lose adds/removes.
+"""
+from __future__ import annotations
+
+import asyncio
+import json
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+
+def _det_key(d: Dict[str, Any], i: int):
+    tid = d.get("id")
+    return tid if tid is not None else f"_{i}"
+
+
+def _jsonable(o):
+    return o.item() if hasattr(o, "item") else str(o)
+
+
+def diff(prev: Dict[Any, Dict], cur: Dict[Any, Dict]) -> Tuple[List[Dict], List[Dict], List[Any]]:
+    added = [d for k, d in cur.items() if k not in prev]
+    updated = [d for k, d in cur.items() if k in prev and prev[k] != d]
+    removed = [k for k in prev if k not in cur]
+    return added, updated, removed
+
+
+class Subscription:
+    def __init__(self, bus: "DetectionEvents", loop: asyncio.AbstractEventLoop,
+                 max_hz: Optional[float] = None):
+        self._bus = bus
+        self._loop = loop
+        self._event = asyncio.Event()
+        self._min_dt = 1.0 / max_hz if max_hz and max_hz > 0 else 0.0
+        self._last_send = 0.0
+        self.seq = 0                     # bus seq of the state the client holds
+        self.ts = 0.0                    # capture ts of that state's frame
+        self.state: Dict[Any, Dict] = {}
+        self.sent = 0
+        self.coalesced = 0
+
+    def _wake(self):
+        self._event.set()
+
+    async def next(self, timeout: Optional[float] = None) -> Optional[str]:
+        """Wait for the next event (JSON text); None on timeout."""
+        if self.seq >= self._bus.seq:
+            self._event.clear()
+            try:
+                await asyncio.wait_for(self._event.wait(), timeout)
+            except asyncio.TimeoutError:
+                return None
+        if self._min_dt:
+            wait = self._last_send + self._min_dt - time.monotonic()
+            if wait > 0:
+                await asyncio.sleep(wait)
+        text = self._bus._event_for(self)
+        if text is not None:
+            self._last_send = time.monotonic()
+            self.sent += 1
+        return text
+
+    def close(self):
+        self._bus.unsubscribe(self)
+
+
+class DetectionEvents:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subs: List[Subscription] = []
+        self.seq = 0
+        self._frame = 0
+        self._ts = 0.0
+        self._state: Dict[Any, Dict] = {}
+        self._text: Optional[str] = None   # delta seq-1 -> seq, encoded once
+
+    # ---------- producer side (any thread) ----------
+    def publish(self, frame_id: int, ts: float, dets: List[Dict]):
+        cur = {_det_key(d, i): d for i, d in enumerate(dets)}
+        with self._lock:
+            added, updated, removed = diff(self._state, cur)
+            if not (added or updated or removed) and self.seq:
+                self._frame, self._ts = frame_id, ts
+                return
+            self.seq += 1
+            self._frame, self._ts, self._state = frame_id, ts, cur
+            subs = list(self._subs)
+            self._text = self._encode(added, updated, removed) if subs else None
+        for s in subs:
+            try:
+                s._loop.call_soon_threadsafe(s._wake)
+            except RuntimeError:        # loop already closed
+                self.unsubscribe(s)
+
+    # ---------- consumer side (event loop) ----------
+    def subscribe(self, max_hz: Optional[float] = None) -> Subscription:
+        s = Subscription(self, asyncio.get_running_loop(), max_hz)
+        with self._lock:
+            self._subs.append(s)
+        return s
+
+    def unsubscribe(self, s: Subscription):
+        with self._lock:
+            if s in self._subs:
+                self._subs.remove(s)
+
+    def _event_for(self, s: Subscription) -> Optional[str]:
+        with self._lock:
+            if s.seq >= self.seq:
+                return None
+            if s.seq == self.seq - 1 and self._text is not None:
+                text = self._text
+            else:
+                s.coalesced += 1
+                text = self._encode(*diff(s.state, self._state))
+            s.seq, s.state, s.ts = self.seq, self._state, self._ts
+            return text
+
+    def _encode(self, added, updated, removed) -> str:
+        return json.dumps({"type": "detections", "seq": self.seq, "frame": self._frame,
+                           "ts": self._ts, "added": added, "updated": updated,
+                           "removed": removed}, separators=(",", ":"), default=_jsonable)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"seq": self.seq, "frame": self._frame, "subscribers": len(self._subs),
+                    "tracks": len(self._state)}
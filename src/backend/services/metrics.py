@@ -0,0 +1,199 @@
+"""Latency histograms and Prometheus text exposition.
+
+LatencyHistogram is HDR-style: values are kept in microseconds in
+log-linear buckets (16 linear sub-buckets per power of two, so any recorded
+value is known to within 6.25%) from 1 us to ~12 days, in a fixed array.
+Recording is an index computation and one increment, so every stage can
+record every frame. Nothing decays: like Prometheus counters, the
+histograms are cumulative since start and rates/quantiles over a window
+are left to the scraper.
+"""
+from __future__ import annotations
+
+import math
+import threading
+from typing import Dict, Iterable, List, Tuple
+
+import numpy as np
+
+_SUB_BITS = 4
+_SUB = 1 << _SUB_BITS          # 16
+_N = 40 * _SUB                 # up to 2^40 us
+
+# Prometheus bucket bounds (seconds) reported from the fine buckets
+PROM_BUCKETS = (0.001, 0.002, 0.005, 0.01, 0.02, 0.05, 0.1, 0.2, 0.5, 1.0, 2.0, 5.0, 10.0)
+
+
+def _index(us: int) -> int:
+    if us < 2 * _SUB:
+        return us
+    e = us.bit_length() - _SUB_BITS - 1
+    return min((e + 1) * _SUB + (us >> e) - _SUB, _N - 1)
+
+
+def _bounds(i: int) -> Tuple[int, int]:
+    """[lo, hi) microseconds of fine bucket i."""
+    if i < 2 * _SUB:
+        return i, i + 1
+    e = i // _SUB - 1
+    m = i % _SUB + _SUB
+    return m << e, (m + 1) << e
+
+
+_UPPER_US = np.array([_bounds(i)[1] for i in range(_N)], np.int64)
+
+
+class LatencyHistogram:
+    def __init__(self):
+        self._counts = np.zeros(_N, np.int64)
+        self._lock = threading.Lock()
+        self.count = 0
+        self.sum_ms = 0.0
+        self.max_ms = 0.0
+
+    def record(self, ms: float):
+        if not ms >= 0.0:           # negative (clock step) or NaN
+            ms = 0.0
+        i = _index(int(ms * 1000.0))
+        with self._lock:
+            self._counts[i] += 1
+            self.count += 1
+            self.sum_ms += ms
+            if ms > self.max_ms:
+                self.max_ms = ms
+
+    def snapshot(self) -> Tuple[np.ndarray, int, float, float]:
+        with self._lock:
+            return self._counts.copy(), self.count, self.sum_ms, self.max_ms
+
+    @staticmethod
+    def _quantile(counts: np.ndarray, n: int, q: float) -> float:
+        if n == 0:
+            return 0.0
+        i = int(np.searchsorted(np.cumsum(counts), max(1, math.ceil(q * n))))
+        lo, hi = _bounds(i)
+        return (lo + hi) / 2000.0
+
+    def quantile(self, q: float) -> float:
+        counts, n, _, _ = self.snapshot()
+        return self._quantile(counts, n, q)
+
+    def summary(self) -> Dict[str, float]:
+        counts, n, total, mx = self.snapshot()
+        out = {"n": n, "mean_ms": round(total / n, 3) if n else 0.0, "max_ms": round(mx, 3)}
+        for q in (0.5, 0.9, 0.99):
+            out[f"p{int(q * 100)}_ms"] = round(self._quantile(counts, n, q), 3)
+        return out
+
+    def buckets(self, bounds_s: Iterable[float] = PROM_BUCKETS) -> List[Tuple[float, int]]:
+        """Cumulative (le_seconds, count) pairs; a fine bucket counts toward le once its upper edge is <= le."""
+        counts, n, _, _ = self.snapshot()
+        cum = np.cumsum(counts)
+        out = []
+        for le in bounds_s:
+            k = int(np.searchsorted(_UPPER_US, int(round(le * 1e6)), side="right"))
+            out.append((le, int(cum[k - 1]) if k else 0))
+        return out
+
+
+class PipelineMetrics:
+    """Named latency histograms for one pipeline, created on first use."""
+    def __init__(self):
+        self._h: Dict[str, LatencyHistogram] = {}
+        self._lock = threading.Lock()
+
+    def hist(self, name: str) -> LatencyHistogram:
+        h = self._h.get(name)
+        if h is None:
+            with self._lock:
+                h = self._h.setdefault(name, LatencyHistogram())
+        return h
+
+    def attach(self, name: str, h: LatencyHistogram):
+        with self._lock:
+            self._h[name] = h
+
+    def observe(self, name: str, ms: float):
+        self.hist(name).record(ms)
+
+    def items(self) -> List[Tuple[str, LatencyHistogram]]:
+        with self._lock:
+            return sorted(self._h.items())
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        return {name: h.summary() for name, h in self.items() if h.count}
+
+
+# ---------- Prometheus text format ----------
+def _labels(labels: Dict[str, str], extra: str = "") -> str:
+    parts = ['%s="%s"' % (k, str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+             for k, v in labels.items()]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class PromText:
+    """Prometheus text exposition; samples are grouped per family whatever order they are added in."""
+    def __init__(self, prefix: str = "foresight_"):
+        self.prefix = prefix
+        self._families: Dict[str, List[str]] = {}
+
+    def _family(self, name: str, kind: str, help_: str) -> Tuple[str, List[str]]:
+        full = self.prefix + name
+        lines = self._families.get(full)
+        if lines is None:
+            lines = self._families[full] = [f"# HELP {full} {help_}", f"# TYPE {full} {kind}"]
+        return full, lines
+
+    def sample(self, name: str, kind: str, help_: str, value, **labels):
+        if value is None:
+            return
+        full, lines = self._family(name, kind, help_)
+        lines.append(f"{full}{_labels(labels)} {float(value):g}")
+
+    def counter(self, name: str, help_: str, value, **labels):
+        self.sample(name if name.endswith("_total") else name + "_total", "counter", help_, value, **labels)
+
+    def gauge(self, name: str, help_: str, value, **labels):
+        self.sample(name, "gauge", help_, value, **labels)
+
+    def histogram(self, name: str, help_: str, h: LatencyHistogram, **labels):
+        full, lines = self._family(name, "histogram", help_)
+        for le, c in h.buckets():
+            lines.append("%s_bucket%s %d" % (full, _labels(labels, 'le="%g"' % le), c))
+        _, n, total, _ = h.snapshot()
+        lines.append("%s_bucket%s %d" % (full, _labels(labels, 'le="+Inf"'), n))
+        lines.append(f"{full}_sum{_labels(labels)} {total / 1000.0:g}")
+        lines.append(f"{full}_count{_labels(labels)} {n}")
+
+    def latency(self, metrics: PipelineMetrics, **labels):
+        """Every histogram of `metrics` as foresight_latency_seconds{stage=...} plus quantile gauges."""
+        for stage, h in metrics.items():
+            self.histogram("latency_seconds", "Per-stage latency and frame age (capture ts -> event).",
+                           h, **labels, stage=stage)
+            for q in (0.5, 0.9, 0.99):
+                self.gauge("latency_quantile_seconds", "HDR-histogram quantiles of latency_seconds.",
+                           h.quantile(q) / 1000.0, **labels, stage=stage, quantile=f"{q:g}")
+
+    def render(self) -> str:
+        return "".join(line + "\n" for lines in self._families.values() for line in lines)
+
+
+def render_pipelines(pipes: Dict[str, "object"]) -> str:
+    """Prometheus text for SarPipeline instances keyed by source name."""
+    out = PromText()
+    for name, pipe in pipes.items():
+        out.latency(pipe.metrics, source=name)
+        for metric, (help_, values) in pipe.counters().items():
+            for key, v in values.items():
+                if key:
+                    out.counter(metric, help_, v, source=name, stage=key)
+                else:
+                    out.counter(metric, help_, v, source=name)
+        st = pipe.stats()
+        out.gauge("fps", "Smoothed output frame rate.", st.get("fps"), source=name)
+        out.gauge("running", "1 while the pipeline is running.", 1 if pipe.running else 0, source=name)
+        out.gauge("mjpeg_clients", "Open MJPEG streams.", st["stream"]["subscribers"], source=name)
+        out.gauge("ws_clients", "Open /ws/sar subscriptions.", st["events"]["subscribers"], source=name)
+    return out.render()
@@ -0,0 +1,134 @@
+from __future__ import annotations
+import threading, time, os
+from typing import Dict, Optional
+from .pipeline import DetectorBackend, SarPipeline
+
+
+def parse_sources(spec: str) -> Dict[str, str]:
+    """
+    "drone1=rtsp://host/a,drone2=udp://127.0.0.1:5000" -> {"drone1": ..., "drone2": ...}
+    Unnamed entries get src0, src1, ...
+    """
+    out: Dict[str, str] = {}
+    for i, part in enumerate(p.strip() for p in spec.split(",")):
+        if not part:
+            continue
+        name, sep, url = part.partition("=")
+        if not sep or ":" in name or "/" in name:
+            name, url = f"src{i}", part
+        out[name.strip()] = url.strip()
+    return out
+
+
+class MultiSourcePipeline:
+    """
+    N video sources served by one detector instance.
+
+    Each source is a staged SarPipeline (capture, privacy/annotate, encode on
+    their own threads) whose "infer" stage is replaced by a single tick loop:
+    wake when any source's capture stage signals a new frame, take the newest
+    frame waiting from every source, run one batched detect call over the ones
+    that are keyframes, and hand each result back to its own pipeline
+    (non-keyframes coast on their tracker).
+    Per-source state and stats stay on the SarPipeline instances.
+    """
+    def __init__(self, sources: Dict[str, str], detector: Optional[DetectorBackend] = None):
+        if not sources:
+            raise ValueError("MultiSourcePipeline needs at least one source")
+        self.detector = detector or DetectorBackend()
+        self.pipes: Dict[str, SarPipeline] = {
+            name: SarPipeline(url, staged=True, detector=self.detector, clip_share=len(sources))
+            for name, url in sources.items()
+        }
+        self.running = False
+        self.thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self._frame_ready = threading.Event()   # set by every source's capture stage
+        self._ticks = 0
+        self._frames = 0
+        self._batch_avg = 0.0
+        self._tick_ms = 0.0
+        self._fps = 0.0
+
+    @classmethod
+    def from_env(cls) -> Optional["MultiSourcePipeline"]:
+        spec = os.environ.get("FORESIGHT_SOURCES", "")
+        sources = parse_sources(spec)
+        return cls(sources) if sources else None
+
+    # ---------- public API ----------
+    def default(self) -> SarPipeline:
+        return next(iter(self.pipes.values()))
+
+    def get(self, name: str) -> Optional[SarPipeline]:
+        return self.pipes.get(name)
+
+    def start(self):
+        if self.running:
+            return
+        self.running = True
+        for pipe in self.pipes.values():
+            pipe.start(infer=False, frame_ready=self._frame_ready)
+        self.thread = threading.Thread(target=self._loop, name="sar-batch-infer", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.running = False
+        if self.thread:
+            self.thread.join(timeout=1.0)
+        for pipe in self.pipes.values():
+            pipe.stop()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "sources": list(self.pipes),
+                "detector": self.detector.name,
+                "ticks": self._ticks,
+                "batch": round(self._batch_avg, 2),
+                "tick_ms": round(self._tick_ms, 2),
+                "fps": round(self._fps, 1),
+            }
+
+    # ---------- internals ----------
+    def _loop(self):
+        names = list(self.pipes)
+        last = time.time()
+        ready = self._frame_ready
+        while self.running:
+            if not ready.wait(0.1):
+                continue
+            ready.clear()  # before taking: a frame queued after this re-arms the event
+            batch = []
+            for name in names:
+                pipe = self.pipes[name]
+                pkt = pipe.take_frame()
+                if pkt is None:
+                    continue
+                t_pkt = time.time()
+                if pipe.wants_detect(pkt):
+                    batch.append((name, pkt))
+                else:
+                    # between keyframes the source's tracker carries detections forward
+                    pipe.finish_frame(pkt, None, t_pkt)
+            if not batch:
+                continue
+
+            t0 = time.time()
+            results = self.detector.detect_batch([pkt["frame"] for _, pkt in batch],
+                                                 [self.pipes[name].tiler for name, _ in batch])
+            # hand results back: blur/annotate/encode continue on each source's own threads
+            for (name, pkt), dets in zip(batch, results):
+                self.pipes[name].finish_frame(pkt, dets, t0)
+
+            now = time.time()
+            dt = now - last
+            last = now
+            fps = len(batch) / dt if dt > 0 else 0
+            ms = (now - t0) * 1000.0
+            with self._lock:
+                self._ticks += 1
+                self._frames += len(batch)
+                self._tick_ms = 0.9*self._tick_ms + 0.1*ms if self._tick_ms > 0 else ms
+                self._batch_avg = 0.9*self._batch_avg + 0.1*len(batch) if self._batch_avg > 0 else len(batch)
+                self._fps = 0.9*self._fps + 0.1*fps if self._fps > 0 else fps
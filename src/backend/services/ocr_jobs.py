@@ -0,0 +1,167 @@
+"""
+OCR as jobs on a bounded worker pool.
+
+Request handlers submit a frame and wait a short while for the text; a
+slow job keeps running and its id can be polled, so tesseract never holds
+a request thread for seconds. Results are cached by frame fingerprint (a
+quantized grayscale thumbnail) and identical frames already in flight
+share one job, so a static screen or camera is read once however many
+clients ask. At most `max_pending` jobs wait or run at a time; beyond that
+submit() raises OcrBusy and the handler answers 503.
+"""
+import hashlib
+import itertools
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Optional
+
+import cv2
+import numpy as np
+from loguru import logger
+
+try:
+    import pytesseract
+except Exception:
+    pytesseract = None
+
+
+class OcrBusy(RuntimeError):
+    pass
+
+
+def frame_fingerprint(frame: np.ndarray) -> str:
+    """Changes with the picture, not with sensor noise: 160 px wide gray thumbnail, 5 bits per pixel."""
+    gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY) if frame.ndim == 3 else frame
+    h, w = gray.shape[:2]
+    small = cv2.resize(gray, (160, max(1, int(160 * h / max(w, 1)))), interpolation=cv2.INTER_AREA)
+    return hashlib.blake2b((small >> 3).tobytes(), digest_size=12).hexdigest()
+
+
+def tesseract_text(frame: np.ndarray) -> str:
+    if pytesseract is None:
+        raise RuntimeError("pytesseract is not installed")
+    gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY) if frame.ndim == 3 else frame
+    return pytesseract.image_to_string(gray).strip()
+
+
+class OcrJobs:
+    def __init__(self, workers: int = 2, max_pending: int = 8, cache_size: int = 64,
+                 keep_jobs: int = 256, ocr=tesseract_text):
+        self.max_pending = max_pending
+        self.cache_size = cache_size
+        self.keep_jobs = keep_jobs
+        self.ocr = ocr
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="ocr")
+        self._lock = threading.Lock()
+        self._cond = threading.Condition(self._lock)
+        self._jobs: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._cache: "OrderedDict[str, str]" = OrderedDict()
+        self._inflight: Dict[str, str] = {}      # fingerprint -> job id
+        self._ids = itertools.count(1)
+        self._pending = 0
+        self.counts = {"submitted": 0, "cache_hits": 0, "joined": 0, "rejected": 0, "done": 0, "failed": 0}
+
+    @classmethod
+    def from_env(cls) -> "OcrJobs":
+        """FORESIGHT_OCR_WORKERS (2) / FORESIGHT_OCR_QUEUE (8) / FORESIGHT_OCR_CACHE (64)."""
+        return cls(int(os.environ.get("FORESIGHT_OCR_WORKERS", "2")),
+                   int(os.environ.get("FORESIGHT_OCR_QUEUE", "8")),
+                   int(os.environ.get("FORESIGHT_OCR_CACHE", "64")))
+
+    def _new(self, kind: str, fp: str, status: str, **extra) -> Dict[str, Any]:
+        job = {"id": f"{next(self._ids):x}-{fp[:6]}", "kind": kind, "fingerprint": fp, "status": status,
+               "cached": False, "text": None, "error": None, "created": time.time(),
+               "started": None, "finished": None, **extra}
+        self._jobs[job["id"]] = job
+        while len(self._jobs) > self.keep_jobs:
+            old_id, old = next(iter(self._jobs.items()))
+            if old["status"] in ("queued", "running"):
+                break
+            del self._jobs[old_id]
+        return job
+
+    def submit(self, frame: np.ndarray, kind: str = "frame", frame_ts: Optional[float] = None) -> Dict[str, Any]:
+        """Job dict for this frame: cached, joined to an identical one in flight, or newly queued."""
+        fp = frame_fingerprint(frame)
+        with self._lock:
+            text = self._cache.get(fp)
+            if text is not None:
+                self._cache.move_to_end(fp)
+                self.counts["cache_hits"] += 1
+                now = time.time()
+                job = self._new(kind, fp, "done", cached=True, text=text, frame_ts=frame_ts, finished=now)
+                return dict(job)
+            jid = self._inflight.get(fp)
+            if jid is not None and jid in self._jobs:
+                self.counts["joined"] += 1
+                return dict(self._jobs[jid])
+            if self._pending >= self.max_pending:
+                self.counts["rejected"] += 1
+                raise OcrBusy(f"{self._pending} OCR jobs pending")
+            job = self._new(kind, fp, "queued", frame_ts=frame_ts)
+            self._inflight[fp] = job["id"]
+            self._pending += 1
+            self.counts["submitted"] += 1
+        self._pool.submit(self._run, job, frame.copy())
+        return dict(job)
+
+    def _run(self, job: Dict[str, Any], frame: np.ndarray):
+        with self._lock:
+            job["status"], job["started"] = "running", time.time()
+        text, err = None, None
+        try:
+            text = self.ocr(frame)
+        except Exception as e:
+            err = str(e)
+            logger.warning(f"OCR job {job['id']}: {e}")
+        with self._cond:
+            job["finished"] = time.time()
+            if err is None:
+                job["status"], job["text"] = "done", text
+                self._cache[job["fingerprint"]] = text
+                while len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+                self.counts["done"] += 1
+            else:
+                job["status"], job["error"] = "error", err
+                self.counts["failed"] += 1
+            self._inflight.pop(job["fingerprint"], None)
+            self._pending -= 1
+            self._cond.notify_all()
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return dict(job) if job is not None else None
+
+    def wait(self, job_id: str, timeout: float) -> Optional[Dict[str, Any]]:
+        """The job once finished, or its current state after `timeout` seconds."""
+        with self._cond:
+            self._cond.wait_for(lambda: self._jobs.get(job_id, {}).get("status") not in ("queued", "running"),
+                                max(0.0, timeout))
+            job = self._jobs.get(job_id)
+            return dict(job) if job is not None else None
+
+    def close(self):
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {**self.counts, "pending": self._pending, "max_pending": self.max_pending,
+                    "cached": len(self._cache), "jobs": len(self._jobs)}
+
+
+def job_view(job: Dict[str, Any], text_key: str) -> Dict[str, Any]:
+    """Response body for a job: the text under `text_key` once done, else where to poll."""
+    out = {"job": job["id"], "status": job["status"], "cached": job["cached"]}
+    if job["status"] == "done":
+        out[text_key] = job["text"]
+        out["ms"] = int((job["finished"] - job["created"]) * 1000)
+    elif job["status"] == "error":
+        out["error"] = job["error"]
+    else:
+        out["poll"] = f"/ocr/jobs/{job['id']}"
+    return out
@@ -1,8 +1,149 @@
 from __future__ import annotations
-import threading, time, os
-from typing import List, Dict, Optional
+import re, threading, time, os
+from collections import deque
+from typing import Any, List, Dict, Optional
 import cv2
 import numpy as np
+from ...detect.scheduler import KeyframeScheduler
+from ...detect.tiling import TiledDetector
+from ...detect.yolo_infer import UltralyticsDetector, YoloDetector
+from ...evidence.clip_ring import ClipRing
+from ...evidence.store import EvidenceWriter, default_writer
+from ...privacy.face_blur import PrivacyEngine
+from ...reid.lock import SuspectLock
+from ...track.iou_tracker import IoUTracker
+from ...ingest.video_source import VideoSource
+from .broadcast import FrameHub
+from .events import DetectionEvents
+from .metrics import PipelineMetrics
+
+
+class LatestSlot:
+    """
+    Bounded hand-off between two pipeline stages where the newest item wins:
+    putting into a full slot evicts the oldest item and counts it as a drop,
+    so a slow consumer sees fresh frames instead of a growing backlog.
+    """
+    def __init__(self, name: str, capacity: int = 1):
+        self.name = name
+        self.capacity = max(1, int(capacity))
+        self._items: deque = deque()
+        self._cond = threading.Condition()
+        self.puts = 0
+        self.drops = 0
+
+    def put(self, item: Any):
+        with self._cond:
+            if len(self._items) >= self.capacity:
+                self._items.popleft()
+                self.drops += 1
+            self._items.append(item)
+            self.puts += 1
+            self._cond.notify()
+
+    def get(self, timeout: float = 0.1) -> Optional[Any]:
+        with self._cond:
+            if not self._items:
+                self._cond.wait(timeout)
+            if not self._items:
+                return None
+            return self._items.popleft()
+
+    def clear(self):
+        with self._cond:
+            self._items.clear()
+
+    def depth(self) -> int:
+        with self._cond:
+            return len(self._items)
+
+    def stats(self) -> Dict:
+        with self._cond:
+            return {"depth": len(self._items), "drops": self.drops, "puts": self.puts}
+
+
+def to_pipeline(dets: List[Dict]) -> List[Dict]:
+    """detector-layer {"cls", "conf", "bbox"} -> pipeline {"name", "conf", "xyxy"}"""
+    out = []
+    for d in dets:
+        x, y, w, h = d["bbox"]
+        out.append({"name": d["cls"], "conf": d["conf"], "xyxy": [x, y, x+w, y+h]})
+    return out
+
+
+class DetectorBackend:
+    """
+    Whichever detector is available, behind one batched call:
+      - ONNX Runtime on CPU when FORESIGHT_ONNX is set
+      - otherwise ultralytics YOLO if installed
+      - otherwise a mock moving "person" box
+    Results use the pipeline format {"name", "conf", "xyxy"}. `raw` is the
+    detector-layer object (YoloDetector / UltralyticsDetector) or None.
+    """
+    def __init__(self):
+        self.raw = None
+        self._kind = "mock"
+        onnx_path = os.environ.get("FORESIGHT_ONNX")
+        if onnx_path:
+            try:
+                det = YoloDetector(onnx_path)
+                if det.session is not None:
+                    self.raw, self._kind = det, "onnx"
+            except Exception:
+                pass
+        if self.raw is None:
+            try:
+                from ultralytics import YOLO
+                model_path = os.environ.get("FORESIGHT_YOLO", "yolov8n.pt")
+                self.raw, self._kind = UltralyticsDetector(YOLO(model_path)), "ultralytics"
+            except Exception:
+                self.raw = None  # ok: we’ll simulate detections
+
+    @property
+    def name(self) -> str:
+        return self._kind
+
+    def detect(self, frame, tiler: Optional[TiledDetector] = None) -> List[Dict]:
+        return self.detect_batch([frame], [tiler])[0]
+
+    def detect_batch(self, frames, tilers: Optional[List[Optional[TiledDetector]]] = None) -> List[List[Dict]]:
+        """
+        One raw infer_batch call for all frames. A frame with a tiler
+        contributes its selected tiles instead of itself, so tiles from
+        every source still share the one batch.
+        """
+        if not frames:
+            return []
+        if self.raw is None:
+            # mock: one moving "person" box
+            t = time.time()
+            out = []
+            for frame in frames:
+                h, w = frame.shape[:2]
+                x = int((np.cos(t) * 0.4 + 0.5) * (w - 120))
+                y = int((np.sin(t) * 0.2 + 0.5) * (h - 200))
+                out.append([{"name": "person", "conf": 0.76, "xyxy": [x, y, x+120, y+200], "id": 1}])
+            return out
+
+        tilers = tilers or [None] * len(frames)
+        crops, spans = [], []
+        for frame, tiler in zip(frames, tilers):
+            c = tiler.prepare(frame) if tiler is not None else [frame]
+            spans.append((len(crops), len(crops) + len(c)))
+            crops.extend(c)
+        try:
+            results = self.raw.infer_batch(crops) if crops else []
+        except Exception:
+            results = [[] for _ in crops]
+
+        out = []
+        for frame, tiler, (a, b) in zip(frames, tilers, spans):
+            if tiler is not None:
+                out.append(to_pipeline(tiler.finish(frame, results[a:b])))
+            else:
+                out.append(to_pipeline(results[a]) if b > a else [])
+        return out
+
 
 class SarPipeline:
     """
@@ -10,53 +151,131 @@ class SarPipeline:
       - reads frames from webcam (0) or UDP (e.g. udp://127.0.0.1:5555)
       - optional YOLO (if ultralytics/torch available) else mock detections
       - face blur when sar_blur=True
-      - exposes latest annotated JPEG and rolling stats
+      - exposes latest annotated JPEG (full/half/quarter) and rolling stats
+
+    In staged mode (default, FORESIGHT_STAGED=0 to disable) capture, inference,
+    privacy/annotate and encode each run on their own thread and hand frames
+    over through LatestSlot, so the slowest stage drops stale frames instead
+    of adding latency to every other stage.
+
+    Several pipelines can share one DetectorBackend; see MultiSourcePipeline,
+    which then drives the "infer" stage for all of them in one batch.
     """
-    def __init__(self, source: Optional[str] = None):
+    STAGES = ("capture", "infer", "privacy", "encode")
+
+    def __init__(self, source: Optional[str] = None, staged: Optional[bool] = None,
+                 detector: Optional[DetectorBackend] = None, clip_share: int = 1):
         self.source = source or os.environ.get("FORESIGHT_SOURCE", "0")  # "0" -> webcam
+        if staged is None:
+            staged = os.environ.get("FORESIGHT_STAGED", "1") != "0"
+        self.staged = bool(staged)
         self.running = False
         self.thread: Optional[threading.Thread] = None
+        self._threads: List[threading.Thread] = []
+
+        # stage graph: slot <name> feeds stage <name>
+        self._slots: Dict[str, LatestSlot] = {name: LatestSlot(name) for name in self.STAGES[1:]}
+        self._stage_ms: Dict[str, float] = {name: 0.0 for name in self.STAGES}
+        # per-stage work/wait histograms plus frame age at publish and at send (see /metrics)
+        self.metrics = PipelineMetrics()
+        self._frame_id = 0
+        self._frame_ready: Optional[threading.Event] = None
 
         self._cap = None
         self._lock = threading.Lock()
-        self._last_jpeg: Optional[bytes] = None
+        # full/half/quarter JPEG ladder; rungs are encoded only while someone wants them
+        self.hub = FrameHub(quality=85)
+        # per-frame detection deltas for /ws/sar subscribers
+        self.events = DetectionEvents()
+        self.metrics.attach("mjpeg_age", self.hub.send_age)
         self._fps = 0.0
         self._latency_ms = 0
         self._geo_error_m = 2.5
         self._detections: List[Dict] = []
 
+        # bystander face blur (configs/privacy.yaml controls.blur_non_targets)
+        self._privacy = PrivacyEngine()
+
         # mode state
         self.mode = "sar"     # "sar" or "suspect"
-        self.sar_blur = True  # blur faces in SAR mode
+        self.sar_blur = self._privacy.enabled  # blur faces in SAR mode
+        # suspect mode: appearance embeddings keep a locked person across track ids
+        self._reid = SuspectLock.from_env(on_event=lambda event, **f: self._audit(event, **f))
 
-        # optional YOLO
-        self._yolo = None
-        try:
-            from ultralytics import YOLO
-            model_path = os.environ.get("FORESIGHT_YOLO", "yolov8n.pt")
-            self._yolo = YOLO(model_path)
-        except Exception:
-            self._yolo = None  # ok: we’ll simulate detections
+        # annotated keyframes + detection records + audit trail, written off-thread;
+        # the writer (out/evidence + its thread) comes up on start() or the first audited action
+        self._evidence: Optional[EvidenceWriter] = None
+        self._evidence_every = float(os.environ.get("FORESIGHT_EVIDENCE_EVERY", 2.0))
+        self._ev_last = 0.0
+        self._ev_tracks: set = set()
+        # pre/post-roll clips around new tracks and high-confidence hits; the arena
+        # (FORESIGHT_CLIP_MB split over clip_share feeds) is allocated on start()
+        self._clips: Optional[ClipRing] = None
+        self._clip_share = max(1, int(clip_share))
+        # with nothing encoded for a frame, encode for pre-roll at most this often until a clip records
+        self._clip_idle_fps = float(os.environ.get("FORESIGHT_CLIP_IDLE_FPS", 4))
+        self._clip_enc_ts = 0.0
+        self._clip_rung = os.environ.get("FORESIGHT_CLIP_RUNG", "half")
+        self._clip_conf = float(os.environ.get("FORESIGHT_CLIP_CONF", 0.8))
+        self._clip_seen: set = set()
+        self._clip_high: set = set()
 
-        # OpenCV frontal face detector
-        try:
-            cascade_path = cv2.data.haarcascades + "haarcascade_frontalface_default.xml"
-            self._face_cascade = cv2.CascadeClassifier(cascade_path)
-        except Exception:
-            self._face_cascade = None
+        self._detector = detector or DetectorBackend()
+        # sliced inference for small targets at altitude (FORESIGHT_TILES=1)
+        self._tiler: Optional[TiledDetector] = None
+        if os.environ.get("FORESIGHT_TILES", "0") != "0" and self._detector.raw is not None:
+            self._tiler = TiledDetector(self._detector.raw)
+        self._tracker = IoUTracker(iou_thr=0.3, ttl=15)
+        # full detector on keyframes only; FORESIGHT_KEYFRAME_MAX=1 detects every frame
+        self._scheduler = KeyframeScheduler(max_interval=int(os.environ.get("FORESIGHT_KEYFRAME_MAX", 6)))
+        # keyframes and coasted frames both report tracks seen within one keyframe interval
+        self._track_age = max(1, self._scheduler.max_interval)
 
     # ---------- public API ----------
-    def start(self):
+    def start(self, infer: bool = True, frame_ready: Optional[threading.Event] = None):
+        """
+        infer=False leaves inference to an external (batched) consumer: it takes
+        frames with take_frame() and returns them with finish_frame(). The capture
+        stage sets `frame_ready` (if given) after each frame it queues.
+        """
         if self.running:
             return
+        self._frame_ready = frame_ready
         self.running = True
-        self.thread = threading.Thread(target=self._loop, daemon=True)
-        self.thread.start()
+        self._open_evidence()
+        self._audit("pipeline_start", staged=self.staged)
+        if self._clips is None:
+            self._clips = ClipRing.from_env(prefix="clip-" + re.sub(r"[^A-Za-z0-9]+", "_", self.source)[-24:],
+                                            on_clip=lambda path, info: self._audit("clip", path=path, **info),
+                                            share=self._clip_share)
+        if not self.staged:
+            self.thread = threading.Thread(target=self._loop, daemon=True)
+            self.thread.start()
+            self._threads = [self.thread]
+            return
+        for slot in self._slots.values():
+            slot.clear()
+        workers = {
+            "capture": self._capture_stage,
+            "infer": self._infer_stage,
+            "privacy": self._privacy_stage,
+            "encode": self._encode_stage,
+        }
+        if not infer:
+            del workers["infer"]
+        self._threads = [threading.Thread(target=fn, name=f"sar-{name}", daemon=True)
+                         for name, fn in workers.items()]
+        self.thread = self._threads[0]
+        for t in self._threads:
+            t.start()
 
     def stop(self):
+        if self.running:
+            self._audit("pipeline_stop")
         self.running = False
-        if self.thread:
-            self.thread.join(timeout=1.0)
+        for t in self._threads:
+            t.join(timeout=1.0)
+        self._threads = []
         if self._cap:
             try:
                 self._cap.release()
@@ -64,14 +283,38 @@ class SarPipeline:
                 pass
 
     def set_mode(self, mode: str):
-        self.mode = "sar" if mode.lower() == "sar" else "suspect"
+        mode = "sar" if mode.lower() == "sar" else "suspect"
+        if mode != self.mode:
+            self._audit("mode", mode=mode, previous=self.mode)
+        self.mode = mode
+        if mode == "sar":
+            self._reid.clear()   # embeddings only exist while suspect mode is on
+
+    def set_lock(self, enabled: bool, track: Optional[int] = None) -> Dict:
+        """Suspect lock on `track` (default: most confident person in view); switches to suspect mode."""
+        if not enabled:
+            self._reid.clear()
+        else:
+            self.set_mode("suspect")
+            self._reid.lock(track)
+        return self._reid.stats()
+
+    def add_suspect_reference(self, image: np.ndarray) -> Dict:
+        self.set_mode("suspect")
+        self._reid.add_reference(image)
+        return self._reid.stats()
 
     def set_blur(self, enabled: bool):
+        if bool(enabled) != self.sar_blur:
+            self._audit("blur", enabled=bool(enabled))
         self.sar_blur = bool(enabled)
+        self._privacy.enabled = self.sar_blur
 
-    def snapshot_jpeg(self) -> Optional[bytes]:
-        with self._lock:
-            return self._last_jpeg
+    def suspect_candidates(self, k: int = 5) -> List[Dict]:
+        return self._reid.candidates(k)
+
+    def snapshot_jpeg(self, size: str = "full") -> Optional[bytes]:
+        return self.hub.snapshot(size)
 
     def stats(self) -> Dict:
         with self._lock:
@@ -82,19 +325,65 @@ class SarPipeline:
                 "detections": list(self._detections),
                 "mode": self.mode,
                 "blur": self.sar_blur,
+                "detector": self._detector.name,
+                "scheduler": self._scheduler.stats(),
+                "tiling": self._tiler.stats() if self._tiler else None,
+                "stream": self.hub.stats(),
+                "source": self._cap.stats() if self._cap else None,
+                "events": self.events.stats(),
+                "privacy": self._privacy.stats(),
+                "lock": self._reid.stats(),
+                "evidence": self._evidence.stats() if self._evidence else None,
+                "clips": self._clips.stats() if self._clips else None,
+                "stages": self._stage_stats(),
+                "latency_ms": self.metrics.summary(),
             }
 
+    def counters(self) -> Dict[str, Any]:
+        """Monotonic drop/skip counters for /metrics: name -> (help, {stage or "": value})."""
+        sched = self._scheduler
+        src = self._cap.stats() if self._cap else {}
+        return {
+            "frames_superseded": ("Frames replaced in a stage's input slot before the stage took them.",
+                                  {name: slot.drops for name, slot in self._slots.items()}),
+            "keyframes": ("Frames that ran the full detector.", {"": sched.keyframes}),
+            "frames_coasted": ("Frames carried by the tracker instead of the detector.", {"": sched.skipped}),
+            "source_frames_dropped": ("Frames decoded by the source reader but never read.",
+                                      {"": src.get("dropped", 0)}),
+            "source_reconnects": ("Source reconnects.", {"": src.get("reconnects", 0)}),
+            "mjpeg_frames_skipped": ("Frames MJPEG clients skipped to stay current.",
+                                     {"": self.hub.stats()["drops"]}),
+            "clip_frames_lost": ("Clip frames overwritten before the clip writer copied them.",
+                                 {"": self._clips.lost if self._clips else 0}),
+        }
+
+    def _stage_stats(self) -> Dict:
+        out = {}
+        for name in self.STAGES:
+            entry = {"ms": round(self._stage_ms[name], 2)}
+            slot = self._slots.get(name)
+            if slot is not None:
+                entry.update(slot.stats())
+            out[name] = entry
+        return out
+
     # ---------- internals ----------
     def _open_capture(self):
-        src = self.source
-        if src == "0" or src.isdigit():
-            self._cap = cv2.VideoCapture(int(src))
-        else:
-            # UDP or file
-            self._cap = cv2.VideoCapture(src, cv2.CAP_FFMPEG)
-        if not self._cap or not self._cap.isOpened():
-            # fallback to a synthetic generator if no camera/stream is found
-            self._cap = None
+        # reader thread drains the source and reconnects; until it has ever
+        # produced a frame we show a synthetic feed so the UI has *something*
+        self._cap = VideoSource(self.source).start()
+
+    def _read_frame(self, t):
+        """(frame, capture_ts) or (None, t) while a live source is between frames."""
+        cap = self._cap
+        if cap is None:
+            return self._synthesize_frame(t), t
+        ok, frame = cap.read(timeout=0.1 if cap.ever_connected else 0.0)
+        if ok:
+            return frame, cap.last_ts
+        if not cap.ever_connected:
+            return self._synthesize_frame(t), t
+        return None, t
 
     def _synthesize_frame(self, t):
         # gray background + moving box (so UI shows *something*)
@@ -105,54 +394,48 @@ class SarPipeline:
         return img
 
     def _maybe_yolo(self, frame):
-        dets = []
-        if self._yolo is None:
-            # mock: one moving "person" box
-            h, w = frame.shape[:2]
-            t = time.time()
-            x = int((np.cos(t) * 0.4 + 0.5) * (w - 120))
-            y = int((np.sin(t) * 0.2 + 0.5) * (h - 200))
-            dets.append({"name": "person", "conf": 0.76, "xyxy": [x, y, x+120, y+200], "id": 1})
-            return dets
+        """(dets, keyframe)"""
+        if not self._is_keyframe(frame):
+            return self._coast(), False
+        return self._track(self._detector.detect(frame, self._tiler)), True
 
-        # real YOLO
-        try:
-            results = self._yolo.predict(frame, verbose=False)
-            for r in results:
-                for b in r.boxes:
-                    xyxy = b.xyxy.cpu().numpy().astype(int)[0].tolist()
-                    name = self._yolo.names.get(int(b.cls[0]), "obj")
-                    dets.append({"name": name, "conf": float(b.conf[0]), "xyxy": xyxy})
-        except Exception:
-            pass
-        return dets
+    def _is_keyframe(self, frame) -> bool:
+        return self._scheduler.should_detect(frame, self._tracker.confidence())
+
+    def _track(self, dets):
+        # stable per-track ids for map pins and per-track logic downstream
+        out = self._tracker.update(dets)
+        self._scheduler.note_confidence(self._tracker.confidence())
+        # plus tracks this keyframe missed that the coasted frames around it still show
+        seen = {d["id"] for d in out}
+        return out + [t for t in self._tracker.tracks(self._track_age) if t["id"] not in seen]
+
+    def _coast(self):
+        return self._tracker.coast(self._track_age)
+
+    def _suspect(self, frame, dets, ts):
+        # before blur/annotate: embeddings come from the raw pixels
+        if self.mode != "suspect":
+            return dets
+        return self._reid.update(frame, dets, ts)
 
-    def _apply_face_blur(self, frame):
-        if not self.sar_blur or self._face_cascade is None:
+    def _apply_face_blur(self, frame, keyframe: bool = False):
+        if not self.sar_blur:
             return frame
-        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-        faces = self._face_cascade.detectMultiScale(gray, 1.2, 5)
-        for (x, y, w, h) in faces:
-            roi = frame[y:y+h, x:x+w]
-            if roi.size == 0: 
-                continue
-            roi = cv2.GaussianBlur(roi, (31, 31), 0)
-            frame[y:y+h, x:x+w] = roi
-        return frame
+        return self._privacy.apply(frame, keyframe)
 
     def _annotate(self, frame, dets):
         for d in dets:
             if "xyxy" in d:
                 x1, y1, x2, y2 = map(int, d["xyxy"])
-                cv2.rectangle(frame, (x1, y1), (x2, y2), (37, 140, 255), 2)
+                locked = d.get("locked", False)
+                cv2.rectangle(frame, (x1, y1), (x2, y2), (40, 40, 255) if locked else (37, 140, 255), 3 if locked else 2)
                 label = f"{d.get('name','obj')} {int(d.get('conf',0)*100)}%"
+                if locked:
+                    label = f"LOCK #{d.get('id')} {label}"
                 cv2.putText(frame, label, (x1, max(20, y1-8)), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (240,240,240), 2, cv2.LINE_AA)
         return frame
 
-    def _encode_jpeg(self, frame) -> Optional[bytes]:
-        ok, buf = cv2.imencode(".jpg", frame, [int(cv2.IMWRITE_JPEG_QUALITY), 85])
-        return buf.tobytes() if ok else None
-
     def _loop(self):
         self._open_capture()
         last = time.time()
@@ -161,20 +444,31 @@ class SarPipeline:
         while self.running:
             t0 = time.time()
 
-            if self._cap is not None:
-                ok, frame = self._cap.read()
-                if not ok:
-                    # stream hiccup: brief sleep and try again
-                    time.sleep(0.01)
-                    continue
-            else:
-                frame = self._synthesize_frame(time.time())
+            frame, ts = self._read_frame(t0)
+            if frame is None:
+                continue
+            t1 = time.time()
+            self._stage_done("capture", t0)
+            if ts != t0:
+                self.metrics.observe("source", (t1 - ts) * 1000.0)
+            t0 = ts
 
-            dets = self._maybe_yolo(frame)
-            frame = self._apply_face_blur(frame)
+            dets, keyframe = self._maybe_yolo(frame)
+            self._stage_done("infer", t1)
+            t2 = time.time()
+            dets = self._suspect(frame, dets, t0)
+            frame = self._apply_face_blur(frame, keyframe)
             frame = self._annotate(frame, dets)
+            self._stage_done("privacy", t2)
+            t3 = time.time()
 
-            jpeg = self._encode_jpeg(frame)
+            self.hub.publish(frame, t0)
+            self._stage_done("encode", t3)
+            self.metrics.observe("e2e", (time.time() - t0) * 1000.0)
+            self._frame_id += 1
+            self.events.publish(self._frame_id, t0, dets)
+            self._record_evidence(frame, dets, t0, self._frame_id, keyframe)
+            self._record_clip(dets, t0)
 
             now = time.time()
             dt = now - last
@@ -182,10 +476,166 @@ class SarPipeline:
             fps = 1.0 / dt if dt > 0 else 0
 
             with self._lock:
-                self._last_jpeg = jpeg
                 self._fps = 0.9*self._fps + 0.1*fps if self._fps > 0 else fps
                 self._latency_ms = int((time.time() - t0) * 1000)
                 self._detections = dets
 
             # keep CPU reasonable
             time.sleep(0.01)
+
+    # ---------- evidence ----------
+    def _open_evidence(self) -> Optional[EvidenceWriter]:
+        if self._evidence is None:
+            self._evidence = default_writer()
+        return self._evidence
+
+    def _audit(self, event: str, **fields):
+        if self._open_evidence() is not None:
+            self._evidence.audit(event, source=self.source, **fields)
+
+    def _record_evidence(self, frame, dets, ts, frame_id, keyframe):
+        """Keyframes with detections, at most every _evidence_every s unless a new track shows up."""
+        if self._evidence is None or not keyframe or not dets:
+            return
+        ids = {d.get("id") for d in dets}
+        if ts - self._ev_last < self._evidence_every and ids <= self._ev_tracks:
+            return
+        if len(self._ev_tracks) > 10000:
+            self._ev_tracks.clear()
+        self._ev_last = ts
+        self._ev_tracks |= ids
+        self._evidence.submit_keyframe(frame, dets, ts, source=self.source, frame_id=frame_id,
+                                       mode=self.mode, blur=self.sar_blur)
+
+    def _record_clip(self, dets, ts):
+        """Feed the just-published frame to the clip ring; trigger on a new track or a confident hit."""
+        if self._clips is None:
+            return
+        # reuse whatever rung streaming/snapshots already encoded; encode only for
+        # a recording clip, or for sparse pre-roll when no one is watching
+        jpeg = self.hub.encoded(self._clip_rung)
+        if jpeg is None and (self._clips.recording or ts - self._clip_enc_ts >= 1.0 / self._clip_idle_fps):
+            jpeg = self.hub.snapshot(self._clip_rung)
+            self._clip_enc_ts = ts
+        if jpeg:
+            self._clips.push(jpeg, ts)
+        reason = None
+        for d in dets:
+            tid = d.get("id")
+            if tid is None:
+                continue
+            if tid not in self._clip_seen:
+                self._clip_seen.add(tid)
+                reason = reason or "new_track"
+            if d.get("conf", 0.0) >= self._clip_conf and tid not in self._clip_high:
+                self._clip_high.add(tid)
+                reason = reason or "confidence"
+        if len(self._clip_seen) > 10000:
+            self._clip_seen.clear()
+            self._clip_high.clear()
+        if reason is not None:
+            self._clips.trigger(reason, ts, source=self.source, mode=self.mode,
+                                tracks=sorted(d.get("id") for d in dets if d.get("id") is not None))
+
+    # ---------- batch hand-off ----------
+    @property
+    def tiler(self) -> Optional[TiledDetector]:
+        return self._tiler
+
+    def take_frame(self) -> Optional[Dict]:
+        """Newest captured packet waiting for inference, or None; never blocks."""
+        return self._slots["infer"].get(timeout=0)
+
+    def wants_detect(self, pkt: Dict) -> bool:
+        """True if the packet is a keyframe; otherwise finish it with dets=None to coast."""
+        return self._is_keyframe(pkt["frame"])
+
+    def finish_frame(self, pkt: Dict, dets: Optional[List[Dict]], t0: float):
+        """Hand a take_frame() packet on to privacy/encode: detector output, or None to coast on the tracker."""
+        if dets is None:
+            pkt["dets"], pkt["keyframe"] = self._coast(), False
+        else:
+            pkt["dets"], pkt["keyframe"] = self._track(dets), True
+        self._stage_done("infer", t0, pkt)
+        self._slots["privacy"].put(pkt)
+
+    # ---------- staged mode ----------
+    def _stage_done(self, name: str, t0: float, pkt: Optional[Dict] = None):
+        """Stage `name` worked from t0 until now; with pkt, also record how long it sat in the slot."""
+        now = time.time()
+        ms = (now - t0) * 1000.0
+        prev = self._stage_ms[name]
+        self._stage_ms[name] = 0.9*prev + 0.1*ms if prev > 0 else ms
+        self.metrics.observe(name, ms)
+        if pkt is not None:
+            if "t_out" in pkt:
+                self.metrics.observe(name + "_wait", (t0 - pkt["t_out"]) * 1000.0)
+            pkt["t_out"] = now
+
+    def _capture_stage(self):
+        self._open_capture()
+        period = 1.0 / 30.0  # pace the synthetic feed; real captures block in read()
+        while self.running:
+            t0 = time.time()
+            frame, ts = self._read_frame(t0)
+            if frame is None:
+                continue
+            self._frame_id += 1
+            pkt = {"id": self._frame_id, "ts": ts, "frame": frame}
+            if ts != t0:  # how long the frame waited in the source before we picked it up
+                self.metrics.observe("source", (time.time() - ts) * 1000.0)
+            self._stage_done("capture", t0, pkt)
+            self._slots["infer"].put(pkt)
+            if self._frame_ready is not None:
+                self._frame_ready.set()
+            if ts == t0:  # synthetic
+                time.sleep(max(0.0, period - (time.time() - t0)))
+
+    def _infer_stage(self):
+        src, dst = self._slots["infer"], self._slots["privacy"]
+        while self.running:
+            pkt = src.get()
+            if pkt is None:
+                continue
+            t0 = time.time()
+            pkt["dets"], pkt["keyframe"] = self._maybe_yolo(pkt["frame"])
+            self._stage_done("infer", t0, pkt)
+            dst.put(pkt)
+
+    def _privacy_stage(self):
+        src, dst = self._slots["privacy"], self._slots["encode"]
+        while self.running:
+            pkt = src.get()
+            if pkt is None:
+                continue
+            t0 = time.time()
+            pkt["dets"] = self._suspect(pkt["frame"], pkt["dets"], pkt["ts"])
+            frame = self._apply_face_blur(pkt["frame"], pkt["keyframe"])
+            pkt["frame"] = self._annotate(frame, pkt["dets"])
+            self._stage_done("privacy", t0, pkt)
+            dst.put(pkt)
+
+    def _encode_stage(self):
+        src = self._slots["encode"]
+        last = time.time()
+        while self.running:
+            pkt = src.get()
+            if pkt is None:
+                continue
+            t0 = time.time()
+            self.hub.publish(pkt["frame"], pkt["ts"])
+            self._stage_done("encode", t0, pkt)
+            self.metrics.observe("e2e", (time.time() - pkt["ts"]) * 1000.0)
+
+            now = time.time()
+            dt = now - last
+            last = now
+            fps = 1.0 / dt if dt > 0 else 0
+
+            with self._lock:
+                self._fps = 0.9*self._fps + 0.1*fps if self._fps > 0 else fps
+                self._latency_ms = int((now - pkt["ts"]) * 1000)
+                self._detections = pkt["dets"]
+            self.events.publish(pkt["id"], pkt["ts"], pkt["dets"])
+            self._record_evidence(pkt["frame"], pkt["dets"], pkt["ts"], pkt["id"], pkt.get("keyframe", False))
+            self._record_clip(pkt["dets"], pkt["ts"])
@@ -0,0 +1,88 @@
+from typing import Dict, Optional
+import cv2
+import numpy as np
+
+
+class KeyframeScheduler:
+    """
+    Decides which frames get the full detector.
+
+    A frame is a keyframe when any of these fire:
+      - motion: more than `motion_thr` of a small grayscale thumbnail changed
+        by over `pix_thr` levels since the last keyframe (a person walking
+        into a 1280x720 hover shot moves ~50 thumbnail pixels)
+      - interval: `max_interval` frames since the last keyframe
+      - confidence: tracker confidence fell `conf_drop` below its value at
+        the last keyframe (tracks coasting without support)
+    In between, callers carry detections forward with tracker predictions.
+    max_interval <= 1 detects on every frame.
+    """
+    def __init__(self, max_interval=6, motion_thr=0.002, pix_thr=18, conf_drop=0.15, thumb_w=160):
+        self.max_interval = int(max_interval)
+        self.motion_thr = float(motion_thr)
+        self.pix_thr = int(pix_thr)
+        self.conf_drop = float(conf_drop)
+        self.thumb_w = int(thumb_w)
+
+        self._key_thumb: Optional[np.ndarray] = None
+        self._diff: Optional[np.ndarray] = None
+        self._key_conf = 0.0
+        self._since_key = 0
+        self.keyframes = 0
+        self.skipped = 0
+        self.last_motion = 0.0
+        self.last_reason = ""
+
+    def _thumb(self, frame) -> np.ndarray:
+        h, w = frame.shape[:2]
+        tw = min(self.thumb_w, w)
+        th = max(1, int(round(h * tw / w)))
+        small = cv2.resize(frame, (tw, th), interpolation=cv2.INTER_AREA)
+        return cv2.cvtColor(small, cv2.COLOR_BGR2GRAY) if small.ndim == 3 else small
+
+    def should_detect(self, frame, track_conf: float = 0.0) -> bool:
+        reason = ""
+        if self.max_interval <= 1:
+            reason = "always"
+            thumb = None
+        else:
+            thumb = self._thumb(frame)
+            if self._key_thumb is None or self._key_thumb.shape != thumb.shape:
+                reason = "first"
+            else:
+                if self._diff is None or self._diff.shape != thumb.shape:
+                    self._diff = np.empty_like(thumb)
+                cv2.absdiff(thumb, self._key_thumb, dst=self._diff)
+                self.last_motion = cv2.countNonZero(
+                    cv2.threshold(self._diff, self.pix_thr, 255, cv2.THRESH_BINARY)[1]) / self._diff.size
+                if self.last_motion > self.motion_thr:
+                    reason = "motion"
+                elif self._since_key + 1 >= self.max_interval:
+                    reason = "interval"
+                elif self._key_conf - track_conf > self.conf_drop:
+                    reason = "confidence"
+
+        if not reason:
+            self._since_key += 1
+            self.skipped += 1
+            return False
+        self._key_thumb = thumb
+        self._key_conf = track_conf
+        self._since_key = 0
+        self.keyframes += 1
+        self.last_reason = reason
+        return True
+
+    def note_confidence(self, track_conf: float):
+        """Baseline for the confidence trigger, taken right after a keyframe's tracker update."""
+        self._key_conf = track_conf
+
+    def stats(self) -> Dict:
+        total = self.keyframes + self.skipped
+        return {
+            "keyframes": self.keyframes,
+            "skipped": self.skipped,
+            "detect_ratio": round(self.keyframes / total, 3) if total else 0.0,
+            "motion": round(self.last_motion, 4),
+            "reason": self.last_reason,
+        }
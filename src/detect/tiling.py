@@ -0,0 +1,172 @@
+import math
+from typing import Dict, List, Optional
+import cv2
+import numpy as np
+from .yolo_infer import nms
+
+
+def tile_size_for(frame_w: int, frame_h: int, altitude_m: float, fov_h_deg: float, fov_v_deg: float,
+                  imgsz: int, target_m: float = 1.7, min_target_px: float = 24) -> int:
+    """
+    Largest square tile (source pixels) that still shows a target_m tall
+    person at least min_target_px tall once the tile is resized to imgsz.
+    Ground sampling comes from the camera FOV at altitude (nadir, flat ground).
+    """
+    alt = max(1.0, float(altitude_m))
+    ground_w = 2.0 * alt * math.tan(math.radians(fov_h_deg) / 2.0)
+    ground_h = 2.0 * alt * math.tan(math.radians(fov_v_deg) / 2.0)
+    px_per_m = min(frame_w / ground_w, frame_h / ground_h)
+    target_px = target_m * px_per_m
+    return max(32, int(target_px * imgsz / float(min_target_px)))
+
+
+def plan_tiles(w: int, h: int, tile: int, overlap: float) -> np.ndarray:
+    """Overlapping tile grid covering a w x h frame -> (k,4) int xyxy; one tile if the frame fits."""
+    tw, th = min(tile, w), min(tile, h)
+
+    def starts(size, t):
+        if t >= size:
+            return [0]
+        n = math.ceil((size - t * overlap) / (t * (1.0 - overlap)))
+        n = max(2, n)
+        step = (size - t) / (n - 1)
+        return [int(round(i * step)) for i in range(n)]
+
+    xs, ys = starts(w, tw), starts(h, th)
+    return np.array([(x, y, x + tw, y + th) for y in ys for x in xs], dtype=np.int32)
+
+
+class TiledDetector:
+    """
+    Sliced inference for small targets: the frame is cut into overlapping
+    tiles sized from the camera FOV and altitude, the tiles (plus one
+    downscaled full-frame view for large targets) go through the model in a
+    single infer_batch call, and results are merged with cross-tile NMS.
+
+    Tiles with no texture (sky, water, blank HUD) are skipped, as are static
+    tiles scanned within the last `rescan_every` frames; those re-use their
+    previous detections so a motionless casualty stays on the map.
+
+    `detector` is anything with infer_batch(frames) -> [[{"cls","conf","bbox"}]]
+    (YoloDetector, UltralyticsDetector).
+    """
+    def __init__(self, detector, calib: Optional[Dict] = None, altitude_m: Optional[float] = None,
+                 full_frame=True, texture_thr=4.0, motion_thr=0.01, pix_thr=18, rescan_every=10,
+                 merge_thr=0.5):
+        if calib is None:
+            from ..util.config import camera_calib
+            calib = camera_calib()
+        tiling = calib.get("tiling", {})
+        self.detector = detector
+        self.fov_h = float(calib.get("fov_h_deg", 78))
+        self.fov_v = float(calib.get("fov_v_deg", 50))
+        self.altitude_m = float(altitude_m if altitude_m is not None else tiling.get("altitude_m", 30))
+        self.target_m = float(tiling.get("target_height_m", 1.7))
+        self.min_target_px = float(tiling.get("min_target_px", 24))
+        self.overlap = float(tiling.get("overlap", 0.2))
+        self.max_tiles = int(tiling.get("max_tiles", 16))
+        self.full_frame = full_frame
+        self.texture_thr = texture_thr
+        self.motion_thr = motion_thr
+        self.pix_thr = pix_thr
+        self.rescan_every = rescan_every
+        self.merge_thr = merge_thr
+
+        self.tiles = np.zeros((0, 4), np.int32)
+        self._plan_key = None
+        self._thumb_scale = 8
+        self._prev_thumb: Optional[np.ndarray] = None
+        self._since_scan = np.zeros(0, np.int32)
+        self._tile_dets: List[List[Dict]] = []
+        self._run_idx: Optional[np.ndarray] = None
+        self.last_scanned = 0
+
+    def set_altitude(self, altitude_m: float):
+        self.altitude_m = float(altitude_m)
+
+    def _plan(self, w: int, h: int):
+        imgsz = int(getattr(self.detector, "imgsz", (640, 640))[0])
+        tile = tile_size_for(w, h, self.altitude_m, self.fov_h, self.fov_v, imgsz,
+                             self.target_m, self.min_target_px)
+        key = (w, h, tile)
+        if key == self._plan_key:
+            return
+        tiles = plan_tiles(w, h, tile, self.overlap)
+        while len(tiles) > self.max_tiles:
+            tile = int(tile * 1.25)
+            tiles = plan_tiles(w, h, tile, self.overlap)
+        self.tiles = tiles
+        self._plan_key = key
+        self._since_scan = np.full(len(tiles), self.rescan_every, np.int32)
+        self._tile_dets = [[] for _ in range(len(tiles))]
+        self._prev_thumb = None
+
+    def _select(self, frame) -> np.ndarray:
+        """Boolean mask of tiles worth running this frame."""
+        s = self._thumb_scale
+        h, w = frame.shape[:2]
+        thumb = cv2.cvtColor(cv2.resize(frame, (max(1, w // s), max(1, h // s)), interpolation=cv2.INTER_AREA),
+                             cv2.COLOR_BGR2GRAY)
+        diff = None
+        if self._prev_thumb is not None and self._prev_thumb.shape == thumb.shape:
+            diff = cv2.absdiff(thumb, self._prev_thumb) > self.pix_thr
+        self._prev_thumb = thumb
+
+        run = np.zeros(len(self.tiles), bool)
+        for k, (x1, y1, x2, y2) in enumerate((self.tiles // s).tolist()):
+            roi = thumb[y1:max(y2, y1 + 1), x1:max(x2, x1 + 1)]
+            if roi.size == 0 or float(roi.std()) < self.texture_thr:
+                continue
+            moving = diff is None or diff[y1:y2, x1:x2].mean() > self.motion_thr
+            run[k] = moving or self._since_scan[k] >= self.rescan_every
+        return run
+
+    def prepare(self, frame_bgr) -> List[np.ndarray]:
+        """Crops to run for this frame; pass their results to finish()."""
+        h, w = frame_bgr.shape[:2]
+        self._plan(w, h)
+        if len(self.tiles) <= 1:
+            self._run_idx = None
+            return [frame_bgr]
+        self._run_idx = np.flatnonzero(self._select(frame_bgr))
+        crops = [frame_bgr[y1:y2, x1:x2] for x1, y1, x2, y2 in self.tiles[self._run_idx].tolist()]
+        if self.full_frame:
+            crops.append(frame_bgr)
+        return crops
+
+    def finish(self, frame_bgr, results: List[List[Dict]]) -> List[Dict]:
+        h, w = frame_bgr.shape[:2]
+        idx = self._run_idx
+        if idx is None:
+            return results[0] if results else []
+        self._since_scan += 1
+        self._since_scan[idx] = 0
+        for k, res in zip(idx.tolist(), results):
+            x1, y1 = int(self.tiles[k, 0]), int(self.tiles[k, 1])
+            self._tile_dets[k] = [{**d, "bbox": [d["bbox"][0] + x1, d["bbox"][1] + y1, d["bbox"][2], d["bbox"][3]]}
+                                  for d in res]
+        self.last_scanned = int(idx.size)
+
+        dets = [d for k in range(len(self.tiles)) for d in self._tile_dets[k]]
+        if self.full_frame and len(results) > idx.size:
+            dets.extend(results[idx.size])
+        return self.merge(dets, w, h)
+
+    def infer(self, frame_bgr) -> List[Dict]:
+        crops = self.prepare(frame_bgr)
+        return self.finish(frame_bgr, self.detector.infer_batch(crops) if crops else [])
+
+    def merge(self, dets: List[Dict], w: int, h: int) -> List[Dict]:
+        """Cross-tile NMS (per class, intersection-over-smaller)."""
+        if len(dets) < 2:
+            return dets
+        b = np.array([d["bbox"] for d in dets], np.float32)
+        b[:, 2:] += b[:, :2]
+        scores = np.array([d["conf"] for d in dets], np.float32)
+        names = {}
+        cls = np.array([names.setdefault(d["cls"], len(names)) for d in dets], np.float32)
+        keep = nms(b + cls[:, None] * (max(w, h) + 1), scores, self.merge_thr, metric="ios")
+        return [dets[i] for i in keep.tolist()]
+
+    def stats(self) -> Dict:
+        return {"tiles": int(len(self.tiles)), "scanned": self.last_scanned, "altitude_m": self.altitude_m}
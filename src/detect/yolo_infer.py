@@ -1,9 +1,221 @@
-﻿class YoloDetector:
-    def __init__(self, onnx_path=None, conf=0.25):
+﻿import ast, os
+from typing import Dict, List, Optional, Tuple
+
+import cv2
+import numpy as np
+from loguru import logger
+
+try:
+    import onnxruntime as ort
+except Exception:
+    ort = None
+
+COCO_NAMES = (
+    "person", "bicycle", "car", "motorcycle", "airplane", "bus", "train", "truck", "boat",
+    "traffic light", "fire hydrant", "stop sign", "parking meter", "bench", "bird", "cat",
+    "dog", "horse", "sheep", "cow", "elephant", "bear", "zebra", "giraffe", "backpack",
+    "umbrella", "handbag", "tie", "suitcase", "frisbee", "skis", "snowboard", "sports ball",
+    "kite", "baseball bat", "baseball glove", "skateboard", "surfboard", "tennis racket",
+    "bottle", "wine glass", "cup", "fork", "knife", "spoon", "bowl", "banana", "apple",
+    "sandwich", "orange", "broccoli", "carrot", "hot dog", "pizza", "donut", "cake", "chair",
+    "couch", "potted plant", "bed", "dining table", "toilet", "tv", "laptop", "mouse",
+    "remote", "keyboard", "cell phone", "microwave", "oven", "toaster", "sink",
+    "refrigerator", "book", "clock", "vase", "scissors", "teddy bear", "hair drier",
+    "toothbrush",
+)
+
+
+def nms(boxes: np.ndarray, scores: np.ndarray, iou_thr: float, metric: str = "iou") -> np.ndarray:
+    """
+    Greedy NMS over xyxy boxes; returns kept indices, highest score first.
+    metric="ios" (intersection over the smaller box) also suppresses the
+    partial boxes left where a target is cut by a tile border.
+    """
+    x1, y1, x2, y2 = boxes[:, 0], boxes[:, 1], boxes[:, 2], boxes[:, 3]
+    areas = (x2 - x1).clip(0) * (y2 - y1).clip(0)
+    order = scores.argsort()[::-1]
+    keep = []
+    while order.size:
+        i = order[0]
+        keep.append(i)
+        rest = order[1:]
+        w = (np.minimum(x2[i], x2[rest]) - np.maximum(x1[i], x1[rest])).clip(0)
+        h = (np.minimum(y2[i], y2[rest]) - np.maximum(y1[i], y1[rest])).clip(0)
+        inter = w * h
+        if metric == "ios":
+            iou = inter / (np.minimum(areas[i], areas[rest]) + 1e-9)
+        else:
+            iou = inter / (areas[i] + areas[rest] - inter + 1e-9)
+        order = rest[iou <= iou_thr]
+    return np.asarray(keep, dtype=np.int64)
+
+
+class YoloDetector:
+    """
+    YOLO (v5/v8 export) on ONNX Runtime, CPU only.
+
+    Pre-processing letterboxes into a buffer that is reused between frames and
+    fills the NCHW float blob in place; post-processing decodes and NMSes all
+    candidates with NumPy. Without a model file it falls back to the Day-1
+    stub box so the rest of the pipeline keeps running.
+    """
+    def __init__(self, onnx_path=None, conf=0.25, iou=0.45, imgsz=640,
+                 threads: Optional[int] = None, max_det=100):
         self.conf = conf
+        self.iou = iou
+        self.max_det = max_det
+        self.imgsz = (imgsz, imgsz)
+        self.names: Tuple[str, ...] = COCO_NAMES
+        self.session = None
+        self.max_batch: Optional[int] = None      # None -> dynamic batch axis
+
+        self._bufs: List[np.ndarray] = []        # letterboxed HWC uint8, one per batch slot
+        self._geoms: List = []                    # (src_w, src_h) each pad area was drawn for
+        self._blob: Optional[np.ndarray] = None  # Nx3xHxW float32
+
+        if onnx_path and os.path.exists(onnx_path):
+            self._load(onnx_path, threads)
+        elif onnx_path:
+            logger.warning(f"ONNX model not found: {onnx_path} (using stub detections)")
+
+    def _load(self, onnx_path, threads):
+        if ort is None:
+            logger.warning("onnxruntime not available (using stub detections)")
+            return
+        if threads is None:
+            threads = int(os.environ.get("FORESIGHT_ORT_THREADS", 0)) or max(1, (os.cpu_count() or 2) // 2)
+        so = ort.SessionOptions()
+        so.intra_op_num_threads = threads
+        so.inter_op_num_threads = 1
+        so.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
+        so.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = ort.InferenceSession(onnx_path, sess_options=so, providers=["CPUExecutionProvider"])
+
+        inp = self.session.get_inputs()[0]
+        self._input_name = inp.name
+        h, w = inp.shape[2], inp.shape[3]
+        if isinstance(h, int) and isinstance(w, int):
+            self.imgsz = (h, w)
+        if isinstance(inp.shape[0], int):
+            self.max_batch = inp.shape[0]
+
+        # ultralytics exports store {id: name} in the model metadata
+        meta = self.session.get_modelmeta().custom_metadata_map
+        if "names" in meta:
+            try:
+                names = ast.literal_eval(meta["names"])
+                self.names = tuple(names[i] for i in sorted(names))
+            except Exception:
+                pass
+        logger.info(f"YoloDetector: {onnx_path} imgsz={self.imgsz} threads={threads}")
+
+    # ---------- pre/post ----------
+    def _reserve(self, n: int):
+        H, W = self.imgsz
+        while len(self._bufs) < n:
+            self._bufs.append(np.full((H, W, 3), 114, dtype=np.uint8))
+            self._geoms.append(None)
+        if self._blob is None or self._blob.shape[0] < n:
+            self._blob = np.empty((n, 3, H, W), dtype=np.float32)
+
+    def _letterbox(self, frame_bgr, i: int = 0) -> Tuple[float, int, int]:
+        H, W = self.imgsz
+        h, w = frame_bgr.shape[:2]
+        buf = self._bufs[i]
+        r = min(H / h, W / w)
+        nw, nh = int(round(w * r)), int(round(h * r))
+        left, top = (W - nw) // 2, (H - nh) // 2
+        if self._geoms[i] != (w, h):
+            buf.fill(114)
+            self._geoms[i] = (w, h)
+        cv2.resize(frame_bgr, (nw, nh), dst=buf[top:top+nh, left:left+nw],
+                   interpolation=cv2.INTER_LINEAR)
+        # HWC BGR uint8 -> NCHW RGB float32 in [0, 1], written into the reused blob
+        np.multiply(buf.transpose(2, 0, 1)[::-1], 1.0 / 255.0, out=self._blob[i], casting="unsafe")
+        return r, left, top
+
+    def _decode(self, pred: np.ndarray, r: float, left: int, top: int, w: int, h: int) -> List[Dict]:
+        nc = len(self.names)
+        if pred.shape[0] < pred.shape[1]:
+            pred = pred.T  # v8: (4+nc, N) -> (N, 4+nc)
+        if pred.shape[1] == 5 + nc:
+            # v5: objectness * class score
+            cls_scores = pred[:, 5:] * pred[:, 4:5]
+        else:
+            cls_scores = pred[:, 4:]
+        cls_ids = cls_scores.argmax(1)
+        scores = cls_scores[np.arange(cls_scores.shape[0]), cls_ids]
+        m = scores >= self.conf
+        if not m.any():
+            return []
+        b, scores, cls_ids = pred[m, :4], scores[m], cls_ids[m]
+
+        xyxy = np.empty_like(b)
+        xyxy[:, 0] = b[:, 0] - b[:, 2] / 2
+        xyxy[:, 1] = b[:, 1] - b[:, 3] / 2
+        xyxy[:, 2] = b[:, 0] + b[:, 2] / 2
+        xyxy[:, 3] = b[:, 1] + b[:, 3] / 2
+        xyxy -= (left, top, left, top)
+        xyxy /= r
+        np.clip(xyxy, 0, (w, h, w, h), out=xyxy)
+
+        # class-aware NMS: shift each class into its own coordinate range
+        offset = cls_ids[:, None].astype(np.float32) * (max(w, h) + 1)
+        keep = nms(xyxy + offset, scores, self.iou)[:self.max_det]
+
+        dets = []
+        for (x1, y1, x2, y2), s, c in zip(xyxy[keep].astype(int).tolist(), scores[keep].tolist(), cls_ids[keep].tolist()):
+            name = self.names[c] if c < len(self.names) else str(c)
+            dets.append({"cls": name, "conf": float(s), "bbox": [x1, y1, x2 - x1, y2 - y1]})
+        return dets
+
+    # ---------- public API ----------
     def infer(self, frame_bgr):
-        h, w, _ = frame_bgr.shape
-        cx, cy, bw, bh = int(w*0.5), int(h*0.5), int(w*0.2), int(h*0.3)
-        x = max(0, cx - bw//2); y = max(0, cy - bh//2)
-        bw = min(bw, w - x); bh = min(bh, h - y)
-        return [{"cls":"person","conf":0.9,"bbox":[x, y, bw, bh]}]
+        h, w = frame_bgr.shape[:2]
+        if self.session is None:
+            cx, cy, bw, bh = int(w*0.5), int(h*0.5), int(w*0.2), int(h*0.3)
+            x = max(0, cx - bw//2); y = max(0, cy - bh//2)
+            bw = min(bw, w - x); bh = min(bh, h - y)
+            return [{"cls":"person","conf":0.9,"bbox":[x, y, bw, bh]}]
+        return self.infer_batch([frame_bgr])[0]
+
+    def infer_batch(self, frames_bgr) -> List[List[Dict]]:
+        """One session.run per batch (chunked when the model has a fixed batch size)."""
+        if self.session is None:
+            return [self.infer(f) for f in frames_bgr]
+        step = self.max_batch or len(frames_bgr)
+        results: List[List[Dict]] = []
+        for start in range(0, len(frames_bgr), max(1, step)):
+            chunk = frames_bgr[start:start+step]
+            n = len(chunk)
+            self._reserve(max(n, step))
+            geo = [self._letterbox(f, i) for i, f in enumerate(chunk)]
+            blob = self._blob[:step] if self.max_batch else self._blob[:n]
+            out = self.session.run(None, {self._input_name: blob})[0]
+            for i, f in enumerate(chunk):
+                h, w = f.shape[:2]
+                results.append(self._decode(out[i], *geo[i], w, h))
+        return results
+
+
+class UltralyticsDetector:
+    """Same infer/infer_batch interface as YoloDetector, over an ultralytics YOLO model."""
+    def __init__(self, model, conf=0.25, imgsz=640):
+        self.model = model
+        self.conf = conf
+        self.imgsz = (imgsz, imgsz)
+
+    def infer(self, frame_bgr):
+        return self.infer_batch([frame_bgr])[0]
+
+    def infer_batch(self, frames_bgr) -> List[List[Dict]]:
+        out: List[List[Dict]] = [[] for _ in frames_bgr]
+        results = self.model.predict(list(frames_bgr), imgsz=self.imgsz[0], conf=self.conf, verbose=False)
+        for i, r in enumerate(results):
+            if r.boxes is None:
+                continue
+            for b in r.boxes:
+                x1, y1, x2, y2 = map(int, b.xyxy[0])
+                out[i].append({"cls": self.model.names.get(int(b.cls), "obj"), "conf": float(b.conf),
+                               "bbox": [x1, y1, x2 - x1, y2 - y1]})
+        return out
@@ -0,0 +1,238 @@
+"""
+Pre/post-event clips from an in-memory ring of encoded frames.
+
+Every published frame's JPEG is copied into one preallocated byte arena
+(``budget_mb``) and a fixed table of slots (ts, offset, length); the oldest
+frames are overwritten as the arena wraps, so memory never grows and the
+producer allocates nothing per frame. trigger() marks a clip covering
+``pre_s`` seconds before the event and ``post_s`` after it (re-triggering
+while a clip is open extends it, up to ``max_clip_s``). A background thread
+copies the clip's frames out of the arena as they arrive and writes
+
+    clip-20261017T041502-1.mjpeg   concatenated JPEGs (ffplay -f mjpeg ...)
+    clip-20261017T041502-1.json    trigger, reasons, per-frame ts/offset/length
+
+Frames overwritten before the writer got to them are counted as lost.
+"""
+import json
+import os
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+from loguru import logger
+
+
+class _Clip:
+    __slots__ = ("n", "trigger_ts", "start_ts", "end_ts", "next_seq", "reasons", "meta",
+                 "frames", "lost", "path", "f", "done")
+
+    def __init__(self, n: int, ts: float, start_seq: int, start_ts: float, end_ts: float,
+                 reason: str, meta: Dict[str, Any]):
+        self.n = n
+        self.trigger_ts = ts
+        self.start_ts = start_ts
+        self.end_ts = end_ts
+        self.next_seq = start_seq
+        self.reasons = [reason]
+        self.meta = meta
+        self.frames: List[Dict[str, Any]] = []
+        self.lost = 0
+        self.path: Optional[str] = None
+        self.f = None
+        self.done = False
+
+
+class ClipRing:
+    def __init__(self, root: str = "out/evidence/clips", budget_mb: float = 64.0,
+                 pre_s: float = 10.0, post_s: float = 10.0, max_clip_s: float = 60.0,
+                 max_frames: int = 4096, on_clip: Optional[Callable[[str, Dict], None]] = None,
+                 prefix: str = "clip"):
+        self.root = root
+        self.prefix = prefix
+        self.budget = int(budget_mb * 1024 * 1024)
+        self.pre_s = float(pre_s)
+        self.post_s = float(post_s)
+        self.max_clip_s = float(max_clip_s)
+        self.on_clip = on_clip
+        self._arena = np.empty(self.budget, np.uint8)
+        self._view = memoryview(self._arena)
+        n = int(max_frames)
+        self._ts = np.zeros(n, np.float64)
+        self._off = np.zeros(n, np.int64)
+        self._len = np.zeros(n, np.int64)
+        self._n = n
+        self._head = 0   # next sequence number to write
+        self._tail = 0   # oldest sequence number still in the arena
+        self._pos = 0    # next byte offset
+        self._cond = threading.Condition()
+        self._clip: Optional[_Clip] = None
+        self._clips = 0
+        self._thread: Optional[threading.Thread] = None
+        self._running = True
+        self.pushed = 0
+        self.oversize = 0
+        self.written = 0
+        self.lost = 0
+
+    @classmethod
+    def from_env(cls, prefix: str = "clip", on_clip=None, share: int = 1) -> Optional["ClipRing"]:
+        """
+        Under FORESIGHT_EVIDENCE_DIR/clips; FORESIGHT_CLIP_MB (split over `share`
+        rings, one per feed) / _PRE / _POST size it, None if FORESIGHT_CLIPS=0 or
+        FORESIGHT_EVIDENCE=0.
+        """
+        if os.environ.get("FORESIGHT_CLIPS", "1") == "0" or os.environ.get("FORESIGHT_EVIDENCE", "1") == "0":
+            return None
+        root = os.path.join(os.environ.get("FORESIGHT_EVIDENCE_DIR", "out/evidence"), "clips")
+        return cls(root, float(os.environ.get("FORESIGHT_CLIP_MB", "64")) / max(1, share),
+                   float(os.environ.get("FORESIGHT_CLIP_PRE", "10")),
+                   float(os.environ.get("FORESIGHT_CLIP_POST", "10")), on_clip=on_clip, prefix=prefix)
+
+    @property
+    def recording(self) -> bool:
+        return self._clip is not None
+
+    # ---------- producer side ----------
+    def push(self, jpeg, ts: float):
+        """Copy one encoded frame into the arena (bytes or any buffer)."""
+        size = len(jpeg)
+        if size == 0:
+            return
+        if size > self.budget:
+            self.oversize += 1
+            return
+        with self._cond:
+            if self._head - self._tail == self._n:
+                self._tail += 1
+            pos = self._pos
+            while self._tail < self._head:
+                t = int(self._off[self._tail % self._n])
+                if t >= pos:
+                    if t - pos >= size:
+                        break
+                    self._tail += 1          # overlaps the space we need: overwrite it
+                elif self.budget - pos >= size:
+                    break
+                else:
+                    pos = 0                  # wrap; frames at the front are now in the way
+            if self._tail == self._head:
+                pos = 0 if pos + size > self.budget else pos
+            i = self._head % self._n
+            self._view[pos:pos + size] = jpeg
+            self._off[i], self._len[i], self._ts[i] = pos, size, ts
+            self._pos = pos + size
+            self._head += 1
+            self.pushed += 1
+            clip = self._clip
+            if clip is not None and (ts > clip.end_ts or clip.next_seq < self._head):
+                self._cond.notify()
+
+    def trigger(self, reason: str, ts: Optional[float] = None, **meta) -> bool:
+        """Start (or extend) a clip around ts; True if a new clip was started."""
+        ts = time.time() if ts is None else ts
+        with self._cond:
+            clip = self._clip
+            if clip is not None and not clip.done:
+                clip.end_ts = min(max(clip.end_ts, ts + self.post_s), clip.start_ts + self.max_clip_s)
+                if reason not in clip.reasons:
+                    clip.reasons.append(reason)
+                return False
+            start = self._head
+            while start > self._tail and self._ts[(start - 1) % self._n] >= ts - self.pre_s:
+                start -= 1
+            start_ts = float(self._ts[start % self._n]) if start < self._head else ts
+            self._clips += 1
+            self._clip = _Clip(self._clips, ts, start, start_ts, ts + self.post_s, reason, meta)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="clip-writer", daemon=True)
+                self._thread.start()
+            self._cond.notify()
+            return True
+
+    # ---------- writer thread ----------
+    def _take(self, clip: _Clip) -> List:
+        """Copy out the clip's frames that have arrived since last time (called under the lock)."""
+        out = []
+        if clip.next_seq < self._tail:
+            clip.lost += self._tail - clip.next_seq
+            clip.next_seq = self._tail
+        while clip.next_seq < self._head:
+            i = clip.next_seq % self._n
+            ts = float(self._ts[i])
+            if ts > clip.end_ts:
+                clip.done = True
+                break
+            off, size = int(self._off[i]), int(self._len[i])
+            out.append((clip.next_seq, ts, self._arena[off:off + size].tobytes()))
+            clip.next_seq += 1
+        return out
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while self._running and (self._clip is None or
+                                         (self._clip.next_seq >= self._head and not self._clip.done)):
+                    self._cond.wait(timeout=1.0)
+                    clip = self._clip
+                    if clip is not None and time.time() > clip.end_ts + 1.0:
+                        clip.done = True   # the feed stopped before post-roll ended
+                clip = self._clip
+                if clip is None:
+                    return
+                frames = self._take(clip)
+                done = clip.done or not self._running
+            try:
+                self._write(clip, frames)
+                if done:
+                    self._finish(clip)
+            except OSError as e:
+                logger.warning(f"clip {clip.n}: {e}")
+                done = True
+            if done:
+                with self._cond:
+                    if self._clip is clip:
+                        self._clip = None
+                    if not self._running:
+                        return
+
+    def _write(self, clip: _Clip, frames: List):
+        if clip.f is None:
+            os.makedirs(self.root, exist_ok=True)
+            stamp = datetime.fromtimestamp(clip.trigger_ts, timezone.utc).strftime("%Y%m%dT%H%M%S")
+            clip.path = os.path.join(self.root, f"{self.prefix}-{stamp}-{clip.n}.mjpeg")
+            clip.f = open(clip.path, "ab")
+        for seq, ts, jpeg in frames:
+            clip.frames.append({"seq": seq, "ts": ts, "off": clip.f.tell(), "len": len(jpeg)})
+            clip.f.write(jpeg)
+        self.written += len(frames)
+
+    def _finish(self, clip: _Clip):
+        clip.f.close()
+        self.lost += clip.lost
+        info = {"trigger_ts": clip.trigger_ts, "reasons": clip.reasons, "pre_s": self.pre_s,
+                "post_s": self.post_s, "lost": clip.lost, "meta": clip.meta, "frames": clip.frames}
+        with open(clip.path[:-len(".mjpeg")] + ".json", "w", encoding="utf-8") as f:
+            json.dump(info, f)
+        logger.info(f"clip {os.path.basename(clip.path)}: {len(clip.frames)} frames, "
+                    f"reasons={clip.reasons}, lost={clip.lost}")
+        if self.on_clip is not None:
+            self.on_clip(clip.path, {"frames": len(clip.frames), "reasons": clip.reasons, "lost": clip.lost})
+
+    def close(self):
+        """Flush the open clip (truncated at what has arrived) and stop the writer."""
+        with self._cond:
+            self._running = False
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout=5.0)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            live = self._head - self._tail
+            span = float(self._ts[(self._head - 1) % self._n] - self._ts[self._tail % self._n]) if live else 0.0
+            return {"frames": live, "seconds": round(span, 1), "budget_mb": round(self.budget / 1048576.0, 1),
+                    "pushed": self.pushed, "oversize": self.oversize, "clips": self._clips,
+                    "recording": self._clip is not None, "written": self.written, "lost": self.lost}
@@ -0,0 +1,326 @@
+"""
+Append-only, time-segmented evidence store.
+
+One segment per `segment_s` (default one hour, UTC), named by its start:
+
+    seg-20261017T0400.dat     payloads back to back (JPEG keyframes, JSON records)
+    seg-20261017T0400.idx     fixed 25-byte entries: ts f64, offset u64, length u32,
+                              kind u8, track u32 (one entry per track in the payload)
+    seg-20261017T0400.audit   JSON lines, sha256 hash-chained across segments
+
+Files are only ever opened for append. Callers hand frames and records to
+EvidenceWriter.submit_*/audit, which just enqueue; JPEG encoding, writes and
+fsyncs happen on the writer thread. If the queue backs up, keyframe images are
+dropped (counted), records and audit entries are not. Expiry deletes whole
+segments: .dat/.idx after retention.evidence_days, .audit after
+retention.logs_days (configs/privacy.yaml); event clips under clips/ (see
+clip_ring.py) follow evidence_days by file age.
+"""
+import glob
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import deque
+from datetime import datetime, timezone
+from typing import Any, Deque, Dict, Iterable, List, Optional, Tuple
+
+import cv2
+import numpy as np
+from loguru import logger
+
+KIND_JPEG, KIND_RECORD = 1, 2
+NO_TRACK = 0xFFFFFFFF
+IDX_DTYPE = np.dtype([("ts", "<f8"), ("off", "<u8"), ("len", "<u4"), ("kind", "u1"), ("track", "<u4")])
+_SEG_FMT = "%Y%m%dT%H%M"
+
+
+def segment_name(ts: float, segment_s: int) -> str:
+    start = int(ts) // segment_s * segment_s
+    return "seg-" + datetime.fromtimestamp(start, timezone.utc).strftime(_SEG_FMT)
+
+
+def segment_start(name: str) -> float:
+    stem = os.path.basename(name).split(".")[0]
+    return datetime.strptime(stem[4:], _SEG_FMT).replace(tzinfo=timezone.utc).timestamp()
+
+
+class _Segment:
+    def __init__(self, root: str, name: str):
+        self.name = name
+        base = os.path.join(root, name)
+        self.dat = open(base + ".dat", "ab")
+        self.idx = open(base + ".idx", "ab")
+        self.audit = open(base + ".audit", "ab")
+        self.off = self.dat.seek(0, os.SEEK_END)
+
+    def flush(self, sync: bool = False):
+        for f in (self.dat, self.idx, self.audit):
+            f.flush()
+            if sync:
+                os.fsync(f.fileno())
+
+    def close(self):
+        self.flush(sync=True)
+        for f in (self.dat, self.idx, self.audit):
+            f.close()
+
+
+class EvidenceWriter:
+    def __init__(self, root: str = "out/evidence", retention: Optional[Dict] = None,
+                 segment_s: int = 3600, jpeg_quality: int = 85, max_pending_frames: int = 16):
+        if retention is None:
+            from ..util.config import privacy
+            retention = privacy().get("retention", {})
+        self.root = root
+        self.segment_s = int(segment_s)
+        self.evidence_days = float(retention.get("evidence_days", 90))
+        self.logs_days = float(retention.get("logs_days", 365))
+        self.jpeg_quality = int(jpeg_quality)
+        self.max_pending_frames = max_pending_frames
+        os.makedirs(root, exist_ok=True)
+
+        self._q: Deque[Tuple] = deque()
+        self._cond = threading.Condition()
+        self._pending_frames = 0
+        self._seg: Optional[_Segment] = None
+        self._last_hash = self._recover_hash()
+        self._running = True
+        self._next_expire = 0.0
+        self.written = {"keyframes": 0, "records": 0, "audit": 0}
+        self.dropped_frames = 0
+        self.bytes = 0
+        self._thread = threading.Thread(target=self._run, name="evidence-writer", daemon=True)
+        self._thread.start()
+
+    # ---------- producer side: never blocks on I/O ----------
+    def submit_keyframe(self, frame: Optional[np.ndarray], dets: List[Dict], ts: Optional[float] = None,
+                        **meta):
+        """Annotated frame + its detections. The frame must not be modified afterwards."""
+        ts = time.time() if ts is None else ts
+        with self._cond:
+            if frame is not None and self._pending_frames >= self.max_pending_frames:
+                frame = None
+                self.dropped_frames += 1
+            if frame is not None:
+                self._pending_frames += 1
+            self._q.append(("keyframe", ts, frame, dets, meta))
+            self._cond.notify()
+
+    def submit_record(self, dets: List[Dict], ts: Optional[float] = None, **meta):
+        self.submit_keyframe(None, dets, ts, **meta)
+
+    def audit(self, event: str, ts: Optional[float] = None, **fields):
+        with self._cond:
+            self._q.append(("audit", time.time() if ts is None else ts, event, fields))
+            self._cond.notify()
+
+    # ---------- writer thread ----------
+    def _segment(self, ts: float) -> _Segment:
+        name = segment_name(ts, self.segment_s)
+        if self._seg is None or self._seg.name != name:
+            if self._seg is not None:
+                self._seg.close()
+            self._seg = _Segment(self.root, name)
+        return self._seg
+
+    def _recover_hash(self) -> str:
+        files = sorted(glob.glob(os.path.join(self.root, "seg-*.audit")))
+        for path in reversed(files):
+            try:
+                with open(path, "rb") as f:
+                    f.seek(max(0, os.path.getsize(path) - 4096))
+                    lines = f.read().splitlines()
+                if lines:
+                    return json.loads(lines[-1])["hash"]
+            except (OSError, ValueError, KeyError):
+                continue
+        return "0" * 64
+
+    def _append(self, seg: _Segment, ts: float, kind: int, payload: bytes, tracks: Iterable[int]):
+        off = seg.off
+        seg.dat.write(payload)
+        seg.off += len(payload)
+        ids = [t for t in tracks if t is not None] or [NO_TRACK]
+        rows = np.zeros(len(ids), IDX_DTYPE)
+        rows["ts"], rows["off"], rows["len"], rows["kind"] = ts, off, len(payload), kind
+        rows["track"] = [int(t) & 0xFFFFFFFF for t in ids]
+        seg.idx.write(rows.tobytes())
+        self.bytes += len(payload) + rows.nbytes
+
+    def _write_keyframe(self, ts, frame, dets, meta):
+        seg = self._segment(ts)
+        tracks = sorted({d.get("id") for d in dets if d.get("id") is not None})
+        rec = {"ts": ts, **meta, "detections": dets}
+        if frame is not None:
+            ok, buf = cv2.imencode(".jpg", frame, [int(cv2.IMWRITE_JPEG_QUALITY), self.jpeg_quality])
+            if ok:
+                rec["jpeg"] = {"off": seg.off, "len": len(buf)}
+                self._append(seg, ts, KIND_JPEG, buf.tobytes(), tracks)
+                self.written["keyframes"] += 1
+        payload = json.dumps(rec, separators=(",", ":"), default=lambda o: o.item() if hasattr(o, "item") else str(o))
+        self._append(seg, ts, KIND_RECORD, payload.encode("utf-8"), tracks)
+        self.written["records"] += 1
+
+    def _write_audit(self, ts, event, fields):
+        seg = self._segment(ts)
+        entry = {"ts": ts, "event": event, **fields, "prev": self._last_hash}
+        body = json.dumps(entry, separators=(",", ":"), sort_keys=True, default=str)
+        entry["hash"] = self._last_hash = hashlib.sha256(body.encode("utf-8")).hexdigest()
+        seg.audit.write((json.dumps(entry, separators=(",", ":"), sort_keys=True, default=str) + "\n").encode("utf-8"))
+        self.written["audit"] += 1
+
+    def _run(self):
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._q or not self._running, timeout=1.0)
+                batch = list(self._q)
+                self._q.clear()
+                if not batch and not self._running:
+                    break
+            for item in batch:
+                try:
+                    if item[0] == "keyframe":
+                        _, ts, frame, dets, meta = item
+                        self._write_keyframe(ts, frame, dets, meta)
+                        if frame is not None:
+                            with self._cond:
+                                self._pending_frames -= 1
+                    else:
+                        _, ts, event, fields = item
+                        self._write_audit(ts, event, fields)
+                except Exception as e:
+                    logger.error(f"evidence write failed: {e}")
+            if self._seg is not None and batch:
+                self._seg.flush()
+            if time.time() >= self._next_expire:
+                self._next_expire = time.time() + 600
+                self.expire()
+        if self._seg is not None:
+            self._seg.close()
+            self._seg = None
+
+    # ---------- retention ----------
+    def expire(self, now: Optional[float] = None) -> List[str]:
+        """Delete whole segments past retention; returns the removed file names."""
+        now = time.time() if now is None else now
+        limits = {".dat": self.evidence_days, ".idx": self.evidence_days, ".audit": self.logs_days}
+        current = self._seg.name if self._seg is not None else None
+        removed = []
+        for path in glob.glob(os.path.join(self.root, "seg-*.*")):
+            name, ext = os.path.splitext(os.path.basename(path))
+            days = limits.get(ext)
+            if days is None or name == current:
+                continue
+            try:
+                end = segment_start(name) + self.segment_s
+            except ValueError:
+                continue
+            if now - end > days * 86400.0:
+                try:
+                    os.remove(path)
+                    removed.append(os.path.basename(path))
+                except OSError as e:
+                    logger.warning(f"evidence expiry: {path}: {e}")
+        for path in glob.glob(os.path.join(self.root, "clips", "clip-*.*")):
+            try:
+                if now - os.path.getmtime(path) > self.evidence_days * 86400.0:
+                    os.remove(path)
+                    removed.append(os.path.basename(path))
+            except OSError as e:
+                logger.warning(f"evidence expiry: {path}: {e}")
+        if removed:
+            logger.info(f"evidence expiry removed {len(removed)} segment/clip files")
+        return removed
+
+    def close(self):
+        with self._cond:
+            self._running = False
+            self._cond.notify()
+        self._thread.join(timeout=5.0)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            queued = len(self._q)
+        return {"root": self.root, "queued": queued, "written": dict(self.written),
+                "dropped_frames": self.dropped_frames, "mb": round(self.bytes / 1048576.0, 2),
+                "segment": self._seg.name if self._seg is not None else None}
+
+
+# ---------- lookup ----------
+class EvidenceReader:
+    def __init__(self, root: str = "out/evidence", segment_s: int = 3600):
+        self.root = root
+        self.segment_s = int(segment_s)
+
+    def segments(self, t0: Optional[float] = None, t1: Optional[float] = None) -> List[str]:
+        out = []
+        for path in sorted(glob.glob(os.path.join(self.root, "seg-*.idx"))):
+            name = os.path.basename(path)[:-4]
+            start = segment_start(name)
+            if t1 is not None and start > t1:
+                continue
+            if t0 is not None and start + self.segment_s < t0:
+                continue
+            out.append(name)
+        return out
+
+    def find(self, t0: Optional[float] = None, t1: Optional[float] = None, track: Optional[int] = None,
+             kind: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Index entries matching time range / track / kind, oldest first."""
+        out = []
+        for name in self.segments(t0, t1):
+            idx = np.fromfile(os.path.join(self.root, name + ".idx"), IDX_DTYPE)
+            m = np.ones(len(idx), bool)
+            if t0 is not None:
+                m &= idx["ts"] >= t0
+            if t1 is not None:
+                m &= idx["ts"] <= t1
+            if track is not None:
+                m &= idx["track"] == (int(track) & 0xFFFFFFFF)
+            if kind is not None:
+                m &= idx["kind"] == kind
+            for r in idx[m]:
+                out.append({"segment": name, "ts": float(r["ts"]), "off": int(r["off"]),
+                            "len": int(r["len"]), "kind": int(r["kind"]),
+                            "track": None if r["track"] == NO_TRACK else int(r["track"])})
+        return out
+
+    def load(self, entry: Dict[str, Any]):
+        """Payload for an index entry: JPEG bytes or the decoded JSON record."""
+        with open(os.path.join(self.root, entry["segment"] + ".dat"), "rb") as f:
+            f.seek(entry["off"])
+            data = f.read(entry["len"])
+        return json.loads(data) if entry["kind"] == KIND_RECORD else data
+
+    def audit_log(self, verify: bool = True) -> Tuple[List[Dict[str, Any]], bool]:
+        """All audit entries in order, and whether the hash chain is intact."""
+        entries, ok, prev = [], True, None
+        for path in sorted(glob.glob(os.path.join(self.root, "seg-*.audit"))):
+            with open(path, "rb") as f:
+                for line in f:
+                    e = json.loads(line)
+                    if verify:
+                        h = e.pop("hash")
+                        body = json.dumps(e, separators=(",", ":"), sort_keys=True, default=str)
+                        ok &= hashlib.sha256(body.encode("utf-8")).hexdigest() == h
+                        ok &= prev is None or e["prev"] == prev
+                        e["hash"] = prev = h
+                    entries.append(e)
+        return entries, ok
+
+
+_DEFAULT: Optional[EvidenceWriter] = None
+_DEFAULT_LOCK = threading.Lock()
+
+
+def default_writer() -> Optional[EvidenceWriter]:
+    """Process-wide writer under FORESIGHT_EVIDENCE_DIR (out/evidence); None if FORESIGHT_EVIDENCE=0."""
+    global _DEFAULT
+    if os.environ.get("FORESIGHT_EVIDENCE", "1") == "0":
+        return None
+    with _DEFAULT_LOCK:
+        if _DEFAULT is None:
+            _DEFAULT = EvidenceWriter(os.environ.get("FORESIGHT_EVIDENCE_DIR", "out/evidence"))
+        return _DEFAULT
@@ -1,6 +1,10 @@
 ﻿import math
+import numpy as np
+
+R_EARTH = 6371000.0
+
 def dest_from_bearing(lat_deg, lon_deg, distance_m, bearing_deg):
-    R = 6371000.0
+    R = R_EARTH
     phi1 = math.radians(lat_deg)
     lam1 = math.radians(lon_deg)
     theta = math.radians(bearing_deg)
@@ -9,3 +13,16 @@ def dest_from_bearing(lat_deg, lon_deg, distance_m, bearing_deg):
     lam2 = lam1 + math.atan2(math.sin(theta)*math.sin(dR)*math.cos(phi1),
                              math.cos(dR)-math.sin(phi1)*math.sin(phi2))
     return math.degrees(phi2), math.degrees(lam2)
+
+def dest_from_bearing_np(lat_deg, lon_deg, distance_m, bearing_deg):
+    """Array version of dest_from_bearing; all arguments broadcast (e.g. one origin, N points)."""
+    phi1 = np.radians(lat_deg)
+    lam1 = np.radians(lon_deg)
+    theta = np.radians(bearing_deg)
+    dR = np.asarray(distance_m, dtype=np.float64) / R_EARTH
+    sin_phi1, cos_phi1 = np.sin(phi1), np.cos(phi1)
+    sin_dR, cos_dR = np.sin(dR), np.cos(dR)
+    sin_phi2 = sin_phi1*cos_dR + cos_phi1*sin_dR*np.cos(theta)
+    phi2 = np.arcsin(np.clip(sin_phi2, -1.0, 1.0))
+    lam2 = lam1 + np.arctan2(np.sin(theta)*sin_dR*cos_phi1, cos_dR - sin_phi1*sin_phi2)
+    return np.degrees(phi2), np.degrees(lam2)
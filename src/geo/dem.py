@@ -0,0 +1,269 @@
+"""
+Local DEM tiles for terrain-aware geolocation.
+
+Tiles are 1 x 1 degree, named by their south-west corner like SRTM
+(``N14E120``), as either
+
+- ``.hgt``: SRTM raw big-endian int16, square (1201 or 3601 samples), or
+- ``.npy``: any float/int 2-D array (e.g. exported from a GeoTIFF),
+
+with rows running north -> south and columns west -> east, edges inclusive.
+Tiles are opened as memory maps and held in an LRU bounded by ``budget_mb``.
+Lookups never touch the disk on the caller's thread: a tile that is not
+cached yet reads as NaN and is queued for the prefetch thread, which also
+warms tiles along the flight heading.
+"""
+import math
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import Deque, Dict, Iterable, Optional, Set, Tuple
+
+import numpy as np
+from loguru import logger
+
+from .approx_pos import R_EARTH
+
+Key = Tuple[int, int]  # (floor lat, floor lon)
+VOID = -32768          # SRTM no-data
+
+
+def tile_name(key: Key) -> str:
+    lat, lon = key
+    return f"{'N' if lat >= 0 else 'S'}{abs(lat):02d}{'E' if lon >= 0 else 'W'}{abs(lon):03d}"
+
+
+def enu_to_latlon(lat0: float, lon0: float, east, north):
+    """Small-offset ENU -> lat/lon (sub-metre over a few km), vectorized."""
+    lat = lat0 + np.degrees(np.asarray(north) / R_EARTH)
+    lon = lon0 + np.degrees(np.asarray(east) / (R_EARTH * math.cos(math.radians(lat0))))
+    return lat, lon
+
+
+class DemTiles:
+    def __init__(self, root: str = "data/dem", budget_mb: float = 256.0):
+        self.root = root
+        self.budget = int(budget_mb * 1024 * 1024)
+        self._tiles: "OrderedDict[Key, np.ndarray]" = OrderedDict()
+        self._bytes = 0
+        self._missing: Dict[Key, float] = {}   # key -> when we last looked for it
+        self.retry_missing_s = 30.0
+        self._lock = threading.Lock()
+        self._queue: Deque[Key] = deque()
+        self._queued: Set[Key] = set()
+        self._wake = threading.Condition(self._lock)
+        self._thread: Optional[threading.Thread] = None
+        self.hits = 0
+        self.misses = 0
+        self.loads = 0
+        self.evictions = 0
+
+    @classmethod
+    def from_env(cls) -> Optional["DemTiles"]:
+        """FORESIGHT_DEM (default data/dem) if that directory exists, else None (flat ground)."""
+        root = os.environ.get("FORESIGHT_DEM", "data/dem")
+        if not os.path.isdir(root):
+            return None
+        return cls(root, float(os.environ.get("FORESIGHT_DEM_MB", "256")))
+
+    # ---------- tile cache ----------
+    def _path(self, key: Key) -> Optional[str]:
+        base = os.path.join(self.root, tile_name(key))
+        for ext in (".npy", ".hgt"):
+            if os.path.exists(base + ext):
+                return base + ext
+        return None
+
+    def _open(self, key: Key) -> Optional[np.ndarray]:
+        path = self._path(key)
+        if path is None:
+            return None
+        if path.endswith(".npy"):
+            arr = np.load(path, mmap_mode="r")
+        else:
+            n = int(round(math.sqrt(os.path.getsize(path) // 2)))
+            arr = np.memmap(path, dtype=">i2", mode="r", shape=(n, n))
+        if arr.ndim != 2 or min(arr.shape) < 2:
+            logger.warning(f"DEM tile {path}: unexpected shape {arr.shape}")
+            return None
+        return arr
+
+    def _load(self, key: Key):
+        """Prefetch thread: map the tile and fault its pages in, then insert under the budget."""
+        arr = self._open(key)
+        if arr is not None:
+            step = max(1, 4096 // arr.itemsize)
+            float(np.asarray(arr[:, ::step]).sum())  # touch roughly every page
+        with self._lock:
+            self._queued.discard(key)
+            if arr is None:
+                self._missing[key] = time.monotonic()
+                return
+            self._tiles[key] = arr
+            self._bytes += arr.nbytes
+            self.loads += 1
+            while self._bytes > self.budget and len(self._tiles) > 1:
+                _, old = self._tiles.popitem(last=False)
+                self._bytes -= old.nbytes
+                self.evictions += 1
+
+    def _run(self):
+        while True:
+            with self._lock:
+                while not self._queue:
+                    self._wake.wait()
+                key = self._queue.popleft()
+            try:
+                self._load(key)
+            except Exception as e:
+                logger.warning(f"DEM tile {tile_name(key)}: {e}")
+                with self._lock:
+                    self._queued.discard(key)
+                    self._missing[key] = time.monotonic()
+
+    def request(self, keys: Iterable[Key]):
+        """Queue tiles for background loading (no-op for cached, queued or absent ones)."""
+        with self._lock:
+            added = False
+            now = time.monotonic()
+            for k in keys:
+                if k in self._tiles or k in self._queued:
+                    continue
+                if now - self._missing.get(k, -1e9) < self.retry_missing_s:
+                    continue  # no such file (checked recently)
+                self._queue.append(k)
+                self._queued.add(k)
+                added = True
+            if not added:
+                return
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="dem-prefetch", daemon=True)
+                self._thread.start()
+            self._wake.notify()
+
+    def prefetch_along(self, lat: float, lon: float, heading_deg: float,
+                       ahead_m: Iterable[float] = (0, 1000, 3000, 6000)):
+        """Warm the tiles under the drone and along its heading."""
+        h = math.radians(heading_deg)
+        d = np.asarray(list(ahead_m), np.float64)
+        lats, lons = enu_to_latlon(lat, lon, d * math.sin(h), d * math.cos(h))
+        self.request({(int(math.floor(a)), int(math.floor(o))) for a, o in zip(lats, lons)})
+
+    def ready(self, key: Key) -> bool:
+        with self._lock:
+            return key in self._tiles
+
+    # ---------- sampling ----------
+    def elevation(self, lat, lon) -> np.ndarray:
+        """Bilinear elevation (m) at arrays of points; NaN where no tile is cached."""
+        lat, lon = np.broadcast_arrays(np.asarray(lat, np.float64), np.asarray(lon, np.float64))
+        shape = lat.shape
+        lat, lon = lat.ravel(), lon.ravel()
+        out = np.full(lat.shape, np.nan)
+        if lat.size == 0:
+            return out.reshape(shape)
+        ky = np.floor(lat).astype(np.int64)
+        kx = np.floor(lon).astype(np.int64)
+        code = ky * 1000 + kx
+        single = code.min() == code.max()    # the usual case: one tile
+        for c in ([code[0]] if single else np.unique(code)):
+            i = 0 if single else int(np.argmax(code == c))
+            key = (int(ky[i]), int(kx[i]))
+            with self._lock:
+                arr = self._tiles.get(key)
+                if arr is not None:
+                    self._tiles.move_to_end(key)
+            if arr is None:
+                self.misses += 1
+                self.request([key])
+                continue
+            self.hits += 1
+            if single:
+                out[:] = self._bilinear(arr, lat - key[0], lon - key[1])
+            else:
+                m = code == c
+                out[m] = self._bilinear(arr, lat[m] - key[0], lon[m] - key[1])
+        return out.reshape(shape)
+
+    @staticmethod
+    def _bilinear(arr: np.ndarray, fy: np.ndarray, fx: np.ndarray) -> np.ndarray:
+        n_r, n_c = arr.shape
+        r = (1.0 - fy) * (n_r - 1)  # row 0 is the north edge
+        c = fx * (n_c - 1)
+        r0 = np.clip(np.floor(r).astype(np.int64), 0, n_r - 2)
+        c0 = np.clip(np.floor(c).astype(np.int64), 0, n_c - 2)
+        wr = r - r0
+        wc = c - c0
+        z00 = arr[r0, c0].astype(np.float64)
+        z01 = arr[r0, c0 + 1].astype(np.float64)
+        z10 = arr[r0 + 1, c0].astype(np.float64)
+        z11 = arr[r0 + 1, c0 + 1].astype(np.float64)
+        z = (z00 * (1 - wc) + z01 * wc) * (1 - wr) + (z10 * (1 - wc) + z11 * wc) * wr
+        void = (z00 == VOID) | (z01 == VOID) | (z10 == VOID) | (z11 == VOID)
+        z[void] = np.nan
+        return z
+
+    # ---------- ray casting ----------
+    def intersect(self, rays: np.ndarray, lat: float, lon: float, alt_amsl: float,
+                  max_range_m: float = 3000.0, step_m: float = 10.0, chunk: int = 32):
+        """
+        First terrain hit for every ENU ray from a camera at alt_amsl, marched in
+        step_m slant steps (chunk steps at a time, only for rays still airborne)
+        and refined linearly between the bracketing samples.
+        Returns (east_m, north_m, ground_elev_m); NaN where the ray leaves
+        max_range_m, runs into missing data first, or points upward.
+        """
+        rays = np.asarray(rays, np.float64).reshape(-1, 3)
+        n = len(rays)
+        ex, ny, el = np.full(n, np.nan), np.full(n, np.nan), np.full(n, np.nan)
+        if n == 0:
+            return ex, ny, el
+        d = rays / np.linalg.norm(rays, axis=1, keepdims=True)
+        live = np.nonzero(d[:, 2] < 0)[0]
+        prev_t = np.zeros(n)
+        prev_above = np.full(n, np.nan)
+        steps = int(max_range_m / step_m)
+        for k0 in range(0, steps, chunk):
+            if len(live) == 0:
+                break
+            t = np.arange(k0 + 1, min(k0 + chunk, steps) + 1, dtype=np.float64) * step_m  # (K,)
+            dl = d[live]
+            east = dl[:, :1] * t
+            north = dl[:, 1:2] * t
+            glat, glon = enu_to_latlon(lat, lon, east, north)
+            ground = self.elevation(glat, glon)                 # (L,K)
+            above = alt_amsl + dl[:, 2:3] * t - ground          # >0 while above the terrain
+            below = above <= 0
+            gap = np.isnan(above)
+            first_below = np.where(below.any(axis=1), np.argmax(below, axis=1), len(t))
+            first_gap = np.where(gap.any(axis=1), np.argmax(gap, axis=1), len(t))
+            hit = first_below < first_gap
+            lost = first_gap < first_below                      # no data before any hit: give up
+
+            rows = live[hit]
+            if len(rows):
+                kk = first_below[hit]
+                a1 = above[hit, kk]
+                a0 = np.where(kk > 0, above[hit, np.maximum(kk - 1, 0)], prev_above[rows])
+                t1 = t[kk]
+                t0 = np.where(kk > 0, t[np.maximum(kk - 1, 0)], prev_t[rows])
+                a0 = np.where(np.isnan(a0), a1, a0)             # hit on the very first sample
+                frac = np.where(a0 - a1 > 1e-9, a0 / np.maximum(a0 - a1, 1e-9), 1.0)
+                th = t0 + np.clip(frac, 0.0, 1.0) * (t1 - t0)
+                ex[rows] = d[rows, 0] * th
+                ny[rows] = d[rows, 1] * th
+                el[rows] = alt_amsl + d[rows, 2] * th
+
+            keep = ~(hit | lost)
+            live = live[keep]
+            prev_t[live] = t[-1]
+            prev_above[live] = above[keep, -1]
+        return ex, ny, el
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {"tiles": len(self._tiles), "mb": round(self._bytes / 1048576.0, 1),
+                    "budget_mb": round(self.budget / 1048576.0, 1), "queued": len(self._queue),
+                    "missing": len(self._missing), "hits": self.hits, "misses": self.misses,
+                    "loads": self.loads, "evictions": self.evictions}
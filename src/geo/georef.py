@@ -0,0 +1,166 @@
+import math
+from typing import Dict, List, Optional, Sequence, Tuple
+import cv2
+import numpy as np
+from .approx_pos import dest_from_bearing_np
+
+# World frame is local ENU at the drone: x east, y north, z up.
+# Camera frame is OpenCV: x right, y down, z forward.
+
+
+def camera_axes(heading_deg: float, pitch_deg: float) -> np.ndarray:
+    """
+    (3,3) matrix whose columns are the camera x/y/z axes in ENU for a gimbal
+    at heading (clockwise from north) and pitch (0 = horizon, -90 = nadir),
+    roll 0 (stabilized gimbal).
+    """
+    h, p = math.radians(heading_deg), math.radians(pitch_deg)
+    fwd = np.array([math.sin(h) * math.cos(p), math.cos(h) * math.cos(p), math.sin(p)])
+    right = np.array([math.cos(h), -math.sin(h), 0.0])
+    down = -np.cross(right, fwd)
+    return np.stack([right, down, fwd], axis=1)
+
+
+class GeoReferencer:
+    """
+    Projects pixels (detection footpoints) onto the ground for a whole frame at
+    once: undistort -> camera rays -> rotate by heading/pitch -> intersect the
+    ground plane `alt_m` below the drone -> lat/lon via dest_from_bearing_np.
+
+    err_m is a 1-sigma ground error per point combining altitude, pitch,
+    pixel, heading and drone-position uncertainty; it grows quickly as the
+    ray flattens toward the horizon, and is capped at max_err_m.
+
+    With a DemTiles instance, rays are cast against the terrain instead; the
+    drone's altitude is taken relative to the home point (set_home) or, until
+    one is set, to the ground under the drone. Points whose tiles are not
+    loaded yet fall back to the flat-ground answer for that frame.
+    """
+    def __init__(self, calib: Optional[Dict] = None, dem=None):
+        if calib is None:
+            from ..util.config import camera_calib
+            calib = camera_calib()
+        K = np.asarray(calib.get("camera_matrix", [[1000, 0, 640], [0, 1000, 360], [0, 0, 1]]), np.float64)
+        self.K = K
+        self.dist = np.asarray(calib.get("dist_coeffs", [0, 0, 0, 0, 0]), np.float64)
+        self.calib_wh = tuple(calib.get("image_size") or (2.0 * K[0, 2], 2.0 * K[1, 2]))
+        g = calib.get("georef", {})
+        self.pitch_deg = float(g.get("pitch_deg", -90))
+        self.sigma_alt_m = float(g.get("sigma_alt_m", 2.0))
+        self.sigma_alt_frac = float(g.get("sigma_alt_frac", 0.05))
+        self.sigma_pitch = math.radians(float(g.get("sigma_pitch_deg", 2.0)))
+        self.sigma_heading = math.radians(float(g.get("sigma_heading_deg", 3.0)))
+        self.sigma_px = float(g.get("sigma_px", 4.0))
+        self.max_err_m = float(g.get("max_err_m", 1000.0))
+        self._k_cache: Dict[Tuple[int, int], np.ndarray] = {}
+        self.dem = dem
+        self._home: Optional[Tuple[float, float]] = None
+        self._home_elev: Optional[float] = None
+
+    def set_home(self, lat: float, lon: float):
+        """Takeoff point; DJI-style H is height above it."""
+        self._home = (float(lat), float(lon))
+        self._home_elev = None
+        if self.dem is not None:
+            self.dem.prefetch_along(lat, lon, 0.0, ahead_m=(0,))
+
+    def _base_elev(self, lat: float, lon: float) -> float:
+        """Ground elevation (AMSL) that alt_m is measured from; NaN until its tile is loaded."""
+        if self._home is None:
+            return float(self.dem.elevation(lat, lon))
+        if self._home_elev is None:
+            e = float(self.dem.elevation(*self._home))
+            if math.isfinite(e):
+                self._home_elev = e
+            return e
+        return self._home_elev
+
+    # ---------- camera model ----------
+    def _K_for(self, w: int, h: int) -> np.ndarray:
+        K = self._k_cache.get((w, h))
+        if K is None:
+            K = self.K.copy()
+            K[0] *= w / float(self.calib_wh[0])
+            K[1] *= h / float(self.calib_wh[1])
+            self._k_cache[(w, h)] = K
+        return K
+
+    def rays(self, uv: np.ndarray, frame_wh: Tuple[int, int],
+             heading_deg: float, pitch_deg: Optional[float] = None) -> np.ndarray:
+        """(N,2) pixels -> (N,3) ENU ray directions (not normalized, camera z = 1)."""
+        K = self._K_for(*frame_wh)
+        uv = np.asarray(uv, np.float64).reshape(-1, 2)
+        if np.any(self.dist):
+            xy = cv2.undistortPoints(uv.reshape(-1, 1, 2), K, self.dist).reshape(-1, 2)
+        else:
+            xy = (uv - K[[0, 1], [2, 2]]) / K[[0, 1], [0, 1]]
+        cam = np.empty((len(xy), 3))
+        cam[:, :2] = xy
+        cam[:, 2] = 1.0
+        pitch = self.pitch_deg if pitch_deg is None else pitch_deg
+        return cam @ camera_axes(heading_deg, pitch).T
+
+    # ---------- projection ----------
+    def ground_offsets(self, rays: np.ndarray, alt_m: float) -> Tuple[np.ndarray, np.ndarray]:
+        """Flat-ground hit of each ray -> (east_m, north_m); NaN where the ray misses the ground."""
+        down = -rays[:, 2]
+        t = np.where(down > 1e-9, float(alt_m) / np.where(down > 1e-9, down, 1.0), np.nan)
+        return rays[:, 0] * t, rays[:, 1] * t
+
+    def errors(self, rng: np.ndarray, drop_m: np.ndarray, focal_px: float, pos_err_m: float) -> np.ndarray:
+        """1-sigma horizontal error for points at ground range rng, drop_m below the camera."""
+        drop = np.maximum(np.asarray(drop_m, np.float64), 1e-3)
+        slant2 = rng * rng + drop * drop
+        # d(range)/d(depression angle) = slant^2 / drop
+        s_ang = math.hypot(self.sigma_pitch, self.sigma_px / max(focal_px, 1e-6))
+        e_ang = slant2 / drop * s_ang
+        e_alt = rng / drop * (self.sigma_alt_m + self.sigma_alt_frac * drop)
+        e_head = rng * self.sigma_heading
+        err = np.sqrt(e_ang ** 2 + e_alt ** 2 + e_head ** 2 + float(pos_err_m) ** 2)
+        return np.minimum(np.nan_to_num(err, nan=self.max_err_m), self.max_err_m)
+
+    def project(self, uv, frame_wh: Tuple[int, int], lat: float, lon: float, alt_m: float,
+                heading_deg: float, pitch_deg: Optional[float] = None, pos_err_m: float = 5.0) -> Dict[str, np.ndarray]:
+        """
+        Batch pixel -> ground. Returns arrays (N,) lat, lon, range_m, bearing_deg,
+        err_m, a boolean `valid` (False above the horizon; those points fall
+        back to the drone position with err_m = max_err_m) and `terrain`
+        (True where the DEM hit was used).
+        """
+        r = self.rays(uv, frame_wh, heading_deg, pitch_deg)
+        east, north = self.ground_offsets(r, alt_m)
+        drop = np.full(len(r), float(alt_m))
+        terrain = np.zeros(len(r), bool)
+        if self.dem is not None:
+            self.dem.prefetch_along(lat, lon, heading_deg)
+            base = self._base_elev(lat, lon)
+            if math.isfinite(base):
+                alt_amsl = base + float(alt_m)
+                te, tn, tz = self.dem.intersect(r, lat, lon, alt_amsl)
+                terrain = np.isfinite(te)
+                east[terrain], north[terrain] = te[terrain], tn[terrain]
+                drop[terrain] = alt_amsl - tz[terrain]
+        valid = np.isfinite(east)
+        rng = np.where(valid, np.hypot(east, north), 0.0)
+        bearing = np.degrees(np.arctan2(np.where(valid, east, 0.0), np.where(valid, north, 0.0))) % 360.0
+        plat, plon = dest_from_bearing_np(lat, lon, rng, bearing)
+        err = self.errors(rng, drop, self._K_for(*frame_wh)[1, 1], pos_err_m)
+        err[~valid] = self.max_err_m
+        return {"lat": plat, "lon": plon, "range_m": rng, "bearing_deg": bearing,
+                "err_m": err, "valid": valid, "terrain": terrain}
+
+    @staticmethod
+    def footpoints(bboxes: Sequence[Sequence[float]]) -> np.ndarray:
+        """(x,y,w,h) boxes -> bottom-centre pixels, where a person meets the ground."""
+        b = np.asarray(bboxes, np.float64).reshape(-1, 4)
+        return np.stack([b[:, 0] + 0.5 * b[:, 2], b[:, 1] + b[:, 3]], axis=1)
+
+    def locate(self, bboxes: Sequence[Sequence[float]], frame_shape, lat: float, lon: float, alt_m: float,
+               heading_deg: float, pitch_deg: Optional[float] = None, pos_err_m: float = 5.0) -> List[Dict]:
+        """[{"lat","lon","err_m"}] per (x,y,w,h) detection box, in input order."""
+        if len(bboxes) == 0:
+            return []
+        h, w = frame_shape[:2]
+        g = self.project(self.footpoints(bboxes), (w, h), lat, lon, alt_m, heading_deg, pitch_deg, pos_err_m)
+        return [{"lat": float(a), "lon": float(o), "err_m": round(float(e), 1)}
+                for a, o, e in zip(g["lat"], g["lon"], g["err_m"])]
@@ -0,0 +1,239 @@
+import math
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from .approx_pos import R_EARTH
+
+Cell = Tuple[int, int]
+
+
+class Pin:
+    __slots__ = ("id", "cls", "lat", "lon", "err_m", "conf", "hits", "first_ts", "last_ts",
+                 "track", "version", "_w")
+
+    def __init__(self, pid: int, cls: str, lat: float, lon: float, err_m: float, conf: float,
+                 ts: float, track):
+        self.id = pid
+        self.cls = cls
+        self.lat, self.lon = lat, lon
+        self.err_m = err_m
+        self.conf = conf
+        self.hits = 1
+        self.first_ts = self.last_ts = ts
+        self.track = track
+        self.version = 0
+        self._w = 1.0 / max(err_m, 0.5) ** 2
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"id": self.id, "cls": self.cls, "lat": self.lat, "lon": self.lon,
+                "err_m": round(self.err_m, 1), "conf": round(self.conf, 3), "hits": self.hits,
+                "first_ts": self.first_ts, "last_ts": self.last_ts, "version": self.version}
+
+
+class PinStore:
+    """
+    Server-side map pins: every geo-tagged observation is merged into a pin,
+    first by (source, track id), otherwise by class + proximity in a uniform
+    lat/lon grid (cells ~cell_m across). Position is an inverse-variance
+    weighted mean with exponential forgetting (moving people still follow),
+    confidence is an EMA, and each change bumps a store-wide version so
+    dashboards can pull or be pushed only what changed.
+
+    Queries: bbox goes through the grid (cells also keep their newest
+    last_ts, so stale cells are skipped); since-only queries walk a recency
+    list from the newest end and stop at the first older pin.
+    """
+    def __init__(self, cell_m: float = 25.0, merge_m: float = 15.0, merge_s: float = 600.0,
+                 forget: float = 0.9, conf_alpha: float = 0.2):
+        self.cell_m = cell_m
+        self.merge_m = merge_m
+        self.merge_s = merge_s
+        self.forget = forget
+        self.conf_alpha = conf_alpha
+        self._lock = threading.Lock()
+        self._pins: Dict[int, Pin] = {}
+        self._cells: Dict[Cell, Set[int]] = {}
+        self._cell_ts: Dict[Cell, float] = {}
+        self._recent: "OrderedDict[int, None]" = OrderedDict()   # oldest update first
+        self._tracks: Dict[Any, int] = {}
+        self._changed: Set[int] = set()
+        self._next_id = 1
+        self._dlat = cell_m / R_EARTH * 180.0 / math.pi
+        self._dlon: Optional[float] = None   # fixed at the first observation's latitude
+        self.version = 0
+        self.observations = 0
+
+    # ---------- grid ----------
+    def _cell(self, lat: float, lon: float) -> Cell:
+        if self._dlon is None:
+            self._dlon = self._dlat / max(math.cos(math.radians(lat)), 1e-6)
+        return int(math.floor(lat / self._dlat)), int(math.floor(lon / self._dlon))
+
+    def _index(self, p: Pin, old: Optional[Cell] = None):
+        c = self._cell(p.lat, p.lon)
+        if old is not None and old != c:
+            s = self._cells.get(old)
+            if s is not None:
+                s.discard(p.id)
+                if not s:
+                    del self._cells[old]
+                    self._cell_ts.pop(old, None)
+        self._cells.setdefault(c, set()).add(p.id)
+        if p.last_ts > self._cell_ts.get(c, 0.0):
+            self._cell_ts[c] = p.last_ts
+
+    @staticmethod
+    def _dist_m(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+        dy = math.radians(lat2 - lat1) * R_EARTH
+        dx = math.radians(lon2 - lon1) * R_EARTH * math.cos(math.radians(0.5 * (lat1 + lat2)))
+        return math.hypot(dx, dy)
+
+    def _nearest(self, cls: str, lat: float, lon: float, radius: float, ts: float) -> Optional[Pin]:
+        cy, cx = self._cell(lat, lon)
+        reach = max(1, int(math.ceil(radius / self.cell_m)))
+        best, best_d = None, radius
+        for y in range(cy - reach, cy + reach + 1):
+            for x in range(cx - reach, cx + reach + 1):
+                for pid in self._cells.get((y, x), ()):
+                    p = self._pins[pid]
+                    if p.cls != cls or ts - p.last_ts > self.merge_s:
+                        continue
+                    d = self._dist_m(lat, lon, p.lat, p.lon)
+                    if d <= best_d:
+                        best, best_d = p, d
+        return best
+
+    # ---------- ingest ----------
+    def observe(self, lat: float, lon: float, cls: str = "person", conf: float = 1.0,
+                err_m: float = 10.0, track=None, ts: Optional[float] = None) -> int:
+        """Merge one observation; returns the pin id it landed on."""
+        ts = time.time() if ts is None else ts
+        err_m = max(float(err_m), 0.5)
+        with self._lock:
+            self.observations += 1
+            p = self._pins.get(self._tracks.get(track)) if track is not None else None
+            gate = max(self.merge_m, err_m)
+            if p is not None and self._dist_m(lat, lon, p.lat, p.lon) > max(gate, 3.0 * p.err_m):
+                p = None  # track id reused for something far away
+            if p is None:
+                p = self._nearest(cls, lat, lon, gate, ts)
+            if p is None:
+                p = Pin(self._next_id, cls, lat, lon, err_m, conf, ts, track)
+                self._next_id += 1
+                self._pins[p.id] = p
+                self._index(p)
+            else:
+                old = self._cell(p.lat, p.lon)
+                w = 1.0 / err_m ** 2
+                wp = p._w * self.forget
+                p.lat = (p.lat * wp + lat * w) / (wp + w)
+                p.lon = (p.lon * wp + lon * w) / (wp + w)
+                p._w = wp + w
+                p.err_m += self.conf_alpha * (err_m - p.err_m)
+                p.conf += self.conf_alpha * (conf - p.conf)
+                p.hits += 1
+                p.last_ts = max(p.last_ts, ts)
+                p.track = track if track is not None else p.track
+                self._index(p, old)
+            if track is not None:
+                self._tracks[track] = p.id
+            self.version += 1
+            p.version = self.version
+            self._recent.pop(p.id, None)
+            self._recent[p.id] = None
+            self._changed.add(p.id)
+            return p.id
+
+    def ingest_tick(self, msg: Dict[str, Any], source: str = "default", ts: Optional[float] = None) -> int:
+        """Observations from a run_screen_pipeline "tick"; returns how many were merged."""
+        n = 0
+        src = msg.get("source", source)
+        for d in msg.get("detections") or ():
+            geo = d.get("geo") or {}
+            if geo.get("lat") is None or geo.get("lon") is None:
+                continue
+            tid = d.get("id")
+            self.observe(float(geo["lat"]), float(geo["lon"]), d.get("cls", "obj"),
+                         float(d.get("conf", 1.0)), float(geo.get("err_m") or 10.0),
+                         (src, tid) if tid is not None else None, ts)
+            n += 1
+        return n
+
+    def drain_changes(self) -> List[Dict[str, Any]]:
+        """Pins changed since the last drain (for incremental push)."""
+        with self._lock:
+            out = [self._pins[i].to_dict() for i in self._changed if i in self._pins]
+            self._changed.clear()
+        return out
+
+    # ---------- queries ----------
+    def query(self, bbox: Optional[Tuple[float, float, float, float]] = None,
+              since: Optional[float] = None, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """
+        Pins inside bbox = (min_lon, min_lat, max_lon, max_lat) whose last_ts >= since,
+        newest first.
+        """
+        with self._lock:
+            out: List[Pin] = []
+            if bbox is None and since is None:
+                ids = reversed(self._recent)
+                out = [self._pins[i] for i in ids]
+            elif since is not None and (bbox is None or self._since_is_narrow(since)):
+                for i in reversed(self._recent):
+                    p = self._pins[i]
+                    if p.last_ts < since:
+                        break
+                    if bbox is None or self._inside(p, bbox):
+                        out.append(p)
+            else:
+                out = self._bbox(bbox, since)
+                out.sort(key=lambda p: p.last_ts, reverse=True)
+            if limit is not None:
+                out = out[:limit]
+            return [p.to_dict() for p in out]
+
+    def _since_is_narrow(self, since: float) -> bool:
+        # walking the recency list is cheaper when few pins were touched since `since`
+        n = 0
+        for i in reversed(self._recent):
+            if self._pins[i].last_ts < since:
+                return True
+            n += 1
+            if n > 64:
+                return False
+        return True
+
+    @staticmethod
+    def _inside(p: Pin, bbox) -> bool:
+        return bbox[0] <= p.lon <= bbox[2] and bbox[1] <= p.lat <= bbox[3]
+
+    def _bbox(self, bbox, since: Optional[float]) -> List[Pin]:
+        if not self._cells:
+            return []
+        y0, x0 = self._cell(bbox[1], bbox[0])
+        y1, x1 = self._cell(bbox[3], bbox[2])
+        span = (y1 - y0 + 1) * (x1 - x0 + 1)
+        if span > len(self._cells):
+            cells = [c for c in self._cells if y0 <= c[0] <= y1 and x0 <= c[1] <= x1]
+        else:
+            cells = [(y, x) for y in range(y0, y1 + 1) for x in range(x0, x1 + 1) if (y, x) in self._cells]
+        out = []
+        for c in cells:
+            if since is not None and self._cell_ts.get(c, 0.0) < since:
+                continue
+            edge = c[0] in (y0, y1) or c[1] in (x0, x1)
+            for pid in self._cells[c]:
+                p = self._pins[pid]
+                if since is not None and p.last_ts < since:
+                    continue
+                if edge and not self._inside(p, bbox):
+                    continue
+                out.append(p)
+        return out
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"pins": len(self._pins), "cells": len(self._cells), "tracks": len(self._tracks),
+                    "observations": self.observations, "version": self.version}
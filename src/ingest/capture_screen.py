@@ -1,10 +1,16 @@
-﻿import time
+﻿import threading
+import time
+import zlib
 import mss
 import numpy as np
 import pygetwindow as gw
 import cv2
 
 def get_window_bbox(title="DJI_MIRROR"):
+    if not title:  # whole primary monitor
+        with mss.mss() as sct:
+            m = sct.monitors[1]
+        return {"left": m["left"], "top": m["top"], "width": m["width"], "height": m["height"]}
     wins = [w for w in gw.getAllTitles() if title in w]
     if not wins:
         raise RuntimeError(f"Window '{title}' not found. Launch scrcpy with --window-title {title}")
@@ -17,14 +23,48 @@ def get_window_bbox(title="DJI_MIRROR"):
     return {"left": left, "top": top, "width": width, "height": height}
 
 class ScreenCapture:
-    def __init__(self, title="DJI_MIRROR", target_fps=12):
+    """
+    Synchronous by default (grab on the caller's thread, paced with sleep).
+
+    threaded=True grabs on a background thread into `buffers` preallocated,
+    contiguous BGR arrays (triple buffering: the slot the caller holds is never
+    written). A 64px-wide thumbnail hash flags frames identical to the previous
+    grab -- scrcpy mirrors repeat a lot -- and skip_duplicates=True drops them
+    before they reach read(). `last_duplicate` tells flag-mode callers.
+    """
+    def __init__(self, title="DJI_MIRROR", target_fps=12, threaded=False,
+                 skip_duplicates=False, buffers=3):
         self.title = title
         self.box = get_window_bbox(title)
-        self.sct = mss.mss()
         self.period = 1.0/float(target_fps)
         self._t = time.time()
+        self.threaded = threaded
+        self.skip_duplicates = skip_duplicates
+        self.last_duplicate = False
+        self.last_ts = 0.0
+        self.sct = None if threaded else mss.mss()
+        if threaded:
+            h, w = self.box["height"], self.box["width"]
+            self._bufs = [np.empty((h, w, 3), np.uint8) for _ in range(max(3, buffers))]
+            self._cond = threading.Condition()
+            self._seq = 0          # last published grab
+            self._read_seq = 0     # last grab handed to read()
+            self._ready = -1       # slot of the last published grab
+            self._held = -1        # slot the caller is working on
+            self._dup = False
+            self._ts = 0.0
+            self._grabs = 0
+            self._dups = 0
+            self._missed = 0
+            self._fps = 0.0
+            self._grab_fps = 0.0
+            self._running = True
+            self._thread = threading.Thread(target=self._run, name="screen-capture", daemon=True)
+            self._thread.start()
 
-    def read(self):
+    def read(self, timeout=1.0):
+        if self.threaded:
+            return self._read_threaded(timeout)
         now = time.time()
         delay = self.period - (now - self._t)
         if delay > 0:
@@ -32,7 +72,101 @@ class ScreenCapture:
         self._t = time.time()
         img = np.asarray(self.sct.grab(self.box))  # BGRA
         frame = img[...,:3]  # BGR
+        self.last_ts = self._t
         return True, frame
 
+    @property
+    def closed(self):
+        """True once released (or the grab thread died); a read() timeout alone just means no new frame."""
+        if not self.threaded:
+            return self.sct is None
+        return not self._running or not self._thread.is_alive()
+
+    # ---------- threaded mode ----------
+    def _read_threaded(self, timeout):
+        with self._cond:
+            if not self._cond.wait_for(lambda: self._seq > self._read_seq or not self._running, timeout):
+                return False, None
+            if self._seq <= self._read_seq:
+                return False, None
+            self._missed += self._seq - self._read_seq - 1
+            self._read_seq = self._seq
+            self._held = self._ready
+            self.last_duplicate = self._dup
+            self.last_ts = self._ts
+            return True, self._bufs[self._held]
+
+    @staticmethod
+    def _thumb_hash(frame):
+        h, w = frame.shape[:2]
+        tw = 64
+        th = max(1, h * tw // max(1, w))
+        return zlib.crc32(cv2.resize(frame, (tw, th), interpolation=cv2.INTER_AREA))
+
+    def _run(self):
+        sct = mss.mss()  # mss handles are bound to the thread that made them
+        prev_hash = None
+        last_pub = last_grab = time.time()
+        try:
+            while self._running:
+                t0 = time.time()
+                delay = self.period - (t0 - self._t)
+                if delay > 0:
+                    time.sleep(delay)
+                self._t = ts = time.time()
+                img = np.asarray(sct.grab(self.box))  # BGRA
+                with self._cond:
+                    slot = next(i for i in range(len(self._bufs)) if i not in (self._held, self._ready))
+                buf = self._bufs[slot]
+                if img.shape[:2] != buf.shape[:2]:  # window resized
+                    buf = self._bufs[slot] = np.empty((img.shape[0], img.shape[1], 3), np.uint8)
+                cv2.cvtColor(img, cv2.COLOR_BGRA2BGR, dst=buf)
+
+                hsh = self._thumb_hash(buf)
+                dup = hsh == prev_hash
+                prev_hash = hsh
+                self._grabs += 1
+                self._grab_fps = self._ema(self._grab_fps, ts - last_grab)
+                last_grab = ts
+                if dup:
+                    self._dups += 1
+                    if self.skip_duplicates:
+                        continue
+                self._fps = self._ema(self._fps, ts - last_pub)
+                last_pub = ts
+                with self._cond:
+                    self._ready = slot
+                    self._dup = dup
+                    self._ts = ts
+                    self._seq += 1
+                    self._cond.notify_all()
+        finally:
+            sct.close()
+
+    @staticmethod
+    def _ema(prev, dt):
+        fps = 1.0 / dt if dt > 0 else 0.0
+        return 0.9*prev + 0.1*fps if prev > 0 else fps
+
+    def stats(self):
+        if not self.threaded:
+            return {"threaded": False}
+        return {
+            "threaded": True,
+            "fps": round(self._fps, 1),            # frames delivered (after duplicate skipping)
+            "grab_fps": round(self._grab_fps, 1),  # raw grabs
+            "grabs": self._grabs,
+            "duplicates": self._dups,
+            "duplicate_ratio": round(self._dups / self._grabs, 3) if self._grabs else 0.0,
+            "missed": self._missed,                # published but overtaken before read()
+        }
+
     def release(self):
-        self.sct.close()
+        if self.threaded:
+            self._running = False
+            with self._cond:
+                self._cond.notify_all()
+            self._thread.join(timeout=1.0)
+        elif self.sct is not None:
+            self.sct.close()
+            self.sct = None
@@ -0,0 +1,339 @@
+"""Shared-memory frame ring between the capture process and the server.
+
+One writer process owns a small directory block under the fixed ring name
+(magic, version, generation) and a data block ``<name>-<generation>`` laid
+out as
+
+    header  8 x u64   magic, version, slots, slot_bytes, latest seq, closed, -, -
+    meta    slots x 8 x u64   seqlock, h, w, c, kind, nbytes, ts (f64), -
+    data    slots x slot_bytes
+
+Frame ``seq`` lives in slot ``seq % slots``. The writer marks the slot's
+seqlock odd while it fills it and ``2*seq`` once committed, then bumps
+``latest``. Readers map the same block and get numpy views straight into it
+(no copy, no encode, no socket); a view stays valid until the writer laps the
+ring, which :meth:`RingReader.valid` checks.
+
+A resize, or a writer restarting after a crash, creates the data block under
+the next generation instead of reusing the name: on Windows ``unlink()`` is a
+no-op and a name stays taken while any reader still maps the old block.
+Readers follow the generation published in the directory.
+"""
+import os
+import time
+from multiprocessing import shared_memory
+from typing import Iterator, Optional, Tuple, Union
+
+import numpy as np
+from loguru import logger
+
+DEFAULT_NAME = os.environ.get("FORESIGHT_RING", "foresight_frames")
+MAGIC = 0x46535247  # "FSRG"
+VERSION = 1
+KIND_RAW, KIND_JPEG = 0, 1
+_HDR_BYTES = 64
+_META_BYTES = 64
+_ALIGN = 64
+
+# directory fields
+D_MAGIC, D_VERSION, D_GEN = range(3)
+# header fields
+H_MAGIC, H_VERSION, H_SLOTS, H_SLOT_BYTES, H_LATEST, H_CLOSED = range(6)
+# meta fields
+M_LOCK, M_H, M_W, M_C, M_KIND, M_NBYTES, M_TS = range(7)
+
+
+def _round(n: int) -> int:
+    return (n + _ALIGN - 1) // _ALIGN * _ALIGN
+
+
+def _attach(name: str) -> shared_memory.SharedMemory:
+    """Map an existing block without letting this process's resource tracker unlink it."""
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)  # 3.13+
+    except TypeError:
+        shm = shared_memory.SharedMemory(name=name)
+        try:
+            from multiprocessing import resource_tracker
+            resource_tracker.unregister(shm._name, "shared_memory")
+        except Exception:
+            pass
+        return shm
+
+
+def _unmap(shm: shared_memory.SharedMemory):
+    try:
+        shm.close()
+    except BufferError:
+        pass
+
+
+class _Layout:
+    def __init__(self, shm: shared_memory.SharedMemory, slots: int, slot_bytes: int):
+        self.shm = shm
+        self.slots = slots
+        self.slot_bytes = slot_bytes
+        buf = shm.buf
+        self.hdr = np.ndarray((8,), np.uint64, buf, 0)
+        self.meta = np.ndarray((slots, 8), np.uint64, buf, _HDR_BYTES)
+        self.ts = np.ndarray((slots, 8), np.float64, buf, _HDR_BYTES)
+        self.data_off = _round(_HDR_BYTES + slots * _META_BYTES)
+
+    def data(self, slot: int, shape, dtype=np.uint8) -> np.ndarray:
+        return np.ndarray(shape, dtype, self.shm.buf, self.data_off + slot * self.slot_bytes)
+
+    def release(self):
+        # numpy views pin the exported buffer; drop them before closing
+        self.hdr = self.meta = self.ts = None
+        _unmap(self.shm)
+
+
+# ---------- writer ----------
+class FrameRing:
+    """Writer side. Frames are written in place via reserve()/commit() or copied once via write()."""
+    def __init__(self, name: str = DEFAULT_NAME, slots: int = 4, slot_bytes: Optional[int] = None):
+        self.name = name
+        self.slots = slots
+        self._slot_bytes = slot_bytes
+        self._lay: Optional[_Layout] = None
+        self._dir_shm: Optional[shared_memory.SharedMemory] = None
+        self._dir: Optional[np.ndarray] = None
+        self._seq = 0
+        self._pending: Optional[Tuple[int, tuple, int, int]] = None
+
+    def _open_dir(self):
+        try:
+            shm = shared_memory.SharedMemory(name=self.name, create=True, size=_HDR_BYTES)
+            np.ndarray((8,), np.uint64, shm.buf, 0)[:] = 0
+        except FileExistsError:
+            shm = _attach(self.name)  # left by a crashed writer; readers may still map it
+        self._dir_shm = shm
+        self._dir = np.ndarray((8,), np.uint64, shm.buf, 0)
+
+    def _create(self, need: int):
+        if self._dir is None:
+            self._open_dir()
+        if self._lay is not None:
+            self._lay.hdr[H_CLOSED] = 1  # readers re-attach to the new block
+            self._lay.release()
+            self._unlink()
+        slot_bytes = _round(max(need, self._slot_bytes or 0))
+        size = _round(_HDR_BYTES + self.slots * _META_BYTES) + self.slots * slot_bytes
+        gen = int(self._dir[D_GEN]) if int(self._dir[D_MAGIC]) == MAGIC else 0
+        for _ in range(16):
+            gen += 1
+            try:
+                shm = shared_memory.SharedMemory(name=f"{self.name}-{gen}", create=True, size=size)
+                break
+            except FileExistsError:
+                continue  # still mapped by a reader of an earlier writer
+        else:
+            raise RuntimeError(f"frame ring '{self.name}': no free generation after {gen}")
+        lay = _Layout(shm, self.slots, slot_bytes)
+        lay.meta[:] = 0
+        lay.hdr[:] = 0
+        lay.hdr[H_VERSION] = VERSION
+        lay.hdr[H_SLOTS] = self.slots
+        lay.hdr[H_SLOT_BYTES] = slot_bytes
+        lay.hdr[H_LATEST] = self._seq
+        lay.hdr[H_MAGIC] = MAGIC  # last: marks the block ready
+        self._lay = lay
+        self._dir[D_VERSION] = VERSION
+        self._dir[D_GEN] = gen
+        self._dir[D_MAGIC] = MAGIC
+        logger.info(f"frame ring '{self.name}' gen {gen}: {self.slots} x {slot_bytes} bytes")
+
+    def reserve(self, shape, dtype=np.uint8, kind: int = KIND_RAW) -> np.ndarray:
+        """View of the next slot to fill in place; publish it with commit()."""
+        nbytes = int(np.prod(shape)) * np.dtype(dtype).itemsize
+        if self._lay is None or nbytes > self._lay.slot_bytes:
+            self._create(nbytes)
+        seq = self._seq + 1
+        slot = seq % self.slots
+        self._lay.meta[slot, M_LOCK] = 2 * seq + 1
+        self._pending = (seq, tuple(shape), kind, nbytes)
+        return self._lay.data(slot, shape, dtype)
+
+    def commit(self, ts: Optional[float] = None) -> int:
+        seq, shape, kind, nbytes = self._pending
+        self._pending = None
+        slot = seq % self.slots
+        lay = self._lay
+        h, w, c = (tuple(shape) + (1, 1, 1))[:3] if kind == KIND_RAW else (0, 0, 0)
+        lay.meta[slot, M_H:M_NBYTES + 1] = (h, w, c, kind, nbytes)
+        lay.ts[slot, M_TS] = ts if ts is not None else time.time()
+        lay.meta[slot, M_LOCK] = 2 * seq
+        lay.hdr[H_LATEST] = seq
+        self._seq = seq
+        return seq
+
+    def write(self, frame: np.ndarray, ts: Optional[float] = None) -> int:
+        np.copyto(self.reserve(frame.shape, frame.dtype), frame)
+        return self.commit(ts)
+
+    def write_bytes(self, data: bytes, ts: Optional[float] = None) -> int:
+        """Pre-encoded frame (e.g. JPEG)."""
+        view = self.reserve((len(data),), np.uint8, kind=KIND_JPEG)
+        view[:] = np.frombuffer(data, np.uint8)
+        return self.commit(ts)
+
+    def _unlink(self):
+        try:
+            self._lay.shm.unlink()
+        except FileNotFoundError:
+            pass
+
+    def close(self):
+        if self._lay is not None:
+            self._lay.hdr[H_CLOSED] = 1
+            self._unlink()
+            self._lay.release()
+            self._lay = None
+        if self._dir_shm is not None:
+            self._dir = None
+            try:
+                self._dir_shm.unlink()
+            except FileNotFoundError:
+                pass
+            _unmap(self._dir_shm)
+            self._dir_shm = None
+
+
+# ---------- reader ----------
+Frame = Union[np.ndarray, bytes]
+
+
+class RingReader:
+    """Reader side; attaches lazily so the server may start before the capture process."""
+    def __init__(self, name: str = DEFAULT_NAME, retry_s: float = 0.5):
+        self.name = name
+        self.retry_s = retry_s
+        self._lay: Optional[_Layout] = None
+        self._dir_shm: Optional[shared_memory.SharedMemory] = None
+        self._dir: Optional[np.ndarray] = None
+        self._gen = 0
+        self._next_try = 0.0
+        self.reads = 0
+        self.torn = 0
+
+    def _ensure(self) -> bool:
+        lay = self._lay
+        if lay is not None and not lay.hdr[H_CLOSED] and int(self._dir[D_GEN]) == self._gen:
+            return True
+        self._detach()
+        now = time.monotonic()
+        if now < self._next_try:
+            return False
+        self._next_try = now + self.retry_s
+        try:
+            dshm = _attach(self.name)
+        except FileNotFoundError:
+            return False
+        d = np.ndarray((8,), np.uint64, dshm.buf, 0)
+        gen = int(d[D_GEN])
+        if int(d[D_MAGIC]) != MAGIC or int(d[D_VERSION]) != VERSION:
+            del d
+            _unmap(dshm)
+            return False
+        try:
+            shm = _attach(f"{self.name}-{gen}")
+        except FileNotFoundError:
+            del d
+            _unmap(dshm)
+            return False
+        hdr = np.ndarray((8,), np.uint64, shm.buf, 0)
+        if int(hdr[H_MAGIC]) != MAGIC or int(hdr[H_VERSION]) != VERSION or hdr[H_CLOSED]:
+            del hdr, d
+            _unmap(shm)
+            _unmap(dshm)
+            return False
+        self._lay = _Layout(shm, int(hdr[H_SLOTS]), int(hdr[H_SLOT_BYTES]))
+        self._dir_shm, self._dir, self._gen = dshm, d, gen
+        return True
+
+    def _detach(self):
+        # the data block was closed or a newer generation was published (writer
+        # resized or restarted); the directory is re-resolved too, it may be a new block
+        if self._lay is not None:
+            self._lay.release()
+            self._lay = None
+        if self._dir_shm is not None:
+            self._dir = None
+            _unmap(self._dir_shm)
+            self._dir_shm = None
+
+    @property
+    def seq(self) -> int:
+        return int(self._lay.hdr[H_LATEST]) if self._ensure() else 0
+
+    def valid(self, seq: int) -> bool:
+        """True while frame `seq` has not been overwritten."""
+        lay = self._lay
+        return lay is not None and int(lay.meta[seq % lay.slots, M_LOCK]) == 2 * seq
+
+    def latest(self, copy: bool = False) -> Optional[Tuple[int, float, Frame]]:
+        """
+        (seq, ts, frame) for the newest committed frame. Raw frames are views into
+        the ring unless copy=True; callers that keep a frame past the next few
+        commits (or hold it while the writer may re-create the block) need the copy.
+        """
+        if not self._ensure():
+            return None
+        lay = self._lay
+        for _ in range(3):
+            seq = int(lay.hdr[H_LATEST])
+            if seq == 0:
+                return None
+            slot = seq % lay.slots
+            if int(lay.meta[slot, M_LOCK]) != 2 * seq:
+                self.torn += 1
+                continue
+            h, w, c, kind, nbytes = (int(v) for v in lay.meta[slot, M_H:M_NBYTES + 1])
+            ts = float(lay.ts[slot, M_TS])
+            if kind == KIND_JPEG:
+                out: Frame = bytes(lay.data(slot, (nbytes,)))
+            else:
+                out = lay.data(slot, (h, w, c) if c > 1 else (h, w))
+                if copy:
+                    out = out.copy()   # validated below, after the copy
+            if not self.valid(seq):
+                self.torn += 1
+                continue
+            self.reads += 1
+            return seq, ts, out
+        return None
+
+    def wait(self, after_seq: int = 0, timeout: float = 1.0,
+             poll_s: float = 0.002, copy: bool = False) -> Optional[Tuple[int, float, Frame]]:
+        """Block (polling) until a frame newer than after_seq is committed."""
+        deadline = time.monotonic() + timeout
+        while True:
+            if self.seq > after_seq:
+                got = self.latest(copy)
+                if got is not None:
+                    return got
+            if time.monotonic() >= deadline:
+                return None
+            time.sleep(poll_s if self._lay is not None else min(self.retry_s, timeout))
+
+    def frames(self, timeout: float = 0.5) -> Iterator[Optional[Tuple[Frame, float]]]:
+        """(frame, ts) per new frame (raw frames copied out of the ring), or None when nothing arrived within timeout."""
+        seq, gen = 0, self._gen
+        while True:
+            got = self.wait(seq, timeout, copy=True)
+            if got is None:
+                if self._gen != gen:  # a restarted writer counts seq from 1 again
+                    seq, gen = 0, self._gen
+                yield None
+                continue
+            seq, ts, frame = got
+            yield frame, ts
+
+    def close(self):
+        self._detach()
+
+    def stats(self):
+        lay = self._lay
+        return {"attached": lay is not None, "gen": self._gen,
+                "seq": int(lay.hdr[H_LATEST]) if lay is not None else 0,
+                "reads": self.reads, "torn": self.torn}
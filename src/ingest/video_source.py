@@ -0,0 +1,369 @@
+"""One video source abstraction for webcam / RTSP / UDP / file / screen.
+
+cv2.VideoCapture only decodes when read() is called, so a processing loop that
+reads once per (slow) detection lets the RTSP/UDP socket buffer fill and the
+picture drifts seconds behind. VideoSource reads on its own thread as fast as
+the source produces, keeps only the newest frame (with its capture timestamp)
+and reconnects with exponential backoff when the stream drops. Consumers use
+the familiar ``ok, frame = src.read()``; ``src.last_ts`` is the capture time.
+
+URL forms: "0" / "1" (webcam index), "rtsp://...", "udp://...", "http(s)://...",
+a file path, "screen" / "screen:<window title>" (default DJI_MIRROR), or
+"desktop" for the whole primary monitor.
+"""
+import os
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+import cv2
+import numpy as np
+from loguru import logger
+
+# ask FFmpeg not to buffer network input (only if the user has not set options)
+os.environ.setdefault("OPENCV_FFMPEG_CAPTURE_OPTIONS", "fflags;nobuffer|flags;low_delay")
+
+
+def source_kind(url: str) -> str:
+    u = str(url).strip()
+    low = u.lower()
+    if low.isdigit():
+        return "webcam"
+    if low in ("screen", "desktop") or low.startswith("screen:"):
+        return "screen"
+    for scheme, kind in (("rtsp://", "rtsp"), ("rtsps://", "rtsp"), ("udp://", "udp"),
+                         ("rtp://", "udp"), ("srt://", "udp"), ("http://", "http"), ("https://", "http")):
+        if low.startswith(scheme):
+            return kind
+    return "file"
+
+
+def open_capture(url: str, timeout_ms: int = 5000) -> cv2.VideoCapture:
+    """cv2.VideoCapture with the low-latency settings we want for every live source."""
+    kind = source_kind(url)
+    if kind == "webcam":
+        cap = cv2.VideoCapture(int(url))
+    else:
+        try:
+            cap = cv2.VideoCapture(url, cv2.CAP_FFMPEG,
+                                   [cv2.CAP_PROP_OPEN_TIMEOUT_MSEC, timeout_ms,
+                                    cv2.CAP_PROP_READ_TIMEOUT_MSEC, timeout_ms])
+        except (cv2.error, TypeError, AttributeError):  # OpenCV < 4.6: no open params
+            cap = cv2.VideoCapture(url, cv2.CAP_FFMPEG)
+    if kind != "file":
+        cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+    return cap
+
+
+class VideoSource:
+    def __init__(self, url: str, reconnect: bool = True, loop_file: bool = False,
+                 backoff: Tuple[float, float] = (0.5, 10.0), fail_reads: int = 30,
+                 screen_fps: float = 12.0):
+        self.url = str(url)
+        self.kind = source_kind(self.url)
+        self.reconnect = reconnect
+        self.loop_file = loop_file
+        self.backoff = backoff
+        self.fail_reads = fail_reads    # consecutive failed reads before reopening
+        self.screen_fps = screen_fps
+        self.last_ts = 0.0
+        self.last_seq = 0
+        self.ever_connected = False
+        self.ended = False              # file finished (and not looping) or stopped
+
+        self._cond = threading.Condition()
+        self._frame: Optional[np.ndarray] = None
+        self._ts = 0.0
+        self._seq = 0
+        self._read_seq = 0
+        self._thread: Optional[threading.Thread] = None
+        self._running = False
+        self._connected = False
+        self._reconnects = 0
+        self._dropped = 0
+        self._fps = 0.0
+        self._error: Optional[str] = None
+        self._screen = None
+        self._retry_at = 0.0
+        self._delay = backoff[0]
+        self._latest_lock = threading.Lock()
+
+    # ---------- public API ----------
+    def start(self) -> "VideoSource":
+        if self.kind == "screen":
+            self._running = True  # ScreenCapture already grabs on its own thread
+            self.ended = False
+            return self
+        if self._thread is None or not self._thread.is_alive():
+            self._running = True
+            self.ended = False
+            self._thread = threading.Thread(target=self._run, name=f"video-{self.kind}", daemon=True)
+            self._thread.start()
+        return self
+
+    @property
+    def connected(self) -> bool:
+        return self._connected
+
+    def wait_ready(self, timeout: float = 5.0) -> bool:
+        """True once the first frame has arrived."""
+        with self._cond:
+            return self._cond.wait_for(lambda: self._seq > 0 or self.ended, timeout) and self._seq > 0
+
+    def read(self, timeout: float = 1.0) -> Tuple[bool, Optional[np.ndarray]]:
+        """Newest frame not returned before; (False, None) on timeout or end of stream."""
+        if self.kind == "screen":
+            return self._read_screen(timeout)
+        with self._cond:
+            if not self._cond.wait_for(lambda: self._seq > self._read_seq or self.ended, timeout):
+                return False, None
+            if self._seq <= self._read_seq:
+                return False, None
+            self._dropped += self._seq - self._read_seq - 1
+            self._read_seq = self.last_seq = self._seq
+            self.last_ts = self._ts
+            return True, self._frame
+
+    def latest(self, timeout: float = 1.0) -> Tuple[bool, Optional[np.ndarray], float]:
+        """
+        Copy of the newest frame and its capture ts without consuming it, so any
+        number of readers (request handlers) can share one source; waits only for
+        the first frame. A copy because the source's owner may draw on its frames.
+        """
+        if self.kind == "screen":
+            with self._latest_lock:
+                self._read_screen(timeout if self._seq == 0 else 0.0)
+        with self._cond:
+            if not self._cond.wait_for(lambda: self._seq > 0 or self.ended, timeout) or self._seq == 0:
+                return False, None, 0.0
+            return True, self._frame.copy(), self._ts
+
+    def isOpened(self) -> bool:
+        return self._running and not self.ended
+
+    def release(self):
+        self._running = False
+        if self._screen is not None:
+            self._screen.release()
+            self._screen = None
+        with self._cond:
+            self.ended = True
+            self._cond.notify_all()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join(timeout=2.0)
+        self._thread = None
+
+    def stats(self) -> Dict:
+        return {
+            "url": self.url,
+            "kind": self.kind,
+            "connected": self._connected,
+            "fps": round(self._fps, 1),
+            "frames": self._seq,
+            "dropped": self._dropped,       # decoded but superseded before read()
+            "reconnects": self._reconnects,
+            "age_ms": int((time.time() - self._ts) * 1000) if self._seq else None,
+            "error": self._error,
+        }
+
+    # ---------- screen (ScreenCapture's own thread and buffers) ----------
+    def _read_screen(self, timeout: float) -> Tuple[bool, Optional[np.ndarray]]:
+        if not self._running:
+            return False, None
+        if self._screen is None:
+            if time.time() < self._retry_at:
+                time.sleep(min(timeout, self._retry_at - time.time()))
+                return False, None
+            title = None if self.url.lower() == "desktop" else (self.url.partition(":")[2] or "DJI_MIRROR")
+            try:
+                from .capture_screen import ScreenCapture  # mss / pygetwindow only when needed
+                self._screen = ScreenCapture(title=title, target_fps=self.screen_fps,
+                                             threaded=True, skip_duplicates=True)
+            except Exception as e:
+                self._error = str(e)
+                self._retry_at = time.time() + self._delay
+                self._delay = min(self._delay * 2, self.backoff[1])
+                return False, None
+            if self.ever_connected:
+                self._reconnects += 1
+            self._connected = self.ever_connected = True
+            self._error = None
+            self._delay = self.backoff[0]
+        ok, frame = self._screen.read(timeout)
+        if ok:
+            # ScreenCapture hands out its reused ring buffers; the grab thread rewrites
+            # them while infer/blur/encode (and evidence) may still hold this frame
+            frame = frame.copy()
+            self.last_ts = self._screen.last_ts
+            self._publish(frame, self.last_ts)
+            self._read_seq = self.last_seq = self._seq
+        return ok, frame
+
+    # ---------- reader thread ----------
+    def _open(self):
+        cap = open_capture(self.url)
+        if not cap.isOpened():
+            cap.release()
+            raise IOError(f"cannot open {self.url}")
+        return cap
+
+    def _publish(self, frame: np.ndarray, ts: float):
+        with self._cond:
+            dt = ts - self._ts if self._seq else 0.0
+            self._frame, self._ts = frame, ts
+            self._seq += 1
+            self._cond.notify_all()
+        if dt > 0:
+            fps = 1.0 / dt
+            self._fps = 0.9*self._fps + 0.1*fps if self._fps > 0 else fps
+
+    def _run(self):
+        delay = self.backoff[0]
+        while self._running:
+            try:
+                cap = self._open()
+            except Exception as e:
+                if self._error != str(e):
+                    logger.warning(f"video source {self.url}: {e}; retrying")
+                self._error = str(e)
+                if not self.reconnect:
+                    break
+                self._sleep(delay)
+                delay = min(delay * 2, self.backoff[1])
+                continue
+
+            if self.ever_connected:
+                self._reconnects += 1
+                logger.info(f"video source {self.url}: reconnected")
+            self._connected = self.ever_connected = True
+            self._error = None
+            delay = self.backoff[0]
+            try:
+                self._drain(cap)
+            finally:
+                self._connected = False
+                cap.release()
+            if self.kind == "file" and not self.loop_file:
+                break
+            if not self.reconnect:
+                break
+        with self._cond:
+            self.ended = True
+            self._cond.notify_all()
+
+    def _drain(self, cap):
+        """Read until the source fails; files are paced at their native rate."""
+        period = 0.0
+        if self.kind == "file":
+            fps = cap.get(cv2.CAP_PROP_FPS) or 0.0
+            period = 1.0 / fps if 0 < fps < 1000 else 1.0 / 30.0
+        fails = 0
+        next_t = time.time()
+        while self._running:
+            ok, frame = cap.read()
+            ts = time.time()
+            if not ok:
+                if self.kind == "file":
+                    return
+                fails += 1
+                if fails >= self.fail_reads:
+                    self._error = "read failed"
+                    logger.warning(f"video source {self.url}: stream stalled, reconnecting")
+                    return
+                time.sleep(0.01)
+                continue
+            fails = 0
+            self._publish(frame, ts)
+            if period:
+                next_t += period
+                self._sleep(next_t - time.time())
+
+    def _sleep(self, s: float):
+        end = time.time() + s
+        while self._running and time.time() < end:
+            time.sleep(min(0.1, end - time.time()))
+
+
+class SharedSources:
+    """
+    One long-lived VideoSource per URL for request handlers that want "a frame
+    from the camera now": the first request opens the device, later ones read
+    the newest frame from the same handle, and a source nobody asked for in
+    `idle_s` seconds is released. adopt() registers a source someone else owns
+    (e.g. the pipeline's) so handlers reuse it instead of opening the device twice.
+    """
+    def __init__(self, idle_s: float = 60.0):
+        self.idle_s = idle_s
+        self._lock = threading.Lock()
+        self._sources: Dict[str, VideoSource] = {}
+        self._used: Dict[str, float] = {}
+        self._pinned: Dict[str, bool] = {}
+        self._reaper: Optional[threading.Thread] = None
+
+    @classmethod
+    def from_env(cls) -> "SharedSources":
+        """FORESIGHT_CAMERA_IDLE: seconds before an unused handle is released."""
+        return cls(float(os.environ.get("FORESIGHT_CAMERA_IDLE", "60")))
+
+    def get(self, url: str) -> VideoSource:
+        url = str(url)
+        with self._lock:
+            src = self._sources.get(url)
+            if src is None or src.ended:
+                src = self._sources[url] = VideoSource(url, loop_file=True, screen_fps=5.0).start()
+                self._pinned[url] = False
+                logger.info(f"shared source {url}: opened")
+            self._used[url] = time.time()
+            if self._reaper is None or not self._reaper.is_alive():
+                self._reaper = threading.Thread(target=self._reap, name="shared-sources", daemon=True)
+                self._reaper.start()
+            return src
+
+    def latest(self, url: str, timeout: float = 2.0) -> Tuple[bool, Optional[np.ndarray], float]:
+        return self.get(url).latest(timeout)
+
+    def adopt(self, src: VideoSource):
+        with self._lock:
+            old = self._sources.get(src.url)
+            if old is not None and old is not src and not self._pinned.get(src.url):
+                old.release()
+            self._sources[src.url] = src
+            self._pinned[src.url] = True
+            self._used[src.url] = time.time()
+
+    def forget(self, src: VideoSource):
+        """Drop an adopted source (its owner releases it)."""
+        with self._lock:
+            if self._sources.get(src.url) is src:
+                del self._sources[src.url]
+                self._pinned.pop(src.url, None)
+
+    def _reap(self):
+        while True:
+            time.sleep(min(5.0, self.idle_s))
+            now = time.time()
+            with self._lock:
+                idle = [u for u, s in self._sources.items()
+                        if not self._pinned.get(u) and now - self._used.get(u, now) > self.idle_s]
+                gone = [self._sources.pop(u) for u in idle]
+                if not self._sources:
+                    self._reaper = None
+            for src in gone:
+                logger.info(f"shared source {src.url}: idle, released")
+                src.release()
+            if self._reaper is None:    # nothing left to watch; get() starts a new reaper
+                return
+
+    def close(self):
+        with self._lock:
+            owned = [s for u, s in self._sources.items() if not self._pinned.get(u)]
+            self._sources.clear()
+            self._pinned.clear()
+        for src in owned:
+            src.release()
+
+    def stats(self) -> Dict[str, Dict]:
+        with self._lock:
+            items = list(self._sources.items())
+            pinned = dict(self._pinned)
+        return {u: {**s.stats(), "shared": not pinned.get(u)} for u, s in items}
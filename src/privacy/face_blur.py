@@ -0,0 +1,154 @@
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+import cv2
+import numpy as np
+from ..track.iou_tracker import IoUTracker, iou_pairs
+from ..util.config import privacy as privacy_config
+
+
+_WINDOW = 24  # haarcascade_frontalface_default detection window (px)
+
+
+class PrivacyEngine:
+    """
+    Bystander face blur that stays cheap at full frame rate:
+      - Haar face detection runs every `detect_every` frames on a gray copy
+        downscaled to `detect_width`
+      - faces too small for that copy (down to `min_face` full-resolution px,
+        the cascade window) come from a full-resolution pass restricted to
+        small sizes, started on keyframes and at least every `full_every`
+        frames; it runs on a worker thread (inline with block=True) and its
+        boxes join every detection until the next pass replaces them
+      - in between, face boxes coast on an IoUTracker (constant velocity)
+      - each face is pixelated (downscale + nearest upscale, in place)
+        instead of a large Gaussian kernel
+    Enabled by default according to controls.blur_non_targets in
+    configs/privacy.yaml.
+    """
+    def __init__(self, cfg: Optional[Dict] = None, detect_every=5, detect_width=480, block=10, pad=0.15,
+                 min_face=_WINDOW, full_every=15, block_full=False):
+        cfg = cfg or privacy_config()
+        self.enabled = bool(cfg.get("controls", {}).get("blur_non_targets", True))
+        self.detect_every = max(1, int(detect_every))
+        self.detect_width = int(detect_width)
+        self.block = max(2, int(block))
+        self.pad = float(pad)
+        self.min_face = max(_WINDOW, int(min_face))
+        self.full_every = max(1, int(full_every))
+        try:
+            cascade_path = cv2.data.haarcascades + "haarcascade_frontalface_default.xml"
+            self._cascade = cv2.CascadeClassifier(cascade_path)
+            if self._cascade.empty():
+                self._cascade = None
+        except Exception:
+            self._cascade = None
+        self._tracker = IoUTracker(iou_thr=0.2, ttl=2 * self.detect_every)
+        self._n = 0
+        self._faces = 0
+        self._ms = 0.0
+        self._detect_ms = 0.0
+        self._full_ms = 0.0
+        self._since_full = self.full_every
+        self._fine: List[Tuple[float, float, float, float]] = []   # newest full-resolution pass
+        self._fine_job: Optional[Future] = None
+        self._pool = None if block_full else ThreadPoolExecutor(max_workers=1, thread_name_prefix="face-full")
+
+    def _scale(self, w: int) -> float:
+        return min(1.0, self.detect_width / float(w))
+
+    def _detect(self, frame):
+        h, w = frame.shape[:2]
+        s = self._scale(w)
+        small = cv2.resize(frame, (int(w * s), int(h * s)), interpolation=cv2.INTER_AREA) if s < 1.0 else frame
+        gray = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+        m = max(_WINDOW, int(round(self.min_face * s)))  # min_face in full-res px, never below the window
+        boxes = [(x / s, y / s, (x + fw) / s, (y + fh) / s)
+                 for (x, y, fw, fh) in self._cascade.detectMultiScale(gray, scaleFactor=1.15, minNeighbors=4,
+                                                                      minSize=(m, m))]
+        fine = self._fine
+        if boxes and fine:
+            dup = set(iou_pairs(np.array(fine, np.float32), np.array(boxes, np.float32), 0.3)[0].tolist())
+            fine = [b for i, b in enumerate(fine) if i not in dup]
+        return [{"name": "face", "conf": 1.0, "xyxy": list(b)} for b in boxes + fine]
+
+    def _full_top(self, w: int) -> int:
+        """Largest face the full-resolution pass looks for (what the downscaled pass misses); 0 if none."""
+        s = self._scale(w)
+        smallest = max(_WINDOW, self.min_face * s) / s
+        return int(smallest * 1.2) if smallest > self.min_face * 1.15 else 0
+
+    def _detect_full(self, gray: np.ndarray, top: int):
+        t0 = time.time()
+        faces = self._cascade.detectMultiScale(gray, scaleFactor=1.15, minNeighbors=4,
+                                               minSize=(self.min_face, self.min_face), maxSize=(top, top))
+        self._full_ms = (time.time() - t0) * 1000.0
+        return [(float(x), float(y), float(x + fw), float(y + fh)) for (x, y, fw, fh) in faces]
+
+    def _full_pass(self, frame, keyframe: bool) -> bool:
+        """Start (or, with block_full, run) the small-face pass when due; True if new results are in."""
+        fresh = False
+        job = self._fine_job
+        if job is not None and job.done():
+            self._fine_job = None
+            try:
+                self._fine = job.result()
+                fresh = True
+            except Exception:
+                pass
+        self._since_full += 1
+        if not (keyframe or self._since_full >= self.full_every) or self._fine_job is not None:
+            return fresh
+        top = self._full_top(frame.shape[1])
+        if not top:
+            return fresh
+        self._since_full = 0
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)  # a new array: safe to hand to the worker
+        if self._pool is None:
+            self._fine = self._detect_full(gray, top)
+            return True
+        self._fine_job = self._pool.submit(self._detect_full, gray, top)
+        return fresh
+
+    def _pixelate(self, frame, boxes: np.ndarray):
+        h, w = frame.shape[:2]
+        for x1, y1, x2, y2 in boxes.tolist():
+            px, py = (x2 - x1) * self.pad, (y2 - y1) * self.pad
+            x1, y1 = max(0, int(x1 - px)), max(0, int(y1 - py))
+            x2, y2 = min(w, int(x2 + px)), min(h, int(y2 + py))
+            if x2 - x1 < 2 or y2 - y1 < 2:
+                continue
+            roi = frame[y1:y2, x1:x2]
+            small = cv2.resize(roi, (max(1, (x2 - x1) // self.block), max(1, (y2 - y1) // self.block)),
+                               interpolation=cv2.INTER_AREA)
+            cv2.resize(small, (x2 - x1, y2 - y1), dst=roi, interpolation=cv2.INTER_NEAREST)
+
+    def apply(self, frame, keyframe: bool = False):
+        """Blur faces in place; returns the frame. keyframe=True starts the full-resolution pass now."""
+        if not self.enabled or self._cascade is None:
+            return frame
+        t0 = time.time()
+        fresh = self._full_pass(frame, keyframe)
+        if fresh or self._n % self.detect_every == 0:
+            self._tracker.update(self._detect(frame))
+            self._detect_ms = (time.time() - t0) * 1000.0
+        else:
+            self._tracker.update([])
+        self._n += 1
+        boxes = self._tracker.predicted()
+        self._faces = len(boxes)
+        self._pixelate(frame, boxes)
+        ms = (time.time() - t0) * 1000.0
+        self._ms = 0.9*self._ms + 0.1*ms if self._ms > 0 else ms
+        return frame
+
+    def stats(self) -> Dict:
+        return {
+            "enabled": self.enabled,
+            "faces": self._faces,
+            "ms": round(self._ms, 2),
+            "detect_ms": round(self._detect_ms, 2),
+            "detect_every": self.detect_every,
+            "min_face": self.min_face,
+            "full_ms": round(self._full_ms, 2),
+        }
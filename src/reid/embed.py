@@ -0,0 +1,109 @@
+"""
+Appearance embeddings for person crops, on CPU.
+
+The default embedding is hand-built and needs no model: each crop is
+resized to 32x64 and split into four horizontal stripes (head, torso,
+legs, feet); per stripe an 8x4 hue/saturation histogram plus a 4-bin value
+histogram, square-rooted (Hellinger) and L2-normalized, so the dot product
+of two embeddings is their cosine similarity. All crops of a frame are
+binned in one bincount call. That is enough to tell a red jacket from a
+blue one across frames of the same flight, not to recognise a face.
+
+FORESIGHT_REID_MODEL=<path.onnx> swaps in a learned ReID network (e.g. an
+OSNet export, NCHW RGB input, ImageNet normalization) via onnxruntime.
+"""
+import os
+from typing import List, Optional
+
+import cv2
+import numpy as np
+from loguru import logger
+
+try:
+    import onnxruntime as ort
+except Exception:
+    ort = None
+
+CROP_W, CROP_H = 32, 64
+STRIPES = 4
+H_BINS, S_BINS, V_BINS = 8, 4, 4
+_PER_STRIPE = H_BINS * S_BINS + V_BINS
+HIST_DIM = STRIPES * _PER_STRIPE          # 144
+
+
+def crop_boxes(frame: np.ndarray, boxes: np.ndarray, min_px: int = 8) -> List[Optional[np.ndarray]]:
+    """xyxy boxes -> crops (None for boxes smaller than min_px after clipping)."""
+    h, w = frame.shape[:2]
+    out = []
+    for x1, y1, x2, y2 in np.asarray(boxes, np.float32).reshape(-1, 4).tolist():
+        x1, y1 = max(0, int(x1)), max(0, int(y1))
+        x2, y2 = min(w, int(x2)), min(h, int(y2))
+        out.append(frame[y1:y2, x1:x2] if x2 - x1 >= min_px and y2 - y1 >= min_px else None)
+    return out
+
+
+def _l2(v: np.ndarray) -> np.ndarray:
+    n = np.linalg.norm(v, axis=1, keepdims=True)
+    return v / np.maximum(n, 1e-12)
+
+
+class AppearanceEmbedder:
+    def __init__(self, model_path: Optional[str] = None, threads: int = 1):
+        self.session = None
+        self.dim = HIST_DIM
+        model_path = model_path if model_path is not None else os.environ.get("FORESIGHT_REID_MODEL", "")
+        if model_path:
+            if ort is None:
+                logger.warning("onnxruntime not available (using colour-histogram ReID embeddings)")
+            elif not os.path.exists(model_path):
+                logger.warning(f"ReID model not found: {model_path} (using colour-histogram embeddings)")
+            else:
+                self._load(model_path, threads)
+
+    @property
+    def name(self) -> str:
+        return "onnx" if self.session is not None else "hist"
+
+    def _load(self, path: str, threads: int):
+        so = ort.SessionOptions()
+        so.intra_op_num_threads = threads
+        so.inter_op_num_threads = 1
+        self.session = ort.InferenceSession(path, sess_options=so, providers=["CPUExecutionProvider"])
+        inp = self.session.get_inputs()[0]
+        self._input_name = inp.name
+        h, w = inp.shape[2], inp.shape[3]
+        self._size = (w, h) if isinstance(h, int) and isinstance(w, int) else (128, 256)
+        self.dim = int(self.session.get_outputs()[0].shape[-1])
+
+    def embed(self, crops: List[np.ndarray]) -> np.ndarray:
+        """BGR crops -> (N, dim) float32, L2-normalized rows."""
+        if not crops:
+            return np.zeros((0, self.dim), np.float32)
+        if self.session is not None:
+            return self._embed_onnx(crops)
+        return self._embed_hist(crops)
+
+    def _embed_hist(self, crops: List[np.ndarray]) -> np.ndarray:
+        n = len(crops)
+        # all crops side by side in one image: one colour conversion for the batch
+        strip = np.empty((CROP_H, CROP_W * n, 3), np.uint8)
+        for i, c in enumerate(crops):
+            strip[:, i * CROP_W:(i + 1) * CROP_W] = cv2.resize(c, (CROP_W, CROP_H), interpolation=cv2.INTER_AREA)
+        hsv = cv2.cvtColor(strip, cv2.COLOR_BGR2HSV).reshape(CROP_H, n, CROP_W, 3)
+        h = hsv[..., 0].astype(np.int32) * H_BINS // 180
+        s = hsv[..., 1].astype(np.int32) * S_BINS // 256
+        v = hsv[..., 2].astype(np.int32) * V_BINS // 256
+        stripe = (np.arange(CROP_H) * STRIPES // CROP_H)[:, None, None]
+        base = np.arange(n)[None, :, None] * HIST_DIM + stripe * _PER_STRIPE
+        hs_idx = (base + h * S_BINS + s).ravel()
+        v_idx = (base + H_BINS * S_BINS + v).ravel()
+        hist = np.bincount(np.concatenate([hs_idx, v_idx]), minlength=n * HIST_DIM)
+        return _l2(np.sqrt(hist.reshape(n, HIST_DIM).astype(np.float32)))
+
+    def _embed_onnx(self, crops: List[np.ndarray]) -> np.ndarray:
+        w, h = self._size
+        batch = np.stack([cv2.resize(c, (w, h), interpolation=cv2.INTER_LINEAR) for c in crops])
+        x = batch[..., ::-1].astype(np.float32) / 255.0
+        x = (x - np.array([0.485, 0.456, 0.406], np.float32)) / np.array([0.229, 0.224, 0.225], np.float32)
+        out = self.session.run(None, {self._input_name: np.ascontiguousarray(x.transpose(0, 3, 1, 2))})[0]
+        return _l2(out.reshape(len(crops), -1).astype(np.float32))
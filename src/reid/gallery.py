@@ -0,0 +1,116 @@
+"""
+In-memory embedding gallery.
+
+Entries live compactly in the first `n` rows of one preallocated float32
+matrix (oldest first) with parallel track-id / timestamp arrays, so a
+search is a single (queries x n) matrix product over L2-normalized rows,
+i.e. batched cosine similarity, and expiry drops a prefix of rows.
+Nothing is ever written to disk; rows that expire or are evicted are
+zeroed. The TTL comes from retention.embeddings_days in
+configs/privacy.yaml (see SuspectLock.from_env).
+"""
+import time
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+
+class ReidGallery:
+    def __init__(self, dim: int, capacity: int = 4096, ttl_s: float = 600.0):
+        self.dim = int(dim)
+        self.capacity = int(capacity)
+        self.ttl_s = float(ttl_s)
+        self.n = 0
+        self._vecs = np.zeros((self.capacity, self.dim), np.float32)
+        self._tracks = np.zeros(self.capacity, np.int64)
+        self._ts = np.zeros(self.capacity, np.float64)
+        self.added = 0
+        self.expired = 0
+        self.evicted = 0
+
+    def _drop_first(self, k: int):
+        n = self.n
+        self._vecs[:n - k] = self._vecs[k:n]
+        self._tracks[:n - k] = self._tracks[k:n]
+        self._ts[:n - k] = self._ts[k:n]
+        self._vecs[n - k:n] = 0.0
+        self.n = n - k
+
+    def expire(self, now: Optional[float] = None) -> int:
+        """Drop entries older than ttl_s; returns how many went."""
+        n = self.n
+        if not n:
+            return 0
+        now = time.time() if now is None else now
+        # rows are in insertion order, so the expired ones are a prefix
+        k = int(np.searchsorted(self._ts[:n], now - self.ttl_s, side="left"))
+        if k:
+            self._drop_first(k)
+            self.expired += k
+        return k
+
+    def add(self, vecs: np.ndarray, tracks, ts: Optional[float] = None):
+        vecs = np.asarray(vecs, np.float32).reshape(-1, self.dim)
+        k = len(vecs)
+        if not k:
+            return
+        if k > self.capacity:
+            vecs, tracks = vecs[-self.capacity:], np.asarray(tracks)[-self.capacity:]
+            k = self.capacity
+        over = self.n + k - self.capacity
+        if over > 0:
+            self._drop_first(over)
+            self.evicted += over
+        n = self.n
+        self._vecs[n:n + k] = vecs
+        self._tracks[n:n + k] = tracks
+        # keep timestamps non-decreasing so expiry stays a prefix
+        self._ts[n:n + k] = max(time.time() if ts is None else ts, self._ts[n - 1] if n else 0.0)
+        self.n = n + k
+        self.added += k
+
+    def similarity(self, queries: np.ndarray) -> np.ndarray:
+        """Cosine similarity of every query row against every entry -> (q, n)."""
+        q = np.asarray(queries, np.float32).reshape(-1, self.dim)
+        return q @ self._vecs[:self.n].T
+
+    def best(self, queries: np.ndarray) -> np.ndarray:
+        """Highest similarity of each query to any entry (-1 when empty) -> (q,)."""
+        if not self.n:
+            return np.full(len(queries), -1.0, np.float32)
+        return self.similarity(queries).max(axis=1)
+
+    def search(self, query: np.ndarray, k: int = 5, exclude: Tuple[int, ...] = ()) -> List[Dict]:
+        """Top-k distinct tracks for one query (mean of its rows): [{"track", "score", "ts"}]."""
+        if not self.n:
+            return []
+        q = np.asarray(query, np.float32).reshape(-1, self.dim).mean(axis=0)
+        scores = self.similarity(q)[0]
+        tracks = self._tracks[:self.n]
+        out, seen = [], set(exclude)
+        for i in np.argsort(-scores):
+            t = int(tracks[i])
+            if t in seen:
+                continue
+            seen.add(t)
+            out.append({"track": t, "score": round(float(scores[i]), 3), "ts": float(self._ts[i])})
+            if len(out) >= k:
+                break
+        return out
+
+    def vectors(self, track: int, last: int = 16) -> np.ndarray:
+        """Up to `last` most recent rows of one track."""
+        idx = np.flatnonzero(self._tracks[:self.n] == track)[-last:]
+        return self._vecs[idx].copy()
+
+    def rows(self) -> np.ndarray:
+        return self._vecs[:self.n].copy()
+
+    def clear(self):
+        self._vecs[:self.n] = 0.0
+        self.n = 0
+
+    def stats(self) -> Dict:
+        n = self.n
+        return {"entries": n, "capacity": self.capacity, "tracks": int(len(np.unique(self._tracks[:n]))),
+                "ttl_s": self.ttl_s, "added": self.added, "expired": self.expired, "evicted": self.evicted}
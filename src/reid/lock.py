@@ -0,0 +1,182 @@
+"""
+Suspect lock: keep a chosen person locked across track id changes.
+
+Every tracked person is embedded at most every `every_s` seconds (one
+batched embed call per frame) into a session gallery. Locking a track
+copies that track's recent embeddings into a small target gallery (an
+uploaded reference photo works the same way); from then on each embedded
+person is scored against the targets, the locked track is marked, and
+when it is lost a new track scoring >= `threshold` inherits the lock.
+
+Per configs/privacy.yaml, suspect-lock is for a missing person with
+consent or vital interest: embeddings stay in memory, expire after the
+retention TTL and are wiped when the lock is released.
+"""
+import os
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+from loguru import logger
+
+from ..util.config import privacy as privacy_config
+from .embed import AppearanceEmbedder, crop_boxes
+from .gallery import ReidGallery
+
+REF_TRACK = -1   # target rows from a reference image rather than a track
+
+
+class SuspectLock:
+    def __init__(self, embedder: Optional[AppearanceEmbedder] = None, ttl_s: float = 600.0,
+                 threshold: float = 0.85, every_s: float = 0.5, capacity: int = 4096,
+                 classes=("person",), on_event: Optional[Callable[..., None]] = None):
+        self.embedder = embedder or AppearanceEmbedder()
+        self.threshold = float(threshold)
+        self.every_s = float(every_s)
+        self.classes = set(classes)
+        self.on_event = on_event
+        self.gallery = ReidGallery(self.embedder.dim, capacity, ttl_s)
+        self.targets = ReidGallery(self.embedder.dim, 256, ttl_s)
+        self.enabled = False
+        self.track: Optional[int] = None      # track currently holding the lock
+        self._lock = threading.Lock()
+        self._last_embed: Dict[int, float] = {}
+        self._scores: Dict[int, float] = {}
+        self._last_dets: List[Dict] = []
+        self._embed_ms = 0.0
+        self.reacquired = 0
+
+    @classmethod
+    def from_env(cls, on_event=None) -> "SuspectLock":
+        """
+        TTL: FORESIGHT_REID_TTL seconds (600), capped at retention.embeddings_days when
+        that is > 0; embeddings_days: 0 means never kept past the live session.
+        FORESIGHT_REID_THRESH (0.85) and FORESIGHT_REID_EVERY (0.5 s) tune matching.
+        """
+        ttl = float(os.environ.get("FORESIGHT_REID_TTL", "600"))
+        days = float(privacy_config().get("retention", {}).get("embeddings_days", 0) or 0)
+        if days > 0:
+            ttl = min(ttl, days * 86400.0)
+        return cls(ttl_s=ttl, threshold=float(os.environ.get("FORESIGHT_REID_THRESH", "0.85")),
+                   every_s=float(os.environ.get("FORESIGHT_REID_EVERY", "0.5")), on_event=on_event)
+
+    def _event(self, event: str, **fields):
+        if self.on_event is not None:
+            self.on_event(event, **fields)
+
+    # ---------- control ----------
+    def lock(self, track: Optional[int] = None) -> Optional[int]:
+        """Lock onto `track` (default: the most confident person in the last frame); returns the track id."""
+        with self._lock:
+            if track is None:
+                people = [d for d in self._last_dets if d.get("id") is not None]
+                if not people:
+                    self.enabled = True   # update() picks someone once people are in view
+                    return self.track
+                track = int(max(people, key=lambda d: d.get("conf", 0.0))["id"])
+            self.enabled = True
+            self.track = int(track)
+            vecs = self.gallery.vectors(self.track)
+            self.targets.add(vecs, [self.track] * len(vecs))
+            self._last_embed.pop(self.track, None)   # embed it on the next frame
+        self._event("suspect_lock", track=self.track)
+        return self.track
+
+    def add_reference(self, image: np.ndarray) -> bool:
+        """Use a photo of the person (cropped to them) as a lock target."""
+        vec = self.embedder.embed([image])
+        with self._lock:
+            self.targets.add(vec, [REF_TRACK])
+            self.enabled = True
+        self._event("suspect_reference", dim=int(vec.shape[1]))
+        return True
+
+    def clear(self):
+        """Release the lock and wipe every embedding."""
+        with self._lock:
+            had = self.enabled or self.gallery.n or self.targets.n
+            self.enabled = False
+            self.track = None
+            self.gallery.clear()
+            self.targets.clear()
+            self._last_embed.clear()
+            self._scores.clear()
+        if had:
+            self._event("suspect_release")
+
+    # ---------- per frame ----------
+    def update(self, frame: np.ndarray, dets: List[Dict], ts: Optional[float] = None) -> List[Dict]:
+        """Embed due people, score them against the targets and mark dets with "reid" / "locked"."""
+        ts = time.time() if ts is None else ts
+        people = [d for d in dets if d.get("id") is not None and "xyxy" in d
+                  and (d.get("name") or d.get("cls")) in self.classes]
+        picked = None
+        with self._lock:
+            self._last_dets = people
+            self.gallery.expire(ts)
+            self.targets.expire(ts)
+            if self.enabled and self.track is None and not self.targets.n and people:
+                # lock() came before anyone was in view: take the most confident person now
+                self.track = picked = int(max(people, key=lambda d: d.get("conf", 0.0))["id"])
+            due = [d for d in people if ts - self._last_embed.get(d["id"], -1e18) >= self.every_s]
+            crops = crop_boxes(frame, np.array([d["xyxy"] for d in due], np.float32)) if due else []
+            due = [d for d, c in zip(due, crops) if c is not None]
+            crops = [c for c in crops if c is not None]
+        if crops:
+            t0 = time.time()
+            vecs = self.embedder.embed(crops)
+            ms = (time.time() - t0) * 1000.0
+            self._embed_ms = 0.9*self._embed_ms + 0.1*ms if self._embed_ms > 0 else ms
+        with self._lock:
+            if crops:
+                ids = [int(d["id"]) for d in due]
+                self.gallery.add(vecs, ids, ts)
+                for i in ids:
+                    self._last_embed[i] = ts
+                if self.enabled and self.track in ids:
+                    self.targets.add(vecs[ids.index(self.track)], [self.track], ts)
+                if self.targets.n:
+                    for i, s in zip(ids, self.targets.best(vecs).tolist()):
+                        self._scores[i] = s
+            live = {int(d["id"]) for d in people}
+            for stale in [i for i in self._last_embed if i not in live]:
+                if ts - self._last_embed[stale] > self.gallery.ttl_s:
+                    del self._last_embed[stale]
+                    self._scores.pop(stale, None)
+            moved, lost = False, self.track
+            if self.enabled and self.track not in live:
+                cand = [(self._scores.get(i, -1.0), i) for i in live if i in self._scores]
+                if cand:
+                    score, best = max(cand)
+                    if score >= self.threshold:
+                        self.track, moved = best, True
+                        self.reacquired += 1
+            track = self.track if self.enabled else None
+            scores = dict(self._scores) if self.enabled else {}
+        if picked is not None:
+            self._event("suspect_lock", track=picked)
+        if moved:
+            logger.info(f"suspect lock: track {lost} -> {track} (score {scores.get(track, 0):.2f})")
+            self._event("suspect_reacquire", previous=lost, track=track, score=round(scores.get(track, 0.0), 3))
+        for d in people:
+            s = scores.get(int(d["id"]))
+            if s is not None:
+                d["reid"] = round(s, 3)
+            if track is not None and int(d["id"]) == track:
+                d["locked"] = True
+        return dets
+
+    def candidates(self, k: int = 5) -> List[Dict]:
+        """Tracks seen within the TTL that look most like the targets."""
+        with self._lock:
+            if not self.targets.n:
+                return []
+            return self.gallery.search(self.targets.rows(), k)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {"enabled": self.enabled, "track": self.track, "embedder": self.embedder.name,
+                    "threshold": self.threshold, "embed_ms": round(self._embed_ms, 2),
+                    "reacquired": self.reacquired, "gallery": self.gallery.stats(),
+                    "targets": self.targets.n}
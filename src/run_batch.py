@@ -0,0 +1,364 @@
+"""
+Offline batch mode for recorded flights.
+
+    python -m src.run_batch data/samples --out out/batch --workers 4
+
+Each video is cut into ~--segment-s second segments at its own keyframes
+(listed with ffprobe when it is installed, otherwise evenly spaced), and
+the segments are processed on a process pool with the live pipeline's
+stages: keyframe-scheduled detector, IoU tracker, face blur, annotation and
+georeferencing. Every segment also re-processes the --overlap frames before
+its start; the tracks seen there are matched against the previous
+segment's output to stitch track IDs across the boundary.
+
+Per video this writes <out>/<name>/detections.jsonl (one line per frame),
+tracks.json and run.json (timings). detections.jsonl and tracks.json depend
+only on the input and the options, never on --workers or timing, so a
+directory of them doubles as a regression corpus.
+"""
+import argparse
+import glob
+import json
+import os
+import subprocess
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+
+import cv2
+import numpy as np
+from loguru import logger
+
+from src.detect.scheduler import KeyframeScheduler
+from src.detect.tiling import TiledDetector
+from src.detect.yolo_infer import YoloDetector
+from src.geo.approx_pos import dest_from_bearing
+from src.geo.dem import DemTiles
+from src.geo.georef import GeoReferencer
+from src.privacy.face_blur import PrivacyEngine
+from src.track.iou_tracker import IoUTracker, greedy_assign, iou_pairs
+from src.util.hud_ocr import HudReader
+
+VIDEO_EXTS = (".mp4", ".mov", ".mkv", ".avi", ".ts", ".m4v")
+
+
+# ---------- segment planning ----------
+def probe(path: str) -> Tuple[int, float]:
+    cap = cv2.VideoCapture(path)
+    try:
+        n = int(cap.get(cv2.CAP_PROP_FRAME_COUNT) or 0)
+        fps = float(cap.get(cv2.CAP_PROP_FPS) or 0.0)
+    finally:
+        cap.release()
+    return n, fps if 0 < fps < 1000 else 30.0
+
+
+def keyframe_indices(path: str, fps: float) -> List[int]:
+    """Frame indices of the video's keyframes (I-frames); [] without ffprobe."""
+    cmd = ["ffprobe", "-v", "error", "-select_streams", "v:0", "-skip_frame", "nokey",
+           "-show_entries", "frame=pts_time", "-of", "csv=p=0", path]
+    try:
+        out = subprocess.run(cmd, capture_output=True, text=True, timeout=120, check=True).stdout
+    except (OSError, subprocess.SubprocessError):
+        return []
+    idx = set()
+    for line in out.split():
+        try:
+            idx.add(int(round(float(line.strip(",")) * fps)))
+        except ValueError:
+            continue
+    return sorted(idx)
+
+
+def plan_segments(n_frames: int, fps: float, keyframes: List[int], segment_s: float) -> List[Tuple[int, int]]:
+    """[(start, end)) frame ranges of roughly segment_s, starting on keyframes when known."""
+    step = max(1, int(round(segment_s * fps)))
+    if n_frames <= step:
+        return [(0, max(n_frames, 1))]
+    cuts = [0]
+    keys = np.asarray([k for k in keyframes if 0 < k < n_frames], np.int64)
+    target = step
+    while target < n_frames - step // 2:
+        cut = target
+        if keys.size:
+            near = keys[(keys > cuts[-1] + step // 2) & (keys < n_frames - step // 2)]
+            if near.size:
+                cut = int(near[np.argmin(np.abs(near - target))])
+        if cut <= cuts[-1]:
+            break
+        cuts.append(cut)
+        target = cut + step
+    cuts.append(n_frames)
+    return list(zip(cuts[:-1], cuts[1:]))
+
+
+# ---------- worker ----------
+_W: Dict[str, Any] = {}
+
+
+def _init_worker(opts: Dict[str, Any]):
+    """Once per pool process: the model and geo lookups are the expensive parts."""
+    cv2.setNumThreads(1)
+    det = YoloDetector(onnx_path=opts["onnx"], conf=opts["conf"], threads=opts["threads"])
+    dem = None
+    if opts.get("dem"):
+        dem = DemTiles(opts["dem"])
+        dem.prefetch_along(opts["home_lat"], opts["home_lon"], 0.0, ahead_m=(0,))
+        key = (int(np.floor(opts["home_lat"])), int(np.floor(opts["home_lon"])))
+        t_end = time.time() + 10.0
+        while not dem.ready(key) and time.time() < t_end:
+            time.sleep(0.05)
+    geo = GeoReferencer(dem=dem)
+    geo.set_home(opts["home_lat"], opts["home_lon"])
+    _W.update(opts=opts, det=det, geo=geo)
+
+
+def _box(d: Dict) -> List[int]:
+    if "bbox" in d:
+        return [int(v) for v in d["bbox"]]
+    x1, y1, x2, y2 = (int(v) for v in d["xyxy"])
+    return [x1, y1, x2 - x1, y2 - y1]
+
+
+def _annotate(frame, dets: List[Dict], hud_text: str):
+    cv2.putText(frame, hud_text, (20, 40), cv2.FONT_HERSHEY_SIMPLEX, 1.0, (0, 255, 255), 2)
+    for d in dets:
+        x, y, w, h = d["bbox"]
+        cv2.rectangle(frame, (x, y), (x + w, y + h), (0, 255, 0), 2)
+        cv2.putText(frame, f"{d['cls']} {d['conf']:.2f}", (x, max(20, y - 8)),
+                    cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 255, 0), 2)
+
+
+def process_segment(job: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Frames [start - overlap, end) of one video -> per-frame records with
+    segment-local track ids; the first `warmup` records only serve stitching.
+    """
+    opts, det, geo = _W["opts"], _W["det"], _W["geo"]
+    path, start, end = job["path"], job["start"], job["end"]
+    first = max(0, start - opts["overlap"])
+    t0 = time.time()
+
+    detector = TiledDetector(det) if opts["tiles"] else det
+    trk = IoUTracker(iou_thr=0.3, ttl=15)
+    sched = KeyframeScheduler(max_interval=opts["keyframe_max"])
+    privacy = PrivacyEngine(block_full=True)   # small-face pass inline, like the HUD OCR
+    privacy.enabled = opts["blur"]
+    hud_reader = HudReader(block=True)   # inline OCR keeps the output independent of worker timing
+    D, H, pitch, heading = 0.0, opts["alt"], opts["pitch"], opts["heading"]
+
+    cap = cv2.VideoCapture(path)
+    if first:
+        cap.set(cv2.CAP_PROP_POS_FRAMES, first)
+    writer = None
+    records: List[Dict[str, Any]] = []
+    i = first
+    try:
+        while end is None or i < end:
+            ok, frame = cap.read()
+            if not ok:
+                break
+            hud = hud_reader.read(frame)
+            if hud.get("D") is not None: D = float(hud["D"])
+            if hud.get("H") is not None: H = float(hud["H"])
+            if hud.get("P") is not None: pitch = float(hud["P"])
+            lat, lon = dest_from_bearing(opts["home_lat"], opts["home_lon"], D, heading)
+
+            if sched.should_detect(frame, trk.confidence()):
+                if isinstance(detector, TiledDetector):
+                    detector.set_altitude(H)
+                tracked = trk.update(detector.infer(frame))
+                sched.note_confidence(trk.confidence())
+                key = True
+            else:
+                tracked = trk.coast()
+                key = False
+            dets = [{"id": int(d["id"]), "cls": d.get("cls") or d.get("name") or "obj",
+                     "conf": round(float(d.get("conf", 0.0)), 4), "bbox": _box(d)} for d in tracked]
+            pins = geo.locate([d["bbox"] for d in dets], frame.shape, lat, lon, H, heading, pitch,
+                              pos_err_m=max(5.0, 0.3 * D))
+            for d, pin in zip(dets, pins):
+                d["geo"] = {"lat": round(pin["lat"], 7), "lon": round(pin["lon"], 7), "err_m": pin["err_m"]}
+
+            if opts["video"] and i >= start:
+                privacy.apply(frame, key)
+                _annotate(frame, dets, f"D={D:.1f}m H={H:.1f}m Heading={heading:.1f}")
+                if writer is None:
+                    h, w = frame.shape[:2]
+                    writer = cv2.VideoWriter(job["video_out"], cv2.VideoWriter_fourcc(*"MJPG"),
+                                             job["fps"], (w, h))
+                writer.write(frame)
+
+            records.append({"frame": i, "t": round(i / job["fps"], 3), "keyframe": key,
+                            "telemetry": {"lat": round(lat, 7), "lon": round(lon, 7), "alt": H,
+                                          "heading": heading, "pitch": pitch},
+                            "detections": dets})
+            i += 1
+    finally:
+        cap.release()
+        if writer is not None:
+            writer.release()
+    return {"index": job["index"], "start": start, "end": i, "warmup": start - first,
+            "records": records, "seconds": time.time() - t0}
+
+
+# ---------- stitching ----------
+class TrackStitcher:
+    """
+    Maps segment-local track ids onto global ones. Over the overlap frames a
+    segment's local tracks are matched (same class, IoU >= iou_thr) against
+    the global tracks the previous segment emitted for the same frames;
+    each local id takes the global id it matched most often (one-to-one,
+    most votes first), everything else gets the next new global id in
+    order of first appearance.
+    """
+    def __init__(self, overlap: int, iou_thr: float = 0.5):
+        self.overlap = overlap
+        self.iou_thr = iou_thr
+        self.next_id = 1
+        self.tail: Dict[int, List[Dict]] = {}   # frame -> emitted (global-id) dets of the previous segment
+        self.tracks: Dict[int, Dict[str, Any]] = {}
+
+    def _votes(self, warm: List[Dict]) -> Dict[int, int]:
+        votes: Dict[Tuple[int, int], int] = {}
+        for rec in warm:
+            prev = self.tail.get(rec["frame"])
+            cur = rec["detections"]
+            if not prev or not cur:
+                continue
+            a = np.array([d["bbox"] for d in prev], np.float32)
+            b = np.array([d["bbox"] for d in cur], np.float32)
+            a[:, 2:] += a[:, :2]
+            b[:, 2:] += b[:, :2]
+            pi, ci, score = iou_pairs(a, b, self.iou_thr)
+            same = np.array([prev[p]["cls"] == cur[c]["cls"] for p, c in zip(pi.tolist(), ci.tolist())], bool)
+            if not same.size:
+                continue
+            pi, ci = greedy_assign(pi[same], ci[same], score[same])
+            for p, c in zip(pi.tolist(), ci.tolist()):
+                k = (cur[c]["id"], prev[p]["id"])
+                votes[k] = votes.get(k, 0) + 1
+        mapping: Dict[int, int] = {}
+        taken = set()
+        for (local, glob_id), _ in sorted(votes.items(), key=lambda kv: (-kv[1], kv[0])):
+            if local in mapping or glob_id in taken:
+                continue
+            mapping[local] = glob_id
+            taken.add(glob_id)
+        return mapping
+
+    def add(self, seg: Dict[str, Any]) -> List[Dict]:
+        """Global-id records for the segment's own frames (the overlap is dropped)."""
+        warm, own = seg["records"][:seg["warmup"]], seg["records"][seg["warmup"]:]
+        mapping = self._votes(warm)
+        for rec in own:
+            for d in rec["detections"]:
+                gid = mapping.get(d["id"])
+                if gid is None:
+                    gid = mapping[d["id"]] = self.next_id
+                    self.next_id += 1
+                d["id"] = gid
+                t = self.tracks.get(gid)
+                if t is None:
+                    self.tracks[gid] = {"id": gid, "cls": d["cls"], "first_frame": rec["frame"],
+                                        "last_frame": rec["frame"], "frames": 1, "max_conf": d["conf"]}
+                else:
+                    t["last_frame"] = rec["frame"]
+                    t["frames"] += 1
+                    t["max_conf"] = max(t["max_conf"], d["conf"])
+        self.tail = {rec["frame"]: rec["detections"] for rec in own[len(own) - self.overlap:]} if self.overlap else {}
+        return own
+
+
+# ---------- driver ----------
+def find_videos(inputs: List[str]) -> List[str]:
+    out = []
+    for p in inputs:
+        if os.path.isdir(p):
+            out += [f for f in glob.glob(os.path.join(p, "*")) if f.lower().endswith(VIDEO_EXTS)]
+        elif os.path.exists(p):
+            out.append(p)
+        else:
+            logger.warning(f"no such input: {p}")
+    return sorted(out)
+
+
+def run(args) -> int:
+    videos = find_videos(args.inputs)
+    if not videos:
+        logger.error("no videos found")
+        return 1
+    workers = args.workers or max(1, (os.cpu_count() or 2) - 1)
+    opts = {"onnx": args.onnx, "conf": args.conf, "threads": args.threads, "tiles": args.tiles,
+            "keyframe_max": args.keyframe_max, "blur": not args.no_blur, "video": args.video,
+            "overlap": args.overlap, "home_lat": args.home_lat, "home_lon": args.home_lon,
+            "alt": args.alt, "heading": args.heading, "pitch": args.pitch, "dem": args.dem}
+
+    plans = []
+    for path in videos:
+        n, fps = probe(path)
+        keys = keyframe_indices(path, fps)
+        segs = plan_segments(n, fps, keys, args.segment_s)
+        name = os.path.splitext(os.path.basename(path))[0]
+        out_dir = os.path.join(args.out, name)
+        os.makedirs(out_dir, exist_ok=True)
+        jobs = [{"path": path, "index": k, "start": s, "end": None if k == len(segs) - 1 else e, "fps": fps,
+                 "video_out": os.path.join(out_dir, f"annotated-{k:04d}.avi")}
+                for k, (s, e) in enumerate(segs)]
+        plans.append((path, name, out_dir, n, fps, len(keys), jobs))
+        logger.info(f"{name}: {n} frames @ {fps:.2f} fps, {len(keys)} keyframes -> {len(segs)} segments")
+
+    t0 = time.time()
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(opts,)) as pool:
+        # queue every segment of every video up front so the pool never idles between videos
+        futures = [(plan, [pool.submit(process_segment, job) for job in plan[-1]]) for plan in plans]
+        for (path, name, out_dir, n, fps, n_keys, jobs), futs in futures:
+            tv = time.time()
+            stitch = TrackStitcher(args.overlap)
+            frames, cpu_s = 0, 0.0
+            with open(os.path.join(out_dir, "detections.jsonl"), "w", encoding="utf-8") as f:
+                for fut in futs:
+                    seg = fut.result()
+                    cpu_s += seg["seconds"]
+                    for rec in stitch.add(seg):
+                        f.write(json.dumps(rec, sort_keys=True, separators=(",", ":")) + "\n")
+                        frames += 1
+            with open(os.path.join(out_dir, "tracks.json"), "w", encoding="utf-8") as f:
+                json.dump([stitch.tracks[k] for k in sorted(stitch.tracks)], f, indent=1, sort_keys=True)
+            wall = time.time() - tv
+            with open(os.path.join(out_dir, "run.json"), "w", encoding="utf-8") as f:
+                json.dump({"video": path, "frames": frames, "fps": fps, "keyframes": n_keys,
+                           "segments": [[j["start"], j["end"]] for j in jobs], "workers": workers,
+                           "segment_cpu_s": round(cpu_s, 2), "options": opts}, f, indent=1)
+            logger.info(f"{name}: {frames} frames, {len(stitch.tracks)} tracks "
+                        f"({frames / max(cpu_s, 1e-6):.1f} fps per worker, waited {wall:.1f}s)")
+    logger.info(f"batch done: {len(videos)} videos in {time.time() - t0:.1f}s with {workers} workers")
+    return 0
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    ap = argparse.ArgumentParser(description="Process recorded flights offline, in parallel.")
+    ap.add_argument("inputs", nargs="*", default=["data/samples"], help="video files or directories")
+    ap.add_argument("--out", default="out/batch")
+    ap.add_argument("--workers", type=int, default=0, help="pool size (default: CPUs - 1)")
+    ap.add_argument("--segment-s", type=float, default=30.0, help="target segment length in seconds")
+    ap.add_argument("--overlap", type=int, default=15, help="frames re-processed before each cut for stitching")
+    ap.add_argument("--onnx", default=os.environ.get("FORESIGHT_ONNX", "models/yolov8n.onnx"))
+    ap.add_argument("--conf", type=float, default=0.25)
+    ap.add_argument("--threads", type=int, default=1, help="ONNX Runtime threads per worker")
+    ap.add_argument("--tiles", action="store_true", help="sliced inference (as FORESIGHT_TILES=1)")
+    ap.add_argument("--keyframe-max", type=int, default=int(os.environ.get("FORESIGHT_KEYFRAME_MAX", 6)),
+                    help="max frames between detector runs (1 = every frame)")
+    ap.add_argument("--no-blur", action="store_true", help="skip face blur in annotated video")
+    ap.add_argument("--video", action="store_true", help="also write annotated, blurred video per segment")
+    ap.add_argument("--home-lat", type=float, default=14.5995)
+    ap.add_argument("--home-lon", type=float, default=120.9842)
+    ap.add_argument("--alt", type=float, default=30.0, help="height above home when the HUD has none")
+    ap.add_argument("--heading", type=float, default=0.0)
+    ap.add_argument("--pitch", type=float, default=-90.0)
+    ap.add_argument("--dem", default=None, help="DEM tile directory for terrain-aware georeferencing")
+    return run(ap.parse_args(argv))
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -1,47 +1,68 @@
-﻿import asyncio, json, time, cv2, requests
+﻿import asyncio, json, os, time, cv2
 import websockets
 from loguru import logger
 
 from src.ingest.capture_screen import ScreenCapture
+from src.ingest.frame_ring import FrameRing
 from src.util.hud_ocr import read_hud
 from src.geo.approx_pos import dest_from_bearing
+from src.geo.dem import DemTiles
+from src.geo.georef import GeoReferencer
 from src.detect.yolo_infer import YoloDetector
+from src.detect.tiling import TiledDetector
 from src.track.iou_tracker import IoUTracker
 
-WS_URL = "ws://localhost:8000/ws"
-PUSH_URL = "http://localhost:8000/push_frame"
+WS_URL = "ws://localhost:8000/ws?producer=1"  # send-only: ticks are fanned out by the server
 
 async def main():
     # Connect WS for telemetry/detections
     ws = await websockets.connect(WS_URL)
-    cap = ScreenCapture(title="DJI_MIRROR", target_fps=12)
-    det = YoloDetector(conf=0.25)
+    # grab on a background thread; repeated mirror frames never reach the detector
+    cap = ScreenCapture(title="DJI_MIRROR", target_fps=12, threaded=True, skip_duplicates=True)
+    det = YoloDetector(onnx_path=os.environ.get("FORESIGHT_ONNX", "models/yolov8n.onnx"), conf=0.25)
+    if os.environ.get("FORESIGHT_TILES", "0") != "0":
+        det = TiledDetector(det)  # same infer() contract, tile grid follows altitude H
     trk = IoUTracker()
+    # annotated frames go to the server through shared memory (served at /mjpg)
+    ring = FrameRing()
 
     # Day-1 defaults
     home_lat, home_lon = 14.5995, 120.9842  # Manila
     heading_deg = 0.0
+    # camera_calib.yaml intrinsics; DEM tiles under FORESIGHT_DEM (data/dem) if present
+    geo = GeoReferencer(dem=DemTiles.from_env())
+    geo.set_home(home_lat, home_lon)
+    pitch_deg = geo.pitch_deg
     D = 0.0; H = 30.0
 
     t0 = time.time()
     while True:
         ok, frame = cap.read()
-        if not ok: break
+        if not ok:
+            # skip_duplicates: a still mirror (hovering drone) times out with no new frame
+            if cap.closed:
+                break
+            await asyncio.sleep(0)
+            continue
+        t_frame = cap.last_ts
 
-        # HUD OCR (stub): returns None, we keep defaults
         hud = read_hud(frame)
         if hud.get("D") is not None: D = float(hud["D"])
         if hud.get("H") is not None: H = float(hud["H"])
+        if hud.get("P") is not None: pitch_deg = float(hud["P"])
 
         # Approximate drone position (home + distance along heading)
         drone_lat, drone_lon = dest_from_bearing(home_lat, home_lon, float(D), heading_deg)
 
-        # Detect + track (stub)
+        # Detect + track
+        if isinstance(det, TiledDetector):
+            det.set_altitude(H)
         dets = det.infer(frame)
         dets_tr = trk.update(dets)
 
-        # Annotate frame for big video
-        vis = frame.copy()
+        # Annotate straight into the next ring slot (this is the only copy of the frame)
+        vis = ring.reserve(frame.shape)
+        vis[:] = frame
         cv2.putText(vis, f"D={D:.1f}m H={H:.1f}m Heading={heading_deg:.1f}",
                     (20, 40), cv2.FONT_HERSHEY_SIMPLEX, 1.0, (0,255,255), 2)
         for d in dets_tr:
@@ -49,32 +70,30 @@ async def main():
             cv2.rectangle(vis, (x,y), (x+w,y+h), (0,255,0), 2)
             cv2.putText(vis, f"{d['cls']} {d['conf']:.2f}", (x, y-8),
                         cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0,255,0), 2)
+        ring.commit(t_frame)
 
-        # Push frame (JPEG) to server for /mjpg
-        ok, buf = cv2.imencode(".jpg", vis, [int(cv2.IMWRITE_JPEG_QUALITY), 80])
-        if ok:
-            try:
-                requests.post(PUSH_URL, data=buf.tobytes(), headers={"Content-Type":"image/jpeg"}, timeout=1.0)
-            except Exception as e:
-                logger.warning(f"push_frame failed: {e}")
-
-        # Prepare detections for map pins (for Day-1, pin at drone pos)
+        # Project every footpoint to the ground in one batch; the drone position
+        # itself is only known to ~30% of D (home + distance along heading)
+        pins = geo.locate([d["bbox"] for d in dets_tr], frame.shape, drone_lat, drone_lon, H,
+                          heading_deg, pitch_deg, pos_err_m=max(5.0, 0.3*D))
         dets_out = []
-        for d in dets_tr:
+        for d, pin in zip(dets_tr, pins):
             dets_out.append({
                 "id": d["id"],
                 "cls": d["cls"],
                 "conf": d["conf"],
                 "bbox": [d["bbox"][0]/frame.shape[1], d["bbox"][1]/frame.shape[0],
                          d["bbox"][2]/frame.shape[1], d["bbox"][3]/frame.shape[0]],
-                "geo": {"lat": drone_lat, "lon": drone_lon, "err_m": max(10.0, 0.3*D + 0.2*H)}
+                "geo": pin
             })
 
         payload = {
             "type":"tick",
+            "ts": t_frame,  # capture time, for frame age at send (/metrics)
             "time": round(time.time()-t0,2),
             "telemetry": {"lat": drone_lat, "lon": drone_lon, "alt": H},
-            "detections": dets_out
+            "detections": dets_out,
+            "capture": cap.stats()
         }
         try:
             await ws.send(json.dumps(payload))
@@ -86,6 +105,7 @@ async def main():
             break
 
     cap.release()
+    ring.close()
     try:
         await ws.close()
     except:
@@ -1,11 +1,242 @@
-﻿import itertools
+﻿from typing import Dict, List, Optional
+import numpy as np
+
+try:
+    from scipy.optimize import linear_sum_assignment
+except Exception:
+    linear_sum_assignment = None
+
+
+def iou_matrix(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """IoU of every xyxy box in a (N,4) against every box in b (M,4) -> (N,M)."""
+    if a.size == 0 or b.size == 0:
+        return np.zeros((a.shape[0], b.shape[0]), dtype=np.float32)
+    ix1 = np.maximum(a[:, None, 0], b[None, :, 0])
+    iy1 = np.maximum(a[:, None, 1], b[None, :, 1])
+    ix2 = np.minimum(a[:, None, 2], b[None, :, 2])
+    iy2 = np.minimum(a[:, None, 3], b[None, :, 3])
+    inter = np.maximum(ix2 - ix1, 0) * np.maximum(iy2 - iy1, 0)
+    area_a = (a[:, 2] - a[:, 0]) * (a[:, 3] - a[:, 1])
+    area_b = (b[:, 2] - b[:, 0]) * (b[:, 3] - b[:, 1])
+    return inter / (area_a[:, None] + area_b[None, :] - inter + 1e-9)
+
+
+def iou_pairs(a: np.ndarray, b: np.ndarray, thr: float):
+    """
+    Sparse version of iou_matrix: (i, j, iou) for pairs with iou >= thr.
+
+    Candidates come from a sort-and-sweep on x (a boxes sorted by x1, each b
+    box selects the a range that can overlap it), so with hundreds of small,
+    spread-out boxes only a handful of pairs per box are ever scored.
+    """
+    empty = np.empty(0, np.int64)
+    if a.size == 0 or b.size == 0:
+        return empty, empty, np.empty(0, np.float32)
+    # iou >= thr needs an x-overlap of at least thr * width of either box,
+    # which bounds where a.x1 can sit relative to each b box
+    order = np.argsort(a[:, 0], kind="stable")
+    ax1 = np.take(a[:, 0], order)
+    wmax = float((a[:, 2] - a[:, 0]).max())
+    bw = b[:, 2] - b[:, 0]
+    lo = np.searchsorted(ax1, b[:, 0] - (1.0 - thr) * wmax, side="left")
+    hi = np.searchsorted(ax1, b[:, 2] - thr * bw, side="right")
+    cnt = np.maximum(hi - lo, 0)
+    total = int(cnt.sum())
+    if total == 0:
+        return empty, empty, np.empty(0, np.float32)
+    j = np.repeat(np.arange(b.shape[0]), cnt)
+    k = np.arange(total) + np.repeat(lo - (np.cumsum(cnt) - cnt), cnt)
+    i = np.take(order, k)
+
+    # np.take is much cheaper than fancy indexing for these row gathers
+    A, B = np.take(a, i, axis=0), np.take(b, j, axis=0)
+    w = np.minimum(A[:, 2], B[:, 2]) - np.maximum(A[:, 0], B[:, 0])
+    h = np.minimum(A[:, 3], B[:, 3]) - np.maximum(A[:, 1], B[:, 1])
+    inter = np.maximum(w, 0) * np.maximum(h, 0)
+    area_a = (A[:, 2] - A[:, 0]) * (A[:, 3] - A[:, 1])
+    area_b = (B[:, 2] - B[:, 0]) * (B[:, 3] - B[:, 1])
+    iou = inter / (area_a + area_b - inter + 1e-9)
+    ok = np.flatnonzero(iou >= thr)
+    return np.take(i, ok), np.take(j, ok), np.take(iou, ok)
+
+
+def greedy_assign(rows: np.ndarray, cols: np.ndarray, score: np.ndarray):
+    """
+    Highest-score-first matching over candidate pairs; returns (rows, cols).
+
+    Same result as the sequential greedy loop, done in rounds: a pair that is
+    the best remaining one for both its row and its column is always taken.
+    """
+    order = np.argsort(-score, kind="stable")
+    rows, cols = rows[order], cols[order]
+    out_r, out_c = [], []
+    while rows.size:
+        first = np.zeros(rows.size, bool)
+        first[np.unique(rows, return_index=True)[1]] = True
+        first_c = np.zeros(rows.size, bool)
+        first_c[np.unique(cols, return_index=True)[1]] = True
+        take = first & first_c
+        if take.all():  # common case: no conflicts left
+            out_r.append(rows)
+            out_c.append(cols)
+            break
+        tr, tc = rows[take], cols[take]
+        out_r.append(tr)
+        out_c.append(tc)
+        rest = ~(np.isin(rows, tr) | np.isin(cols, tc))
+        rows, cols = rows[rest], cols[rest]
+    if not out_r:
+        return rows, cols
+    return np.concatenate(out_r), np.concatenate(out_c)
+
+
 class IoUTracker:
-    def __init__(self, iou_thr=0.3, ttl=15):
-        self.next_id = itertools.count(1)
-    def update(self, dets):
-        out=[]
-        for d in dets:
-            d = dict(d)
-            d["id"] = next(self.next_id)
-            out.append(d)
+    """
+    IoU tracker with constant-velocity prediction.
+
+    Live tracks are kept compactly in the first `n` rows of fixed arrays
+    (box, velocity, id, age, hits, conf, class), so predict/match/age-out are
+    whole-array NumPy ops. Each update predicts every track forward, matches
+    detections of the same class on the IoU matrix (Hungarian if scipy is
+    installed and assign="hungarian", greedy otherwise), refreshes matched
+    tracks, spawns new ones and drops tracks unseen for more than `ttl` frames.
+
+    Detections may carry "xyxy" or "bbox" ([x, y, w, h]); the returned dicts
+    are copies of the matched detections with an "id" added.
+    """
+    def __init__(self, iou_thr=0.3, ttl=15, capacity=256, assign="greedy", vel_alpha=0.5):
+        self.iou_thr = float(iou_thr)
+        self.ttl = int(ttl)
+        self.assign = assign
+        self.vel_alpha = float(vel_alpha)
+        self.n = 0
+        self._next_id = 1
+        self._cls_codes: Dict[str, int] = {}
+        self._alloc(capacity)
+
+    def _alloc(self, capacity: int):
+        old = self.__dict__.get("_box")
+        n = self.n
+        box = np.zeros((capacity, 4), np.float32)
+        vel = np.zeros((capacity, 4), np.float32)
+        ids = np.zeros(capacity, np.int64)
+        age = np.zeros(capacity, np.int32)    # frames since last matched
+        hits = np.zeros(capacity, np.int32)
+        conf = np.zeros(capacity, np.float32)
+        cls = np.zeros(capacity, np.int32)
+        if old is not None and n:
+            box[:n], vel[:n], ids[:n] = self._box[:n], self._vel[:n], self._ids[:n]
+            age[:n], hits[:n], conf[:n], cls[:n] = self._age[:n], self._hits[:n], self._conf[:n], self._cls[:n]
+        self._box, self._vel, self._ids = box, vel, ids
+        self._age, self._hits, self._conf, self._cls = age, hits, conf, cls
+
+    def _cls_code(self, name: str) -> int:
+        code = self._cls_codes.get(name)
+        if code is None:
+            code = self._cls_codes[name] = len(self._cls_codes)
+        return code
+
+    @staticmethod
+    def _as_xyxy(dets: List[Dict]) -> np.ndarray:
+        if not dets:
+            return np.empty((0, 4), np.float32)
+        if "xyxy" in dets[0]:
+            return np.array([d["xyxy"] for d in dets], np.float32).reshape(-1, 4)
+        out = np.array([d["bbox"] for d in dets], np.float32).reshape(-1, 4)
+        out[:, 2:] += out[:, :2]
+        return out
+
+    # ---------- public API ----------
+    def predicted(self) -> np.ndarray:
+        """Predicted xyxy boxes of live tracks for the current frame (n,4)."""
+        n = self.n
+        return self._box[:n] + self._vel[:n] * self._age[:n, None]
+
+    def update(self, dets: List[Dict]) -> List[Dict]:
+        n, m = self.n, len(dets)
+        self._age[:n] += 1
+        det_box = self._as_xyxy(dets)
+        codes = self._cls_codes
+        names = [d.get("cls") or d.get("name") or "obj" for d in dets]
+        det_cls = np.array([codes[c] if c in codes else self._cls_code(c) for c in names], np.int32)
+        det_conf = np.array([d.get("conf", 0.0) for d in dets], np.float32)
+
+        # match predicted tracks against detections of the same class
+        ti, di, score = iou_pairs(self.predicted(), det_box, self.iou_thr)
+        same = self._cls[ti] == det_cls[di]
+        ti, di, score = ti[same], di[same], score[same]
+        if self.assign == "hungarian" and linear_sum_assignment is not None and ti.size:
+            dense = np.zeros((n, m), np.float32)
+            dense[ti, di] = score
+            ti, di = linear_sum_assignment(-dense)
+            ok = dense[ti, di] >= self.iou_thr
+            ti, di = ti[ok], di[ok]
+        else:
+            ti, di = greedy_assign(ti, di, score)
+
+        # refresh matched tracks: measured velocity over the frames since last hit
+        if ti.size:
+            meas_v = (det_box[di] - self._box[ti]) / self._age[ti, None]
+            first = (self._hits[ti] == 1)[:, None]
+            a = self.vel_alpha
+            self._vel[ti] = np.where(first, meas_v, a * meas_v + (1 - a) * self._vel[ti])
+            self._box[ti] = det_box[di]
+            self._age[ti] = 0
+            self._hits[ti] += 1
+            self._conf[ti] = 0.5 * self._conf[ti] + 0.5 * det_conf[di]
+
+        # age out (compact live rows to the front)
+        alive = self._age[:n] <= self.ttl
+        det_track = np.full(m, -1, np.int64)
+        det_track[di] = self._ids[ti]
+        if not alive.all():
+            k = int(alive.sum())
+            for arr in (self._box, self._vel, self._ids, self._age, self._hits, self._conf, self._cls):
+                arr[:k] = arr[:n][alive]
+            n = self.n = k
+
+        # spawn tracks for unmatched detections
+        new = np.flatnonzero(det_track < 0)
+        if new.size:
+            if n + new.size > self._box.shape[0]:
+                self._alloc(max(2 * self._box.shape[0], n + new.size))
+            sl = slice(n, n + new.size)
+            ids = np.arange(self._next_id, self._next_id + new.size)
+            self._next_id += new.size
+            self._box[sl] = det_box[new]
+            self._vel[sl] = 0.0
+            self._ids[sl] = ids
+            self._age[sl] = 0
+            self._hits[sl] = 1
+            self._conf[sl] = det_conf[new]
+            self._cls[sl] = det_cls[new]
+            det_track[new] = ids
+            self.n = n + new.size
+
+        return [{**d, "id": tid} for d, tid in zip(dets, det_track.tolist())]
+
+    def confidence(self, decay: float = 0.97) -> float:
+        """Mean track confidence, decayed by frames each track has coasted; 0.0 with no tracks."""
+        n = self.n
+        if n == 0:
+            return 0.0
+        return float((self._conf[:n] * np.power(decay, self._age[:n])).mean())
+
+    def coast(self, max_age: Optional[int] = None) -> List[Dict]:
+        """Advance one frame without detections; returns the predicted live tracks (see tracks())."""
+        self.update([])
+        return self.tracks(max_age)
+
+    def tracks(self, max_age: Optional[int] = None) -> List[Dict]:
+        """Live tracks as dicts (predicted xyxy), optionally only those seen within max_age frames."""
+        n = self.n
+        box = self.predicted()
+        names = {v: k for k, v in self._cls_codes.items()}
+        out = []
+        for i in range(n):
+            if max_age is not None and self._age[i] > max_age:
+                continue
+            out.append({"id": int(self._ids[i]), "name": names.get(int(self._cls[i]), "obj"),
+                        "conf": float(self._conf[i]), "xyxy": box[i].astype(int).tolist(),
+                        "age": int(self._age[i]), "hits": int(self._hits[i])})
         return out
@@ -1,10 +1,10 @@
 from fastapi import FastAPI, Request
 from fastapi.responses import JSONResponse, StreamingResponse
 import cv2
-import numpy as np
-import mss
-import pytesseract
+import os
 import loguru
+from src.backend.services.ocr_jobs import OcrBusy, OcrJobs, job_view
+from src.ingest.video_source import SharedSources
 
 app = FastAPI()
 logger = loguru.logger
@@ -15,6 +15,27 @@ state = {
     "home": {"lat": 6.1164, "lon": 125.1716}  # Default: General Santos City
 }
 
+# one long-lived handle per device, OCR on a bounded pool (poll /ocr/jobs/<id> when slow)
+CAMERA_URL = os.environ.get("FORESIGHT_CAMERA", "0")
+sources = SharedSources.from_env()
+ocr_jobs = OcrJobs.from_env()
+
+
+def _ocr_frame(url: str, kind: str, text_key: str, wait: float):
+    ok, frame, ts = sources.latest(url, timeout=2.0)
+    if not ok:
+        return JSONResponse(status_code=503, content={"error": f"{kind} not available"})
+    try:
+        job = ocr_jobs.submit(frame, kind=kind, frame_ts=ts)
+    except OcrBusy as e:
+        return JSONResponse(status_code=503, content={"error": str(e)})
+    job = ocr_jobs.wait(job["id"], wait) or job
+    body = job_view(job, text_key)
+    if job["status"] == "error":
+        logger.error(f"{kind} OCR error: {job['error']}")
+        return JSONResponse(status_code=500, content=body)
+    return body if job["status"] == "done" else JSONResponse(status_code=202, content=body)
+
 # ✅ Root check
 @app.get("/")
 def root():
@@ -23,34 +44,23 @@ def root():
 
 # ✅ Screenshot OCR
 @app.get("/capture")
-def capture_screen():
-    try:
-        with mss.mss() as sct:
-            monitor = sct.monitors[1]
-            screenshot = np.array(sct.grab(monitor))
-        gray = cv2.cvtColor(screenshot, cv2.COLOR_BGRA2GRAY)
-        text = pytesseract.image_to_string(gray)
-        return {"captured_text": text.strip()}
-    except Exception as e:
-        logger.error(f"Capture error: {e}")
-        return JSONResponse(status_code=500, content={"error": str(e)})
+def capture_screen(wait: float = 5.0):
+    return _ocr_frame("desktop", "screen", "captured_text", wait)
 
 
 # ✅ Camera OCR
 @app.get("/camera")
-def capture_camera():
-    try:
-        cap = cv2.VideoCapture(0)
-        ret, frame = cap.read()
-        cap.release()
-        if not ret:
-            return JSONResponse(status_code=500, content={"error": "Camera not available"})
-        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-        text = pytesseract.image_to_string(gray)
-        return {"camera_text": text.strip()}
-    except Exception as e:
-        logger.error(f"Camera error: {e}")
-        return JSONResponse(status_code=500, content={"error": str(e)})
+def capture_camera(wait: float = 5.0):
+    return _ocr_frame(CAMERA_URL, "camera", "camera_text", wait)
+
+
+# ✅ OCR job status
+@app.get("/ocr/jobs/{job_id}")
+def ocr_job(job_id: str, wait: float = 0.0):
+    job = ocr_jobs.wait(job_id, wait) if wait > 0 else ocr_jobs.get(job_id)
+    if job is None:
+        return JSONResponse(status_code=404, content={"error": "unknown job"})
+    return job_view(job, "captured_text" if job["kind"] == "screen" else "camera_text")
 
 
 # ✅ Geolocation (pulled from state)
@@ -3,6 +3,8 @@
   const canvas = document.getElementById("videoCanvas");
   const ctx = canvas.getContext("2d");
   let ws = null, pullTimer = null;
+  const tracks = new Map();
+  window.sarTracks = tracks;
 
   function log(msg) {
     const t = new Date().toLocaleTimeString();
@@ -56,12 +58,17 @@
   const _start = window.handleStart;
   window.handleStart = async function() {
     try { await fetch("/api/pipeline/start", {method: "POST"}); } catch {}
+    tracks.clear();
     ws = new WebSocket(`ws://${location.host}/ws/sar`);
     ws.onopen = () => log("WS connected (/ws/sar)");
     ws.onmessage = (ev) => {
       const msg = JSON.parse(ev.data);
       if (msg.type === "stats") {
         log(`fps=${msg.fps} lat=${msg.latency}ms det=${(msg.detections||[]).length} mode=${msg.mode} blur=${msg.blur}`);
+      } else if (msg.type === "detections") {
+        // deltas keyed by track id; tracks holds the live set
+        for (const d of msg.added.concat(msg.updated)) tracks.set(d.id, d);
+        for (const id of msg.removed) tracks.delete(id);
       }
     };
     ws.onclose = () => log("WS closed");
@@ -1,45 +1,41 @@
+from contextlib import asynccontextmanager
+
+from typing import Optional
+
 from fastapi import FastAPI, WebSocket
 from fastapi.middleware.cors import CORSMiddleware
-import asyncio, json, time
-from typing import List
+from fastapi.responses import JSONResponse, PlainTextResponse, Response, StreamingResponse
+import asyncio, json, os, threading, time
 
-app = FastAPI()
-app.add_middleware(CORSMiddleware, allow_origins=["*"], allow_credentials=True,
-                   allow_methods=["*"], allow_headers=["*"])
+from ..backend.services.broadcast import FrameHub, LazyProducer
+from ..backend.services.metrics import PromText
+from ..geo.pin_store import PinStore
+from ..ingest.frame_ring import RingReader
+from .ws_hub import WsHub
 
-clients: List[WebSocket] = []
+HUB = WsHub(queue_size=int(os.environ.get("FORESIGHT_WS_QUEUE", "16")))
+# every geo-tagged detection merged into map pins (by track id, then proximity)
+PINS = PinStore()
 
-@app.websocket("/ws")
-async def ws_endpoint(ws: WebSocket):
-    await ws.accept()
-    clients.append(ws)
-    try:
-        while True:
-            # keep alive receive (optional)
-            await asyncio.sleep(0.1)
-    except Exception:
-        pass
-    finally:
-        clients.remove(ws)
-
-async def broadcast(obj):
-    dead = []
-    for c in clients:
-        try:
-            await c.send_text(json.dumps(obj))
-        except Exception:
-            dead.append(c)
-    for d in dead:
-        if d in clients: 
-            clients.remove(d)
+# annotated frames arrive from run_screen_pipeline through shared memory;
+# the ring is only read (and JPEG-encoded) while someone is watching
+RING = RingReader()
+FRAMES = FrameHub(quality=80)
+RING_PRODUCER = LazyProducer(FRAMES, RING.frames, fps=60)
+_snap_seq = 0
+_snap_lock = threading.Lock()
+# FORESIGHT_DEMO=1: fake ticks for UI work without a producer; never merged into PINS
+DEMO = os.environ.get("FORESIGHT_DEMO", "0") != "0"
+_producer_seen = False
 
 # Demo publisher loop (launch with uvicorn below)
 async def demo_stream():
     t0 = time.time()
-    while True:
+    while not _producer_seen:  # a real producer takes over
         t = time.time() - t0
         payload = {
             "type": "tick",
+            "ts": time.time(),
             "time": round(t, 2),
             "telemetry": { "lat": 14.5995, "lon": 120.9842, "alt": 30 + 2.0 },
             "detections": [
@@ -47,12 +43,118 @@ async def demo_stream():
                   "bbox": [0.4,0.3,0.2,0.35], "geo": {"lat":14.5996,"lon":120.9843, "err_m": 8.5} }
             ]
         }
-        await broadcast(payload)
+        HUB.publish(payload)
         await asyncio.sleep(0.5)
 
-@app.middleware("lifespan")
+@asynccontextmanager
 async def lifespan(app: FastAPI):
-    task = asyncio.create_task(demo_stream())
+    task = asyncio.create_task(demo_stream()) if DEMO else None
     yield
-    task.cancel()
-    
+    if task is not None:
+        task.cancel()
+
+app = FastAPI(lifespan=lifespan)
+app.add_middleware(CORSMiddleware, allow_origins=["*"], allow_credentials=True,
+                   allow_methods=["*"], allow_headers=["*"])
+
+def ingest_tick(msg: dict):
+    """Fan a tick out to dashboards, merge its detections, push the pins that changed."""
+    HUB.publish(msg)
+    if PINS.ingest_tick(msg):
+        changed = PINS.drain_changes()
+        if changed:
+            HUB.publish({"type": "pins", "version": PINS.version, "pins": changed})
+
+async def _on_producer_message(text: str):
+    try:
+        msg = json.loads(text)
+    except ValueError:
+        return
+    if isinstance(msg, dict) and msg.get("type") == "tick":
+        ingest_tick(msg)
+
+@app.websocket("/ws")
+async def ws_endpoint(ws: WebSocket, binary: int = 0, producer: int = 0):
+    # ?binary=1 receives "tick" messages packed with ws_hub.encode_tick;
+    # ?producer=1 is the capture pipeline: it only sends, so it gets no queue
+    global _producer_seen
+    await ws.accept()
+    if producer:
+        _producer_seen = True
+        try:
+            while True:
+                msg = await ws.receive()
+                if msg.get("type") == "websocket.disconnect":
+                    break
+                if msg.get("text") is not None:
+                    await _on_producer_message(msg["text"])
+        except Exception:
+            pass
+        return
+    await HUB.serve(ws, binary=bool(binary))
+
+@app.get("/api/detections")
+def api_detections(bbox: Optional[str] = None, since: Optional[float] = None, limit: Optional[int] = None):
+    """Merged pins; bbox=minLon,minLat,maxLon,maxLat and since=<unix ts> are both optional."""
+    box = None
+    if bbox:
+        try:
+            box = tuple(float(v) for v in bbox.split(","))
+        except ValueError:
+            box = ()
+        if len(box) != 4:
+            return JSONResponse(status_code=400, content={"error": "bbox must be minLon,minLat,maxLon,maxLat"})
+    return {"version": PINS.version, "pins": PINS.query(box, since, limit)}
+
+@app.get("/ws/stats")
+def ws_stats():
+    return {**HUB.stats(), "ring": RING.stats(), "stream": FRAMES.stats(), "pins": PINS.stats()}
+
+@app.get("/metrics")
+def metrics():
+    """Prometheus text: frame age when handed to MJPEG / WebSocket clients, plus drop counters."""
+    out = PromText()
+    out.histogram("latency_seconds", "Frame age (capture ts -> send).", FRAMES.send_age, stage="mjpeg_age")
+    out.histogram("latency_seconds", "Frame age (capture ts -> send).", HUB.send_age, stage="ws_age")
+    hub, stream = HUB.stats(), FRAMES.stats()
+    out.counter("ws_messages_dropped", "Messages dropped from full client queues.", hub["drops"])
+    out.counter("ws_clients_kicked", "Clients disconnected for falling behind.", hub["kicked"])
+    out.counter("mjpeg_frames_skipped", "Frames MJPEG clients skipped to stay current.", stream["drops"])
+    out.gauge("ws_clients", "Connected dashboard sockets.", hub["clients"])
+    out.gauge("mjpeg_clients", "Open MJPEG streams.", stream["subscribers"])
+    return PlainTextResponse(out.render(), media_type="text/plain; version=0.0.4")
+
+@app.get("/mjpg")
+def mjpg(fps: Optional[float] = None, size: str = "full"):
+    if size not in FRAMES.rungs:
+        return JSONResponse(status_code=400, content={"error": f"size must be one of {FRAMES.rungs}"})
+    RING_PRODUCER.ensure_running()
+    return StreamingResponse(FRAMES.stream(max_fps=fps, rung=size),
+                             media_type="multipart/x-mixed-replace; boundary=frame")
+
+@app.get("/frame.jpg")
+def frame_jpg(size: str = "full"):
+    if size not in FRAMES.rungs:
+        return JSONResponse(status_code=400, content={"error": f"size must be one of {FRAMES.rungs}"})
+    global _snap_seq
+    with _snap_lock:
+        if RING.seq != _snap_seq:  # encode each ring frame at most once for pollers
+            # a copy: FrameHub keeps the frame to encode other rungs later, after the
+            # writer may have lapped the ring, and a view would pin the shared block
+            got = RING.latest(copy=True)
+            if got is None:
+                return Response(status_code=204)
+            seq, ts, frame = got
+            _snap_seq = seq
+            if isinstance(frame, bytes):
+                FRAMES.publish_jpeg(frame, ts)
+            else:
+                FRAMES.publish(frame, ts)
+    jpeg = FRAMES.snapshot(size)
+    if jpeg is None:
+        return Response(status_code=204)
+    return Response(jpeg, media_type="image/jpeg")
+
+async def broadcast(obj):
+    # encoded once, queued per client; never waits on a slow socket
+    HUB.publish(obj)
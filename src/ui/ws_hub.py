@@ -0,0 +1,230 @@
+"""Serialize-once WebSocket fan-out.
+
+Every published message is encoded a single time (JSON text, plus a compact
+binary form for "tick" messages when any client asked for it) and the shared
+payload is pushed onto each client's bounded queue. Each client has its own
+sender task, so a stalled dashboard only ever backs up its own queue: the
+oldest pending message is dropped, and a client that stays full for longer
+than ``max_behind_s`` is disconnected. Messages that carry a capture
+timestamp (``"ts"``) have their age at send time recorded in ``send_age``.
+"""
+import asyncio
+import json
+import struct
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from loguru import logger
+
+from ..backend.services.metrics import LatencyHistogram
+
+# ---------- compact binary tick encoding ----------
+# header: magic, version, kind, time, lat, lon, alt, n_detections
+# detection: id, conf, bbox (4, normalized), lat, lon, err_m, len(cls), cls
+TICK_MAGIC = b"FT"
+TICK_VERSION = 1
+KIND_TICK = 1
+_HDR = struct.Struct("<2sBBdddfH")
+_DET = struct.Struct("<If4fddfB")
+
+
+def _num(v, default=float("nan")) -> float:
+    return default if v is None else float(v)
+
+
+def encode_tick(obj: Dict[str, Any]) -> Optional[bytes]:
+    """Pack a tick message; returns None if it does not fit the layout."""
+    try:
+        tel = obj.get("telemetry") or {}
+        dets = obj.get("detections") or []
+        parts = [_HDR.pack(TICK_MAGIC, TICK_VERSION, KIND_TICK,
+                           _num(obj.get("time"), 0.0), _num(tel.get("lat")),
+                           _num(tel.get("lon")), _num(tel.get("alt")), len(dets))]
+        for d in dets:
+            geo = d.get("geo") or {}
+            cls = str(d.get("cls", "")).encode("utf-8")[:255]
+            x, y, w, h = d.get("bbox") or (0.0, 0.0, 0.0, 0.0)
+            parts.append(_DET.pack(int(d.get("id") or 0) & 0xFFFFFFFF,
+                                   _num(d.get("conf"), 0.0), x, y, w, h,
+                                   _num(geo.get("lat")), _num(geo.get("lon")),
+                                   _num(geo.get("err_m")), len(cls)))
+            parts.append(cls)
+        return b"".join(parts)
+    except (TypeError, ValueError, struct.error):
+        return None
+
+
+def decode_tick(buf: bytes) -> Dict[str, Any]:
+    """Inverse of :func:`encode_tick` (NaN fields come back as None)."""
+    def opt(v):
+        return None if v != v else v
+
+    magic, ver, kind, t, lat, lon, alt, n = _HDR.unpack_from(buf, 0)
+    if magic != TICK_MAGIC or kind != KIND_TICK:
+        raise ValueError("not a tick frame")
+    off = _HDR.size
+    dets = []
+    for _ in range(n):
+        tid, conf, x, y, w, h, glat, glon, err, ln = _DET.unpack_from(buf, off)
+        off += _DET.size
+        cls = buf[off:off + ln].decode("utf-8")
+        off += ln
+        dets.append({"id": tid, "cls": cls, "conf": conf, "bbox": [x, y, w, h],
+                     "geo": {"lat": opt(glat), "lon": opt(glon), "err_m": opt(err)}})
+    return {"type": "tick", "time": t,
+            "telemetry": {"lat": opt(lat), "lon": opt(lon), "alt": opt(alt)},
+            "detections": dets}
+
+
+# ---------- hub ----------
+class _Client:
+    def __init__(self, ws, binary: bool, maxlen: int):
+        self.ws = ws
+        self.binary = binary
+        self.queue: deque = deque(maxlen=maxlen)
+        self.ready = asyncio.Event()
+        self.task: Optional[asyncio.Task] = None
+        self.behind_since: Optional[float] = None
+        self.sent = 0
+        self.drops = 0
+        self.closed = False
+
+
+class WsHub:
+    def __init__(self, queue_size: int = 16, max_behind_s: float = 5.0,
+                 send_timeout: float = 2.0):
+        self.queue_size = queue_size
+        self.max_behind_s = max_behind_s
+        self.send_timeout = send_timeout
+        self._clients: List[_Client] = []
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self.published = 0
+        self.encodes = 0
+        self.kicked = 0
+        self.send_age = LatencyHistogram()
+
+    # ---------- membership ----------
+    def add(self, ws, binary: bool = False) -> _Client:
+        self._loop = asyncio.get_running_loop()
+        c = _Client(ws, binary, self.queue_size)
+        c.task = asyncio.create_task(self._sender(c))
+        self._clients.append(c)
+        return c
+
+    def remove(self, c: _Client):
+        c.closed = True
+        if c in self._clients:
+            self._clients.remove(c)
+        if c.task and not c.task.done():
+            c.task.cancel()
+
+    async def serve(self, ws, binary: bool = False,
+                    on_message: Optional[Callable[[str], Awaitable[None]]] = None):
+        """Register an accepted socket and pump its inbound side until it closes."""
+        c = self.add(ws, binary)
+        try:
+            while not c.closed:
+                msg = await ws.receive()
+                if msg.get("type") == "websocket.disconnect":
+                    break
+                if on_message is not None and msg.get("text") is not None:
+                    await on_message(msg["text"])
+        except Exception:
+            pass
+        finally:
+            self.remove(c)
+
+    @property
+    def clients(self) -> int:
+        return len(self._clients)
+
+    # ---------- publishing ----------
+    def encode(self, obj: Any) -> Dict[str, Any]:
+        """Serialize once; the result can be handed to :meth:`publish_encoded`."""
+        out = {"text": obj if isinstance(obj, str) else json.dumps(obj, separators=(",", ":"))}
+        if isinstance(obj, dict) and isinstance(obj.get("ts"), (int, float)):
+            out["ts"] = float(obj["ts"])
+        self.encodes += 1
+        if isinstance(obj, dict) and obj.get("type") == "tick" and any(c.binary for c in self._clients):
+            out["bytes"] = encode_tick(obj)
+        return out
+
+    def publish(self, obj: Any):
+        """Queue a message for every client. Call from the event loop thread."""
+        self.publish_encoded(self.encode(obj))
+
+    def publish_threadsafe(self, obj: Any):
+        """Encode on the calling thread, then hand the payload to the loop."""
+        loop = self._loop
+        if loop is None or loop.is_closed() or not self._clients:
+            return
+        loop.call_soon_threadsafe(self.publish_encoded, self.encode(obj))
+
+    def publish_encoded(self, payload: Dict[str, Any]):
+        self.published += 1
+        now = time.monotonic()
+        for c in list(self._clients):
+            data = payload.get("bytes") if c.binary else None
+            if data is None:
+                data = payload["text"]
+            if len(c.queue) == c.queue.maxlen:
+                c.drops += 1
+                if c.behind_since is None:
+                    c.behind_since = now
+                elif now - c.behind_since > self.max_behind_s:
+                    self._kick(c, "behind for %.1fs" % (now - c.behind_since))
+                    continue
+            c.queue.append((data, payload.get("ts")))  # deque(maxlen) drops the oldest
+            c.ready.set()
+
+    async def broadcast(self, obj: Any):
+        self.publish(obj)
+
+    # ---------- senders ----------
+    def _kick(self, c: _Client, why: str):
+        logger.warning(f"ws client dropped: {why} ({c.drops} messages dropped)")
+        self.kicked += 1
+        self.remove(c)
+        asyncio.ensure_future(self._close(c.ws))
+
+    @staticmethod
+    async def _close(ws):
+        try:
+            await ws.close(code=1013)
+        except Exception:
+            pass
+
+    async def _sender(self, c: _Client):
+        try:
+            while not c.closed:
+                if not c.queue:
+                    c.behind_since = None
+                    c.ready.clear()
+                    await c.ready.wait()
+                    continue
+                data, ts = c.queue.popleft()
+                if isinstance(data, bytes):
+                    await asyncio.wait_for(c.ws.send_bytes(data), self.send_timeout)
+                else:
+                    await asyncio.wait_for(c.ws.send_text(data), self.send_timeout)
+                c.sent += 1
+                if ts is not None:
+                    self.send_age.record((time.time() - ts) * 1000.0)
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            if not c.closed:
+                self._kick(c, f"send failed: {type(e).__name__}")
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "clients": len(self._clients),
+            "published": self.published,
+            "encodes": self.encodes,
+            "kicked": self.kicked,
+            "sent": sum(c.sent for c in self._clients),
+            "drops": sum(c.drops for c in self._clients),
+            "queued": sum(len(c.queue) for c in self._clients),
+            "age_ms": self.send_age.summary(),
+        }
@@ -0,0 +1,94 @@
+import copy, os
+from pathlib import Path
+from typing import Dict, Optional
+from loguru import logger
+
+try:
+    import yaml
+except Exception:
+    yaml = None
+
+CONFIG_DIR = Path(os.environ.get("FORESIGHT_CONFIG_DIR", Path(__file__).resolve().parents[2] / "configs"))
+
+CAMERA_DEFAULTS: Dict = {
+    "camera_matrix": [[1000, 0, 640], [0, 1000, 360], [0, 0, 1]],
+    "dist_coeffs": [0, 0, 0, 0, 0],
+    "fov_h_deg": 78,
+    "fov_v_deg": 50,
+    "image_size": [1280, 720],
+    "georef": {
+        "pitch_deg": -90,
+        "sigma_alt_m": 2.0,
+        "sigma_alt_frac": 0.05,
+        "sigma_pitch_deg": 2.0,
+        "sigma_heading_deg": 3.0,
+        "sigma_px": 4.0,
+        "max_err_m": 1000.0,
+    },
+    "tiling": {
+        "altitude_m": 30,
+        "target_height_m": 1.7,
+        "min_target_px": 24,
+        "overlap": 0.2,
+        "max_tiles": 16,
+    },
+}
+
+PRIVACY_DEFAULTS: Dict = {
+    "retention": {"evidence_days": 90, "embeddings_days": 0, "logs_days": 365},
+    "controls": {"blur_non_targets": True, "audit_mode": "append-only"},
+}
+
+
+# DJI Fly HUD read by util/hud_ocr: ROIs are fractions of the mirrored frame
+# (x0, y0, x1, y1) around the number only; `range` rejects misreads
+HUD_DEFAULTS: Dict = {
+    "fields": {
+        "H": {"roi": [0.055, 0.905, 0.125, 0.955], "range": [-500, 10000]},
+        "D": {"roi": [0.175, 0.905, 0.245, 0.955], "range": [0, 100000]},
+    },
+    "ocr_scale": 2.0,
+    "min_score": 0.75,
+}
+
+
+def _merge(base: Dict, over: Dict) -> Dict:
+    out = copy.deepcopy(base)
+    for k, v in (over or {}).items():
+        if isinstance(v, dict) and isinstance(out.get(k), dict):
+            out[k] = _merge(out[k], v)
+        else:
+            out[k] = v
+    return out
+
+
+def load_yaml(name: str, defaults: Optional[Dict] = None) -> Dict:
+    """
+    Read configs/<name> over `defaults`. Files saved from PowerShell come out
+    as UTF-16 with a BOM, so the encoding is sniffed; a missing or unreadable
+    file falls back to the defaults with a warning.
+    """
+    defaults = defaults or {}
+    path = CONFIG_DIR / name
+    try:
+        raw = path.read_bytes()
+        text = raw.decode("utf-16") if raw[:2] in (b"\xff\xfe", b"\xfe\xff") else raw.decode("utf-8-sig")
+        data = yaml.safe_load(text) if yaml is not None else None
+        if not isinstance(data, dict):
+            raise ValueError("expected a mapping at top level")
+    except Exception as e:
+        logger.warning(f"config {path}: {e} (using defaults)")
+        return copy.deepcopy(defaults)
+    return _merge(defaults, data)
+
+
+def camera_calib() -> Dict:
+    return load_yaml("camera_calib.yaml", CAMERA_DEFAULTS)
+
+
+def privacy() -> Dict:
+    return load_yaml("privacy.yaml", PRIVACY_DEFAULTS)
+
+
+def hud() -> Dict:
+    return load_yaml("hud.yaml", HUD_DEFAULTS)
@@ -1,3 +1,352 @@
-﻿def read_hud(frame_bgr):
-    # Day-1 stub: return None so pipeline uses defaults
-    return {"D": None, "H": None}
+﻿"""
+DJI HUD reader: altitude H, distance D (and any other numeric field in
+configs/hud.yaml) from the mirrored screen.
+
+Per frame, each field's ROI is cropped and fingerprinted (Otsu-binarized
+thumbnail, crc32); an unchanged fingerprint reuses the last value, so a
+hovering drone costs a few resizes per frame. A changed ROI is split into
+glyphs and matched against digit templates; when every glyph matches, the
+value is known without OCR. Otherwise the crop goes to tesseract on a
+small thread pool and read() keeps returning the last value until the
+job lands (block=True runs it inline, for offline/batch use).
+
+Templates start as rendered Hershey digits and are learned from the HUD
+itself: whenever tesseract reads a field whose glyph count matches, those
+glyphs become templates, so after a few OCR calls the fast path covers
+the real HUD font. They persist in FORESIGHT_HUD_TEMPLATES
+(data/hud_templates.npz).
+"""
+import os
+import re
+import threading
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+import cv2
+import numpy as np
+from loguru import logger
+
+GLYPH_W, GLYPH_H = 12, 18
+_NUM = re.compile(r"-?\d+(?:\.\d+)?")
+
+try:
+    import pytesseract
+except Exception:
+    pytesseract = None
+
+
+def _seed_templates() -> Dict[str, List[np.ndarray]]:
+    out: Dict[str, List[np.ndarray]] = {}
+    for font in (cv2.FONT_HERSHEY_SIMPLEX, cv2.FONT_HERSHEY_DUPLEX):
+        for ch in "0123456789":
+            img = np.zeros((40, 30), np.uint8)
+            cv2.putText(img, ch, (3, 32), font, 1.0, 255, 2, cv2.LINE_AA)
+            _, bw = cv2.threshold(img, 127, 255, cv2.THRESH_BINARY)
+            ys, xs = np.nonzero(bw)
+            out.setdefault(ch, []).append(_norm_glyph(bw[ys.min():ys.max() + 1, xs.min():xs.max() + 1]))
+    return out
+
+
+def _norm_glyph(g: np.ndarray) -> np.ndarray:
+    g = cv2.resize(g, (GLYPH_W, GLYPH_H), interpolation=cv2.INTER_AREA).astype(np.float32)
+    g -= g.mean()
+    n = float(np.linalg.norm(g))
+    return g / n if n > 0 else g
+
+
+def binarize(crop: np.ndarray) -> np.ndarray:
+    """Text white on black, whatever the HUD draws it as."""
+    gray = cv2.cvtColor(crop, cv2.COLOR_BGR2GRAY) if crop.ndim == 3 else crop
+    _, bw = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+    if cv2.countNonZero(bw) > bw.size // 2:
+        bw = cv2.bitwise_not(bw)
+    return bw
+
+
+def split_glyphs(bw: np.ndarray) -> List[Tuple[str, np.ndarray]]:
+    """
+    Left-to-right glyphs as ("", bitmap) for digit candidates, or (".", None) /
+    ("-", None) for a decimal point / minus recognised from their shape.
+    """
+    n, _, st, _ = cv2.connectedComponentsWithStats(bw, connectivity=8)
+    boxes = [tuple(st[i, :4]) for i in range(1, n) if st[i, 4] >= 2]
+    if not boxes:
+        return []
+    h_max = max(b[3] for b in boxes)
+    base = max(b[1] + b[3] for b in boxes if b[3] >= 0.6 * h_max)
+    out = []
+    for x, y, w, h in sorted(boxes):
+        if h >= 0.6 * h_max:
+            out.append(("", bw[y:y + h, x:x + w]))
+        elif h <= 0.35 * h_max and w <= 0.5 * h_max and y + h >= base - 0.2 * h_max:
+            out.append((".", None))
+        elif h <= 0.3 * h_max and w > h and abs((y + h / 2) - (base - h_max / 2)) < 0.25 * h_max:
+            out.append(("-", None))
+        # anything else is noise (shadow specks, unit letters cut by the ROI)
+    return out
+
+
+class HudReader:
+    def __init__(self, cfg: Optional[Dict] = None, workers: Optional[int] = None, block: bool = False,
+                 templates_path: Optional[str] = None):
+        if cfg is None:
+            from .config import hud
+            cfg = hud()
+        self.fields: Dict[str, Dict] = cfg.get("fields", {})
+        self.ocr_scale = float(cfg.get("ocr_scale", 2.0))
+        self.min_score = float(cfg.get("min_score", 0.75))
+        self.block = block
+        self.templates_path = templates_path or os.environ.get("FORESIGHT_HUD_TEMPLATES", "data/hud_templates.npz")
+        self.templates = _seed_templates()
+        self._learned = 0
+        self._load_templates()
+
+        self._lock = threading.Lock()
+        self._save_lock = threading.Lock()   # file writes only; never taken under _lock
+        self._tpl_version = 0
+        self._saved_version = 0
+        self._values: Dict[str, Optional[float]] = {k: None for k in self.fields}
+        self._prints: Dict[str, int] = {}
+        self._pending: Dict[str, bool] = {}
+        self._next: Dict[str, Tuple[int, np.ndarray]] = {}   # newest crop waiting behind a running job
+        n = workers or int(os.environ.get("FORESIGHT_OCR_WORKERS", 2))
+        self._pool = ThreadPoolExecutor(max_workers=n, thread_name_prefix="hud-ocr") if not block else None
+        self._warned = False
+        self.counts = {"frames": 0, "unchanged": 0, "fast": 0, "ocr": 0, "ocr_failed": 0, "rejected": 0}
+
+    # ---------- templates ----------
+    def _load_templates(self):
+        if not self.templates_path or not os.path.exists(self.templates_path):
+            return
+        try:
+            data = np.load(self.templates_path)
+            for key in data.files:
+                self.templates.setdefault(key[0], []).extend(list(data[key]))
+                self._learned += len(data[key])
+        except Exception as e:
+            logger.warning(f"HUD templates {self.templates_path}: {e}")
+
+    def _snapshot_templates(self) -> Dict[str, np.ndarray]:
+        """Learned (non-seed) templates as savez arrays; call with _lock held."""
+        seeds = _seed_templates()
+        return {f"{ch}{i}": np.stack(t[len(seeds.get(ch, [])):])
+                for i, (ch, t) in enumerate(sorted(self.templates.items()))
+                if len(t) > len(seeds.get(ch, []))}
+
+    def _save_templates(self, learned: Dict[str, np.ndarray], version: int):
+        """Write a snapshot taken under _lock; runs after releasing it, skips snapshots already superseded."""
+        if not self.templates_path:
+            return
+        with self._save_lock:
+            if version <= self._saved_version:
+                return
+            try:
+                os.makedirs(os.path.dirname(self.templates_path) or ".", exist_ok=True)
+                tmp = f"{self.templates_path}.{os.getpid()}.tmp.npz"   # batch workers may save concurrently
+                np.savez_compressed(tmp, **learned)
+                os.replace(tmp, self.templates_path)
+                self._saved_version = version
+            except OSError as e:
+                logger.warning(f"HUD templates {self.templates_path}: {e}")
+
+    def _match(self, g: np.ndarray) -> Tuple[str, float]:
+        v = _norm_glyph(g)
+        best, score = "", -1.0
+        for ch, ts in self.templates.items():
+            for t in ts:
+                s = float((v * t).sum())
+                if s > score:
+                    best, score = ch, s
+        return best, score
+
+    def _learn(self, glyphs: List[Tuple[str, np.ndarray]], text: str) -> bool:
+        """Add unmatched digit glyphs as templates (call with _lock held); True if any were added."""
+        digits = [c for c in text if c.isdigit()]
+        cand = [g for kind, g in glyphs if kind == ""]
+        if len(digits) != len(cand):
+            return False
+        added = False
+        for ch, g in zip(digits, cand):
+            if self._match(g)[1] >= 0.9:
+                continue
+            ts = self.templates.setdefault(ch, [])
+            if len(ts) < 12:
+                ts.append(_norm_glyph(g))
+                self._learned += 1
+                added = True
+        return added
+
+    # ---------- per field ----------
+    def _crop(self, frame: np.ndarray, roi) -> Optional[np.ndarray]:
+        h, w = frame.shape[:2]
+        x0, y0, x1, y1 = (int(round(v * s)) for v, s in zip(roi, (w, h, w, h)))
+        x0, y0 = max(0, x0), max(0, y0)
+        x1, y1 = min(w, x1), min(h, y1)
+        if x1 - x0 < 4 or y1 - y0 < 4:
+            return None
+        return frame[y0:y1, x0:x1]
+
+    @staticmethod
+    def fingerprint(crop: np.ndarray) -> int:
+        h, w = crop.shape[:2]
+        small = cv2.resize(crop, (48, max(8, int(48 * h / max(w, 1)))), interpolation=cv2.INTER_AREA)
+        return zlib.crc32(binarize(small).tobytes())
+
+    def _accept(self, name: str, text: Optional[str]) -> Optional[float]:
+        m = _NUM.search(text or "")
+        if not m:
+            return None
+        v = float(m.group(0))
+        lo, hi = self.fields[name].get("range", (-1e12, 1e12))
+        if not lo <= v <= hi:
+            self.counts["rejected"] += 1
+            return None
+        return v
+
+    def _fast(self, glyphs: List[Tuple[str, np.ndarray]]) -> Optional[str]:
+        if not any(kind == "" for kind, _ in glyphs):
+            return None
+        out = []
+        for kind, g in glyphs:
+            if kind:
+                out.append(kind)
+                continue
+            ch, score = self._match(g)
+            if score < self.min_score:
+                return None
+            out.append(ch)
+        return "".join(out)
+
+    def _ocr(self, name: str, fp: int, crop: np.ndarray):
+        """Tesseract on one crop (worker thread, or inline with block=True)."""
+        text = None
+        try:
+            if pytesseract is None:
+                if not self._warned:
+                    logger.warning("pytesseract not available: HUD fields rely on digit templates only")
+                    self._warned = True
+            else:
+                bw = binarize(cv2.resize(crop, None, fx=self.ocr_scale, fy=self.ocr_scale,
+                                         interpolation=cv2.INTER_CUBIC))
+                text = pytesseract.image_to_string(cv2.bitwise_not(bw), config=
+                                                   "--psm 7 -c tessedit_char_whitelist=0123456789.-")
+        except Exception as e:
+            logger.warning(f"HUD OCR {name}: {e}")
+        v = self._accept(name, text)
+        snap = None
+        with self._lock:
+            self.counts["ocr"] += 1
+            if v is None:
+                self.counts["ocr_failed"] += 1
+            else:
+                self._values[name] = v
+                if self._learn(split_glyphs(binarize(crop)), text):
+                    self._tpl_version += 1
+                    snap = (self._snapshot_templates(), self._tpl_version)
+            nxt = self._next.pop(name, None)
+            if nxt is not None and nxt[0] != fp and self._pool is not None:
+                self._pool.submit(self._ocr, name, *nxt)
+            else:
+                self._pending[name] = False
+        if snap is not None:
+            self._save_templates(*snap)
+
+    def _field(self, name: str, frame: np.ndarray):
+        crop = self._crop(frame, self.fields[name]["roi"])
+        if crop is None:
+            return
+        fp = self.fingerprint(crop)
+        if self._prints.get(name) == fp:
+            self.counts["unchanged"] += 1
+            return
+        self._prints[name] = fp
+        text = self._fast(split_glyphs(binarize(crop)))
+        v = self._accept(name, text) if text is not None else None
+        if v is not None:
+            self.counts["fast"] += 1
+            with self._lock:
+                self._values[name] = v
+            return
+        crop = crop.copy()   # the frame buffer is reused by the capture thread
+        if self._pool is None:
+            self._pending[name] = True
+            self._ocr(name, fp, crop)
+            return
+        with self._lock:
+            if self._pending.get(name):
+                self._next[name] = (fp, crop)   # newest wins; runs when the current job ends
+                return
+            self._pending[name] = True
+        self._pool.submit(self._ocr, name, fp, crop)
+
+    # ---------- public API ----------
+    def read(self, frame_bgr: np.ndarray) -> Dict[str, Optional[float]]:
+        """Latest value of every field (None until first read); never waits for OCR unless block=True."""
+        self.counts["frames"] += 1
+        if frame_bgr is not None and frame_bgr.size:
+            for name in self.fields:
+                self._field(name, frame_bgr)
+        with self._lock:
+            return dict(self._values)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {**self.counts, "pending": sum(1 for p in self._pending.values() if p),
+                    "templates": sum(len(t) for t in self.templates.values()), "learned": self._learned,
+                    "values": dict(self._values)}
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False)
+
+
+_READER: Optional[HudReader] = None
+_READER_LOCK = threading.Lock()
+
+
+def read_hud(frame_bgr) -> Dict[str, Optional[float]]:
+    """{"D": ..., "H": ...} from the process-wide HudReader (None for fields not read yet)."""
+    global _READER
+    if _READER is None:
+        with _READER_LOCK:
+            if _READER is None:
+                _READER = HudReader()
+    return _READER.read(frame_bgr)
+
+
+# ---------- calibration ----------
+def calibrate(image_path: str, out_path: Optional[str] = None, names: Tuple[str, ...] = ("H", "D")):
+    """Drag a box around each field's number on a HUD screenshot; writes configs/hud.yaml."""
+    import yaml
+    from .config import CONFIG_DIR, hud
+    img = cv2.imread(image_path)
+    if img is None:
+        raise SystemExit(f"cannot read {image_path}")
+    h, w = img.shape[:2]
+    cfg = hud()
+    for name in names:
+        x, y, bw, bh = cv2.selectROI(f"HUD field {name} (Enter to accept, c to skip)", img, showCrosshair=False)
+        if bw and bh:
+            cfg["fields"].setdefault(name, {})["roi"] = [round(x / w, 4), round(y / h, 4),
+                                                          round((x + bw) / w, 4), round((y + bh) / h, 4)]
+    cv2.destroyAllWindows()
+    out_path = out_path or str(CONFIG_DIR / "hud.yaml")
+    with open(out_path, "w", encoding="utf-8") as f:
+        yaml.safe_dump(cfg, f, sort_keys=False)
+    print(f"wrote {out_path}")
+    return cfg
+
+
+if __name__ == "__main__":
+    import argparse
+    ap = argparse.ArgumentParser(description="HUD OCR: calibrate ROIs or read a screenshot")
+    ap.add_argument("image")
+    ap.add_argument("--calibrate", action="store_true")
+    ap.add_argument("--fields", default="H,D")
+    args = ap.parse_args()
+    if args.calibrate:
+        calibrate(args.image, names=tuple(args.fields.split(",")))
+    else:
+        r = HudReader(block=True)
+        print(r.read(cv2.imread(args.image)), r.stats())